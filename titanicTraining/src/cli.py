@@ -1,48 +1,32 @@
 import typer
 from rich import print
+import contextlib
 import os
 import yaml
 import pathlib
-from pipe import TrainModelPipeline
 from glob import glob
+from typing import TYPE_CHECKING
+import json
 import re
-import pandas as pd
+
+# The pipe package imports pandas, pandera and scikit-learn, which take seconds to load. It is
+# imported inside the commands that need it so --help and argument errors return right away.
+if TYPE_CHECKING:
+    from pipe import TrainModelPipeline
 
 DEFAULT_CONFIG_FILE_PATH = "./titanic_train.yaml"
 
 app = typer.Typer(add_completion=False)
 
 
-@app.command()
-def run(
-    config_file: str = typer.Option(
-        DEFAULT_CONFIG_FILE_PATH, help="Path to config file"
-    )
-):
+def read_config(config_file: str) -> dict:
     """
-    Run the whole training pipeline
+    Reads the yaml config file, exiting with an error if it does not exist or is not yaml.
     """
     if os.path.isfile(config_file):
         if pathlib.Path(config_file).suffix in [".yaml", ".yml"]:
             doc = open(config_file, "r")
-            data = yaml.load(doc, Loader=yaml.Loader)
-            trainer_kwargs = data["trainer_args"]
-            zip_path = data["data_zip"]
-            base_runs_folder = (
-                data["base_runs_folder"] if "base_runs_folder" in data else "runs"
-            )
-            model_ckpt_name = (
-                data["model_ckpt_name"]
-                if "model_ckpt_name" in data
-                else "train_pipeline"
-            )
-            pipe = TrainModelPipeline(
-                zip_path=zip_path,
-                base_runs_folder=base_runs_folder,
-                model_ckpt_name=model_ckpt_name,
-                **trainer_kwargs,
-            )
-            pipe.run()
+            return yaml.load(doc, Loader=yaml.Loader)
         else:
             print(
                 f"[bold red]Error:[/bold red] The file at [blue]{config_file}[/blue] is not a .yaml or .yml file."
@@ -55,6 +39,101 @@ def run(
         raise typer.Exit()
 
 
+def pipeline_config(data: dict) -> dict:
+    """
+    Maps the config file values to the `TrainModelPipeline` attributes they set, with the
+    defaults of the values missing from the file. The trainer args are not included.
+    """
+    return {
+        "zip_path": data["data_zip"],
+        "base_runs_folder": data["base_runs_folder"]
+        if "base_runs_folder" in data
+        else "runs",
+        "model_ckpt_name": data["model_ckpt_name"]
+        if "model_ckpt_name" in data
+        else "train_pipeline",
+        "data_cache_dir": data["data_cache_dir"] if "data_cache_dir" in data else "",
+        "validation": data["validation"] if "validation" in data else "pandera",
+        "ingest_chunksize": data["ingest_chunksize"]
+        if "ingest_chunksize" in data
+        else None,
+        "validation_sample": data["validation_sample"]
+        if "validation_sample" in data
+        else None,
+        "step_cache_dir": data["step_cache_dir"] if "step_cache_dir" in data else "",
+        "sparse_features": data["sparse_features"]
+        if "sparse_features" in data
+        else False,
+        "out_of_core": data["out_of_core"] if "out_of_core" in data else False,
+        "model_name": data["model"] if "model" in data else "RandomForest",
+    }
+
+
+def pipeline_from_config(data: dict) -> "TrainModelPipeline":
+    """
+    Creates a training pipeline from the config file values.
+    """
+    from pipe import TrainModelPipeline
+
+    return TrainModelPipeline(**pipeline_config(data), **data["trainer_args"])
+
+
+def exit_if_out_of_core(out_of_core: bool, command: str):
+    """
+    Exits with an error when the pipeline streams its data, for the commands that need the
+    training data in memory.
+    """
+    if out_of_core:
+        print(
+            f"[bold red]Error:[/bold red] {command} needs the training data in memory, it is not available with out_of_core."
+        )
+        raise typer.Exit()
+
+
+def preprocessed_pipeline(data: dict, ckpt_file: str, command: str) -> "TrainModelPipeline":
+    """
+    Loads the pipeline checkpoint `ckpt_file` into a new run or, if empty, creates a pipeline
+    from the config file values. Then runs its ingest and preprocessing steps if pending.
+    Out of core pipelines are rejected before anything runs, since `command` needs the
+    training data in memory.
+    """
+    if ckpt_file:
+        if os.path.isfile(ckpt_file) and pathlib.Path(ckpt_file).suffix == ".ckpt":
+            from pipe import TrainModelPipeline
+
+            pipe = TrainModelPipeline.load(ckpt_file)
+            exit_if_out_of_core(pipe.out_of_core, command)
+            pipe.initialize_folders()
+        else:
+            print(
+                f"[bold red]Error:[/bold red] There is no .ckpt file in the specified path: [blue]{ckpt_file}[/blue]"
+            )
+            raise typer.Exit()
+    else:
+        exit_if_out_of_core(
+            data["out_of_core"] if "out_of_core" in data else False, command
+        )
+        pipe = pipeline_from_config(data)
+    if pipe.next_step_name == "run":
+        pipe.ingest()
+    if pipe.next_step_name == "preprocessing":
+        pipe.preprocessing()
+    pipe.wait_for_checkpoints()
+    return pipe
+
+
+@app.command()
+def run(
+    config_file: str = typer.Option(
+        DEFAULT_CONFIG_FILE_PATH, help="Path to config file"
+    )
+):
+    """
+    Run the whole training pipeline
+    """
+    pipeline_from_config(read_config(config_file)).run()
+
+
 @app.command()
 def resume(
     ckpt_file: str = typer.Option("", help="Path to checkpoint file."),
@@ -72,39 +151,19 @@ def resume(
     """
     if os.path.isfile(ckpt_file):
         if pathlib.Path(ckpt_file).suffix == ".ckpt":
+            from pipe import TrainModelPipeline
+
             pipe = TrainModelPipeline.load(ckpt_file)
 
             if reload_configs:
-                if os.path.isfile(config_file):
-                    if pathlib.Path(config_file).suffix in [".yaml", ".yml"]:
-                        doc = open(config_file, "r")
-                        data = yaml.load(doc, Loader=yaml.Loader)
-                        trainer_kwargs = data["trainer_args"]
-                        zip_path = data["data_zip"]
-                        base_runs_folder = (
-                            data["base_runs_folder"]
-                            if "base_runs_folder" in data
-                            else "runs"
-                        )
-                        model_ckpt_name = (
-                            data["model_ckpt_name"]
-                            if "model_ckpt_name" in data
-                            else "train_pipeline"
-                        )
-                        pipe.zip_path = zip_path
-                        pipe.base_runs_folder = base_runs_folder
-                        pipe.model_ckpt_name = model_ckpt_name
-                        pipe.trainer_kwargs = trainer_kwargs
-                    else:
-                        print(
-                            f"[bold red]Error:[/bold red] The file at [blue]{config_file}[/blue] is not a .yaml or .yml file."
-                        )
-                        raise typer.Exit()
-                else:
+                data = read_config(config_file)
+                kept = pipe.update_config(
+                    **pipeline_config(data), trainer_kwargs=data["trainer_args"]
+                )
+                for name, value in kept.items():
                     print(
-                        f"[bold red]Error:[/bold red] There is no file in the specified path: [blue]{config_file}[/blue]"
+                        f"[bold yellow]Warning:[/bold yellow] Keeping {name}={value} from the checkpoint, the steps already run fixed it."
                     )
-                    raise typer.Exit()
 
             pipe.resume()
         else:
@@ -120,27 +179,17 @@ def resume(
         raise typer.Exit()
 
 
-@app.command()
-def predict(
-    data_path: str = typer.Argument("", help="Path to data."),
-    processed: bool = typer.Option(
-        False,
-        help="Whether or nor the data is already processed and with features or is raw data.",
-    ),
-    output_path: str = typer.Option(
-        "./predictions.csv.",
-        help="Optional path to save the predictions results. By default will save it in ./predictions.csv.",
-    ),
-    pipeline_ckpt: str = typer.Option(
-        "",
-        help="Optional path to the TrainerPipeline Checkpoint. By default this will look for the last evaluate cktp in the ./runs folder",
-    ),
-):
+def find_pipeline_ckpt(pipeline_ckpt: str) -> str:
     """
-    Use a previously trained pipeline to make predictions on new data
+    Validates the given model artifact or checkpoint path or, if empty, looks for the
+    latest evaluation model artifact or checkpoint inside ./runs.
     """
+    from pipe.artifact import is_artifact, ARTIFACT_SUFFIX
+
     if pipeline_ckpt:
-        if os.path.isfile(pipeline_ckpt):
+        if is_artifact(pipeline_ckpt):
+            pass
+        elif os.path.isfile(pipeline_ckpt):
             if pathlib.Path(pipeline_ckpt).suffix == ".ckpt":
                 pass
             else:
@@ -150,12 +199,16 @@ def predict(
                 raise typer.Exit()
         else:
             print(
-                f"[bold red]Error:[/bold red] There is no file in the specified path: [blue]{pipeline_ckpt}[/blue]"
+                f"[bold red]Error:[/bold red] There is no file or model artifact in the specified path: [blue]{pipeline_ckpt}[/blue]"
             )
             raise typer.Exit()
 
     else:
-        possible_ckpts = glob(os.path.join("runs", "run_*", "evaluate", "*.ckpt"))
+        possible_ckpts = glob(
+            os.path.join("runs", "run_*", "evaluate", "*" + ARTIFACT_SUFFIX)
+        )
+        possible_ckpts = [p for p in possible_ckpts if is_artifact(p)]
+        possible_ckpts += glob(os.path.join("runs", "run_*", "evaluate", "*.ckpt"))
 
         if len(possible_ckpts) == 0:
             print(
@@ -166,48 +219,267 @@ def predict(
 
             def key_func(string):
                 """
-                Function to order the version folder paths based on their version number
+                Function to order the version folder paths based on their version number.
+                Inside the same run, model artifacts are preferred over checkpoints.
                 """
                 match = re.findall(r"\d+$", string[0])
-                if len(match) > 0:
-                    return int(match[0])
-                else:
-                    return -1
+                version = int(match[0]) if len(match) > 0 else -1
+                return version, is_artifact(string[1])
 
             possible_ckpts = [(p.split(os.sep)[-3], p) for p in possible_ckpts]
             possible_ckpts.sort(key=key_func, reverse=True)
             pipeline_ckpt = possible_ckpts[0][1]
             print(
-                f"[bold yellow]Info:[/bold yellow] Evaluation checkpoint found at: '{pipeline_ckpt}'."
+                f"[bold yellow]Info:[/bold yellow] Evaluation {'model artifact' if is_artifact(pipeline_ckpt) else 'checkpoint'} found at: '{pipeline_ckpt}'."
             )
 
-    pipe = TrainModelPipeline.load(pipeline_ckpt)
-    if pipe.next_step.__name__ != "evaluate":
+    return pipeline_ckpt
+
+
+def load_evaluated_pipeline(pipeline_ckpt: str, mmap: bool = True):
+    """
+    Loads the pipeline at `pipeline_ckpt`, checking checkpoints hold a trained model.
+    """
+    from pipe import TrainModelPipeline, load_inference_pipeline
+
+    pipe = load_inference_pipeline(pipeline_ckpt, mmap)
+    if isinstance(pipe, TrainModelPipeline) and pipe.trainer is None:
         print(
-            f"[bold red]Error:[/bold red] The checkpoint at '{pipeline_ckpt}' was not in evaluation step. It was at [bold yellow]{pipe.next_step.__name__}[/bold yellow]."
+            f"[bold red]Error:[/bold red] The checkpoint at '{pipeline_ckpt}' has not been trained yet. Its next step is [bold yellow]{pipe.next_step_name}[/bold yellow]."
         )
         print(
-            "[bold blue]Tip:[/bold blue] Try looking inside the 'evaluation/' folders to find checkpoints suited for prediction."
+            "[bold blue]Tip:[/bold blue] Try looking inside the 'train/' or 'evaluate/' folders to find checkpoints suited for prediction."
         )
         raise typer.Exit()
-    else:
-        data = pd.read_csv(data_path)
-        predictions = None
-        pipe = TrainModelPipeline.load(pipeline_ckpt)
-        if "Survived" in data.columns:
-            del data["Survived"]
-        if processed:
-            predictions = pipe.predict(X=data)
-        else:
-            predictions = pipe.tranform_predict(X=data)
-        predictions = pd.DataFrame(predictions, columns=["Survived"])
-        predictions = pd.concat((data.iloc[:, 0], predictions), axis=1)
-        print("\nSome predictions:\n")
-        print(predictions.head(10))
-        predictions.to_csv(output_path, index=False)
+    return pipe
+
+
+@app.command()
+def predict(
+    data_path: str = typer.Argument("", help="Path to data."),
+    processed: bool = typer.Option(
+        False,
+        help="Whether or nor the data is already processed and with features or is raw data.",
+    ),
+    output_path: str = typer.Option(
+        "./predictions.csv.",
+        help="Optional path to save the predictions results. By default will save it in ./predictions.csv.",
+    ),
+    pipeline_ckpt: str = typer.Option(
+        "",
+        help="Optional path to the model artifact directory or TrainerPipeline Checkpoint. By default this will look for the last evaluate artifact or cktp in the ./runs folder",
+    ),
+    chunksize: int = typer.Option(
+        0,
+        help="Optional number of rows to read, transform and predict at a time. Useful for files that do not fit in memory. By default the whole file is read at once.",
+    ),
+    workers: int = typer.Option(
+        1,
+        help="Number of processes used to clean, enrich and predict the data in parallel.",
+    ),
+    mmap: bool = typer.Option(
+        True,
+        help="Whether to memory-map the model artifact, so the workers share its pages. With --no-mmap forests are loaded as scikit-learn estimators, which predict large files faster but are copied into every worker.",
+    ),
+):
+    """
+    Use a previously trained pipeline to make predictions on new data
+    """
+    from pipe import ParallelScorer, predict_csv
+
+    pipeline_ckpt = find_pipeline_ckpt(pipeline_ckpt)
+    pipe = load_evaluated_pipeline(pipeline_ckpt, mmap)
+    with (
+        ParallelScorer(pipeline_ckpt, workers, mmap)
+        if workers > 1
+        else contextlib.nullcontext(pipe)
+    ) as predictor:
+        predictions = predict_csv(
+            predictor,
+            data_path,
+            output_path,
+            processed=processed,
+            chunksize=chunksize if chunksize > 0 else None,
+        )
+    print("\nSome predictions:\n")
+    print(predictions.head(10))
+    print(
+        f'\n[bold green]Success![/bold green] Predictions saved at: "{output_path}" '
+    )
+
+
+@app.command()
+def serve(
+    pipeline_ckpt: str = typer.Option(
+        "",
+        help="Optional path to the model artifact directory or TrainerPipeline Checkpoint. By default this will look for the last evaluate artifact or cktp in the ./runs folder",
+    ),
+    host: str = typer.Option("127.0.0.1", help="Interface to listen on."),
+    port: int = typer.Option(8000, help="Port to listen on."),
+    max_batch_size: int = typer.Option(
+        64, help="Maximum number of records predicted together in a micro batch."
+    ),
+    max_wait_ms: float = typer.Option(
+        5.0,
+        help="Maximum milliseconds a request waits for other requests to join its micro batch.",
+    ),
+):
+    """
+    Serve predictions over HTTP. POST JSON passenger records to /predict, GET /metrics for latency and throughput.
+    """
+    import asyncio
+    from pipe import PredictionServer
+
+    pipeline_ckpt = find_pipeline_ckpt(pipeline_ckpt)
+    pipe = load_evaluated_pipeline(pipeline_ckpt)
+    server = PredictionServer(
+        pipe,
+        host=host,
+        port=port,
+        max_batch_size=max_batch_size,
+        max_wait=max_wait_ms / 1000,
+    )
+    print(
+        f"[bold green]Serving[/bold green] predictions at: http://{host}:{port}/predict"
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def tune(
+    config_file: str = typer.Option(
+        DEFAULT_CONFIG_FILE_PATH, help="Path to config file"
+    ),
+    ckpt_file: str = typer.Option(
+        "",
+        help="Optional path to a checkpoint whose preprocessed data will be reused, e.g. runs/run_0/preprocessing/train_pipeline.ckpt. By default the data is ingested and preprocessed from the config file.",
+    ),
+):
+    """
+    Search the trainer hyperparameters with the search space in the 'tune' section of the config file.
+    The trial table and the best config are written in the 'tune' folder of the run.
+    """
+    data = read_config(config_file)
+    if "tune" not in data or "search_space" not in data["tune"]:
         print(
-            f'\n[bold green]Success![/bold green] Predictions saved at: "{output_path}" '
+            f"[bold red]Error:[/bold red] The config file at [blue]{config_file}[/blue] has no 'tune.search_space' section."
         )
+        raise typer.Exit()
+
+    from pipe import HyperparameterSearch, TrainerModels
+
+    pipe = preprocessed_pipeline(data, ckpt_file, "Tuning")
+
+    tune_config = data["tune"]
+    search = HyperparameterSearch(
+        tune_config["search_space"],
+        base_kwargs=data["trainer_args"],
+        model=TrainerModels.get(pipe.model_name),
+        cv=tune_config["cv"] if "cv" in tune_config else 5,
+        workers=tune_config["workers"] if "workers" in tune_config else -1,
+        halving=tune_config["halving"] if "halving" in tune_config else True,
+        factor=tune_config["factor"] if "factor" in tune_config else 3,
+        scoring=tune_config["scoring"] if "scoring" in tune_config else "accuracy",
+    )
+    trials = pipe.tune(search)
+    tune_dir = os.path.join(pipe.current_run_folder, "tune")
+    print("\n\n[green]Best trials[/green]")
+    print(trials.head(10))
+    print(
+        f"\n[bold green]Success![/bold green] Best score {search.best_score:.4f} with: {search.best_params}"
+    )
+    print(
+        f"[bold blue]Tip:[/bold blue] The best config is at '{os.path.join(tune_dir, 'best_config.yaml')}'. "
+        f"Train with it running: titanic resume --ckpt-file {os.path.join(tune_dir, pipe.model_ckpt_name + '.ckpt')} --no-reload-configs"
+    )
+
+
+@app.command()
+def compare_models(
+    config_file: str = typer.Option(
+        DEFAULT_CONFIG_FILE_PATH, help="Path to config file"
+    ),
+    ckpt_file: str = typer.Option(
+        "",
+        help="Optional path to a checkpoint whose preprocessed data will be reused, e.g. runs/run_0/preprocessing/train_pipeline.ckpt. By default the data is ingested and preprocessed from the config file.",
+    ),
+):
+    """
+    Compare the fit time, prediction latency and accuracy of the models in the 'compare_models' section
+    of the config file (every registered model by default) on the same feature matrix.
+    The results are written in the 'compare_models' folder of the run.
+    """
+    from pipe.bench import compare_models as compare_models_on
+
+    data = read_config(config_file)
+    pipe = preprocessed_pipeline(data, ckpt_file, "Comparing models")
+    train_data = pipe.dataset.train_data
+    results = compare_models_on(
+        train_data.iloc[:, 1:],
+        train_data.iloc[:, 0],
+        data["compare_models"] if "compare_models" in data else None,
+    )
+    results_dir = os.path.join(pipe.current_run_folder, "compare_models")
+    os.makedirs(results_dir, exist_ok=True)
+    results_path = os.path.join(results_dir, "results.csv")
+    results.to_csv(results_path, index=False)
+    print("\n\n[green]Model comparison[/green]")
+    print(results.to_string(index=False))
+    print(f'\n[bold green]Success![/bold green] Results saved at: "{results_path}"')
+
+
+@app.command()
+def bench(
+    config_file: str = typer.Option(
+        DEFAULT_CONFIG_FILE_PATH, help="Path to config file, its model and trainer_args are used for the predictions"
+    ),
+    sizes: str = typer.Option(
+        "10000,1000000,10000000", help="Comma separated numbers of synthetic training rows"
+    ),
+    repeat: int = typer.Option(1, help="Number of times each benchmark is measured"),
+    validation: str = typer.Option(
+        "fast", help="Validation engine of the ingest, either 'pandera' or 'fast'"
+    ),
+    vectorized: bool = typer.Option(
+        False, help="Whether to benchmark the vectorized feature enricher"
+    ),
+    output: str = typer.Option(
+        "bench.json", help="Path of the json file where the results are written"
+    ),
+):
+    """
+    Benchmark the ingest, preprocessing, checkpointing and prediction hot paths on synthetic
+    titanic data of each size. The results are written as json so they can be compared
+    across commits.
+    """
+    data = read_config(config_file)
+    try:
+        sizes = [int(size) for size in sizes.split(",")]
+    except ValueError:
+        print(
+            f"[bold red]Error:[/bold red] The sizes [blue]{sizes}[/blue] are not comma separated integers."
+        )
+        raise typer.Exit()
+    from pipe.bench import run_benchmarks
+
+    report = run_benchmarks(
+        sizes,
+        repeat,
+        validation,
+        vectorized,
+        data["model"] if "model" in data else "RandomForest",
+        data["trainer_args"],
+        progress=lambda result: print(
+            f"[yellow]{result['size']:>10}[/yellow] {result['benchmark']:<28}"
+            f"{result['best_seconds']:>10.4f} s {result['rows_per_second']:>14,.0f} rows/s"
+        ),
+    )
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f'\n[bold green]Success![/bold green] Results saved at: "{output}"')
 
 
 def main():
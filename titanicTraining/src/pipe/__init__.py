@@ -1,4 +1,17 @@
 from .dataset import *
+from .validation import FastSchemaValidator, SchemaValidationException
 from .preprocessing import *
 from .train import *
+from .plan import FeaturePlan, RECORD_FIELDS
+from .scoring import ParallelScorer, predict_csv
+from .artifact import (
+    InferencePipeline,
+    InvalidArtifactException,
+    load_inference_pipeline,
+)
+from .serve import PredictionServer
+from .tune import HyperparameterSearch, InvalidSearchSpaceException
+from .bench import compare_models, run_benchmarks, synthesize_titanic
+from .metrics import MetricsRecorder, measure
+from .sketch import QuantileSketch
 from .pipeline import TrainModelPipeline
@@ -0,0 +1,231 @@
+from __future__ import annotations
+import json
+import os
+import pickle
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+from .preprocessing import DataCleaning, FeatureEnricher
+from .train import Trainer
+from .plan import FeaturePlan, ForestPlan
+from .scoring import predict_csv
+from .utils import makedir
+
+
+# Version of the model artifact layout. Bump it whenever the manifest or files change.
+# Version 1 stored the estimator as a plain pickle, version 2 stores it with joblib and
+# version 3 also stores the nodes of forest models as `.npy` arrays.
+ARTIFACT_FORMAT_VERSION = 3
+ARTIFACT_SUFFIX = ".artifact"
+MANIFEST_FILE = "manifest.json"
+MODEL_FILE = "model.joblib"
+LEGACY_MODEL_FILE = "model.pkl"
+FOREST_DIR = "forest"
+
+
+class InferencePipeline:
+    """
+    The part of a trained pipeline needed to make predictions: the fitted data cleaner,
+    feature enricher and trainer. It can be exported to, and loaded from, a compact versioned
+    model artifact: a directory with a json manifest holding the transformers' lookup tables
+    and a joblib file holding only the estimator. The estimator's NumPy arrays are stored
+    uncompressed so they can be memory-mapped when loading. Forests are also stored as the
+    node arrays of their `ForestPlan`, which predicts straight from the memory-mapped arrays.
+    """
+
+    def __init__(
+        self,
+        data_cleaner: DataCleaning = None,
+        feature_enricher: FeatureEnricher = None,
+        trainer: Trainer = None,
+    ):
+        self.data_cleaner = data_cleaner
+        self.feature_enricher = feature_enricher
+        self.trainer = trainer
+        self.feature_plan = None
+        self.forest_plan = None
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "forest_plan" not in state:
+            # Pipelines pickled before forests were compiled, both plans are compiled again
+            self.feature_plan = None
+            self.forest_plan = None
+
+    def predict(self, X):
+        """
+        Performs a prediction from preprocessed data
+        """
+        prediction = self.trainer.predict(X)
+        return prediction
+
+    def transform(self, X: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """
+        Cleans and enriches unprocessed data. The data is copied once by the cleaner and then
+        enriched in place, or never copied with `inplace`.
+        """
+        X_aux = self.data_cleaner.transform(X, inplace)
+        return self.feature_enricher.transform(X_aux, inplace=True)
+
+    def tranform_predict(self, X: pd.DataFrame, inplace: bool = False):
+        """
+        Performs a prediction from unprocessed data.
+        """
+        return self.predict(self.transform(X, inplace))
+
+    def predict_csv(
+        self,
+        data_path: str,
+        output_path: str,
+        processed: bool = False,
+        chunksize: int = None,
+    ) -> pd.DataFrame:
+        """
+        Performs predictions over a csv file, optionally in chunks, and writes them to
+        `output_path`. See `scoring.predict_csv`.
+        """
+        return predict_csv(self, data_path, output_path, processed, chunksize)
+
+    def compile_plan(self) -> FeaturePlan:
+        """
+        Compiles the fitted cleaner and enricher into a `FeaturePlan` for low latency,
+        one record at a time predictions, and forest models into a `ForestPlan`.
+        """
+        self.feature_plan = FeaturePlan(
+            self.data_cleaner,
+            self.feature_enricher,
+            self.trainer.feature_names,
+        )
+        model = self.trainer.model
+        if isinstance(model, ForestPlan):
+            self.forest_plan = model
+        else:
+            self.forest_plan = ForestPlan(model) if ForestPlan.supports(model) else None
+        return self.feature_plan
+
+    def predict_record(self, record):
+        """
+        Performs a prediction for a single unprocessed record (dict or tuple) without
+        building any DataFrame.
+        """
+        if self.feature_plan is None:
+            self.compile_plan()
+        row = self.feature_plan.transform_record(record)
+        if self.forest_plan is not None:
+            return self.forest_plan.predict_row(row)
+        with warnings.catch_warnings():
+            # The model was fitted with feature names and we are passing a bare array
+            warnings.simplefilter("ignore")
+            return self.predict(self.feature_plan.row)[0]
+
+    def export(self, path: str):
+        """
+        Writes the inference state into a model artifact directory at `path`. Forests are written
+        both with joblib and as `ForestPlan` node arrays. A pipeline loaded from the node arrays
+        only has those, so its artifact holds no joblib file.
+        """
+        makedir(path)
+        model = self.trainer.model
+        plan = model if isinstance(model, ForestPlan) else None
+        if plan is None and ForestPlan.supports(model):
+            plan = ForestPlan(model)
+        manifest = {
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "model_file": None if model is plan else MODEL_FILE,
+            "model_class": plan.model_class if model is plan else type(model).__name__,
+            "model_kwargs": self.trainer.model_kwargs,
+            "feature_names": self.trainer.feature_names,
+            "data_cleaner": self.data_cleaner.to_dict(),
+            "feature_enricher": self.feature_enricher.to_dict(),
+            "forest": None,
+        }
+        if model is not plan:
+            joblib.dump(model, os.path.join(path, MODEL_FILE))
+        if plan is not None:
+            makedir(os.path.join(path, FOREST_DIR))
+            for name, array in plan.to_arrays().items():
+                np.save(os.path.join(path, FOREST_DIR, name + ".npy"), array)
+            manifest["forest"] = {"dir": FOREST_DIR, "classes": plan.classes.tolist()}
+        # The manifest is written last so a directory with a manifest is always complete
+        with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load_artifact(cls, path: str, mmap: bool = True) -> InferencePipeline:
+        """
+        Loads an inference pipeline from the model artifact directory at `path`.
+
+            Parameters:
+                path `str`: Path to the model artifact directory.
+                mmap `bool`: Whether to memory-map the estimator's arrays instead of reading them
+                    into memory, so processes mapping the same artifact share those pages. Forests
+                    are then loaded as a `ForestPlan` over their memory-mapped node arrays, since
+                    scikit-learn forests copy each tree's nodes when unpickled. Without `mmap`
+                    they are loaded as the fitted scikit-learn estimator.
+        """
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            raise InvalidArtifactException(
+                f"The directory {path} does not contain a model artifact."
+            )
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest["format_version"] > ARTIFACT_FORMAT_VERSION:
+            raise InvalidArtifactException(
+                f"The model artifact at {path} has format version {manifest['format_version']}, "
+                f"but this version of the package can only read up to {ARTIFACT_FORMAT_VERSION}."
+            )
+        forest = manifest.get("forest")
+        if forest and (mmap or manifest["model_file"] is None):
+            model = ForestPlan.from_arrays(
+                {
+                    name: np.load(
+                        os.path.join(path, forest["dir"], name + ".npy"),
+                        mmap_mode="r" if mmap else None,
+                    )
+                    for name in ForestPlan.NODE_ARRAYS
+                },
+                forest["classes"],
+                manifest["model_class"],
+            )
+        elif manifest["format_version"] == 1:
+            with open(os.path.join(path, LEGACY_MODEL_FILE), "rb") as f:
+                model = pickle.load(f)
+        else:
+            model = joblib.load(
+                os.path.join(path, manifest["model_file"]),
+                # Copy-on-write, some Cython predictors need writable buffers even if they never write
+                mmap_mode="c" if mmap else None,
+            )
+
+        trainer = Trainer.from_model(model, **manifest["model_kwargs"])
+        trainer.feature_names = manifest["feature_names"]
+        return cls(
+            data_cleaner=DataCleaning.from_dict(manifest["data_cleaner"]),
+            feature_enricher=FeatureEnricher.from_dict(manifest["feature_enricher"]),
+            trainer=trainer,
+        )
+
+
+def is_artifact(path: str) -> bool:
+    """
+    Whether `path` is a model artifact directory.
+    """
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def load_inference_pipeline(path: str, mmap: bool = True) -> InferencePipeline:
+    """
+    Loads something able to make predictions from either a model artifact directory or
+    a pipeline checkpoint file. `mmap` only applies to model artifacts.
+    """
+    if is_artifact(path):
+        return InferencePipeline.load_artifact(path, mmap)
+    from .pipeline import TrainModelPipeline
+
+    return TrainModelPipeline.load(path)
+
+
+class InvalidArtifactException(Exception):
+    """Exception thrown when a model artifact is missing or can not be read by this version."""
@@ -0,0 +1,337 @@
+import datetime
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import warnings
+import zipfile
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from .dataset import TitanicDataset
+from .pipeline import TrainModelPipeline
+from .preprocessing import DataCleaning, FeatureEnricher
+from .train import Trainer, TrainerModels
+
+
+def compare_models(
+    X: pd.DataFrame,
+    y: pd.Series,
+    models: Dict[str, Dict] = None,
+    test_size: float = 0.25,
+    latency_samples: int = 100,
+    random_state: int = 0,
+) -> pd.DataFrame:
+    """
+    Trains each model on the same split of a feature matrix and compares their fit time,
+    prediction latency and accuracy.
+
+        Parameters:
+            X `pandas.DataFrame`: Preprocessed features.
+            y `pandas.Series`: Labels.
+            models `Dict[str, Dict]`: Model name in `TrainerModels` -> kwargs of the model.
+                By default every registered model with its default hyperparameters.
+            test_size `float`: Share of the rows held out to measure accuracy and batch predictions.
+            latency_samples `int`: Number of single-row predictions used for the latency percentiles.
+            random_state `int`: Seed of the train/test split.
+
+        Returns:
+            results `pandas.DataFrame`: One row per model with fit_seconds, predict_p50_ms and
+                predict_p99_ms (one row at a time), batch_rows_per_second and accuracy.
+    """
+    if models is None:
+        models = {name: {} for name in TrainerModels.names()}
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state, stratify=y
+    )
+    rows = X_test.iloc[: max(1, min(latency_samples, len(X_test)))]
+
+    results = []
+    for name, model_kwargs in models.items():
+        trainer = Trainer(name, **(model_kwargs or {}))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            start = time.perf_counter()
+            trainer.fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            predictions = trainer.predict(X_test)
+            batch_seconds = time.perf_counter() - start
+
+            latencies = []
+            for i in range(len(rows)):
+                start = time.perf_counter()
+                trainer.predict(rows.iloc[i : i + 1])
+                latencies.append(time.perf_counter() - start)
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        results.append(
+            {
+                "model": name,
+                "fit_seconds": fit_seconds,
+                "predict_p50_ms": p50,
+                "predict_p99_ms": p99,
+                "batch_rows_per_second": len(X_test) / batch_seconds,
+                "accuracy": accuracy_score(y_test, predictions),
+            }
+        )
+    return pd.DataFrame(results)
+
+
+# Pools the synthetic passengers are drawn from, with the proportions of the real data
+SURNAMES = np.array(["Braund", "Cumings", "Heikkinen", "Futrelle", "Allen", "Moran", "McCarthy", "Palsson", "Johnson", "Nasser", "Sandstrom", "Bonnell", "Saundercock", "Andersson", "Vestrom", "Hewlett", "Rice", "Williams", "Vander Planke", "Masselmani"])
+FIRST_NAMES = np.array(["Owen Harris", "John Bradley", "Laina", "Jacques Heath", "William Henry", "James", "Timothy J", "Gosta Leonard", "Oscar W", "Nicholas", "Marguerite Rut", "Elizabeth", "Anders Johan", "Hulda Amanda Adolfina", "Mary D"])
+TITLES = np.array(["Mr.", "Mrs.", "Miss.", "Master.", "Dr.", "Rev.", "Col.", "Countess."])
+TITLE_PROBABILITIES = [0.58, 0.14, 0.2, 0.045, 0.008, 0.007, 0.005, 0.015]
+FEMALE_TITLES = ["Mrs.", "Miss.", "Countess."]
+TICKET_PREFIXES = np.array(["", "", "", "", "PC ", "A/5 ", "STON/O2. ", "C.A. ", "SC/Paris ", "W./C. ", "SOTON/O.Q. ", "LINE"])
+CABIN_DECKS = np.array(list("ABCDEFGT"))
+
+# Names of the hot paths timed by `run_benchmarks`, in order
+BENCHMARKS = [
+    "create_from_zip",
+    "data_cleaning.transform",
+    "feature_enricher.fit",
+    "feature_enricher.names",
+    "feature_enricher.fam_size",
+    "feature_enricher.tickets",
+    "feature_enricher.cabins",
+    "feature_enricher.age_input",
+    "feature_enricher.dummies",
+    "checkpoint.save",
+    "checkpoint.load",
+    "trainer.predict",
+]
+
+
+def synthesize_titanic(rows: int, split: str = "train", seed: int = 0) -> pd.DataFrame:
+    """
+    Generates raw data with the columns, types and value distributions of the titanic
+    dataset, valid for the schemas of `DatasetValidator`. Used to measure how the pipeline
+    scales far beyond the size of the real data.
+
+        Parameters:
+            rows `int`: Number of passengers.
+            split `str`: 'train' includes the Survived column, 'test' does not.
+            seed `int`: Seed of the random generator.
+
+        Returns:
+            data `pandas.DataFrame`: Raw data, as it would be read from the csv files.
+    """
+    rng = np.random.default_rng(seed)
+    titles = TITLES[rng.choice(len(TITLES), rows, p=TITLE_PROBABILITIES)]
+    sex = np.where(np.isin(titles, FEMALE_TITLES), "female", "male")
+    pclass = rng.choice([1, 2, 3], rows, p=[0.24, 0.21, 0.55])
+    names = (
+        pd.Series(SURNAMES[rng.integers(0, len(SURNAMES), rows)])
+        + ", "
+        + titles
+        + " "
+        + FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), rows)]
+    )
+    age = np.round(np.clip(rng.normal(30, 14, rows), 0.42, 80), 1)
+    age[rng.random(rows) < 0.2] = np.NaN
+    tickets = pd.Series(TICKET_PREFIXES[rng.integers(0, len(TICKET_PREFIXES), rows)]) + (
+        rng.integers(1000, 3_999_999, rows).astype(str)
+    )
+    fare = np.round(rng.exponential(32, rows) / pclass, 4)
+    fare[rng.random(rows) < 0.001] = np.NaN
+    cabins = pd.Series(CABIN_DECKS[rng.integers(0, len(CABIN_DECKS), rows)]) + (
+        rng.integers(1, 149, rows).astype(str)
+    )
+    cabins = cabins.where(rng.random(rows) < 0.23 * (4 - pclass) / 2)
+    embarked = pd.Series(rng.choice(["S", "C", "Q"], rows, p=[0.72, 0.19, 0.09]))
+    embarked = embarked.where(rng.random(rows) > 0.002)
+
+    data = {"PassengerId": np.arange(1, rows + 1)}
+    if split == "train":
+        survival = np.where(sex == "female", 0.74, 0.19) * (1.4 - 0.2 * pclass)
+        data["Survived"] = (rng.random(rows) < survival).astype(np.int64)
+    data.update(
+        {
+            "Pclass": pclass,
+            "Name": names,
+            "Sex": sex,
+            "Age": age,
+            "SibSp": rng.choice(range(9), rows, p=[0.68, 0.23, 0.03, 0.02, 0.02, 0.01, 0.005, 0.003, 0.002]),
+            "Parch": rng.choice(range(7), rows, p=[0.76, 0.13, 0.09, 0.006, 0.006, 0.006, 0.002]),
+            "Ticket": tickets,
+            "Fare": fare,
+            "Cabin": cabins,
+            "Embarked": embarked,
+        }
+    )
+    return pd.DataFrame(data)
+
+
+def _timed(function, setup=None, repeat: int = 1) -> Tuple[List[float], object]:
+    """
+    Times `repeat` calls of `function`. When `setup` is given, its result is the argument of
+    each call and it is computed outside the measured time, so calls that modify their input
+    always get a fresh one. Returns the durations in seconds and the result of the last call.
+    """
+    durations, result = [], None
+    for _ in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        result = function(*args)
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def _git_commit() -> str:
+    """
+    Commit of the working tree the benchmarks run on, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    sizes: List[int] = (10_000, 1_000_000, 10_000_000),
+    repeat: int = 1,
+    validation: str = "fast",
+    vectorized: bool = False,
+    model_name: str = "RandomForest",
+    trainer_kwargs: Dict = None,
+    fit_rows: int = 10_000,
+    work_dir: str = None,
+    seed: int = 0,
+    progress=None,
+) -> dict:
+    """
+    Times the hot paths of the training and prediction pipeline on synthetic data of each size:
+    the zip ingest, `DataCleaning.transform`, the fit and each stage of `FeatureEnricher`,
+    the save and load of a full pipeline checkpoint and `Trainer.predict`. Each stage is timed
+    on the output of the previous one, as the pipeline runs them.
+
+        Parameters:
+            sizes `List[int]`: Number of training rows of each run. The test split has half of them.
+            repeat `int`: Number of times each benchmark is measured.
+            validation `str`: Validation engine of the ingest, see `DatasetValidator.read_csv`.
+            vectorized `bool`: Whether the `FeatureEnricher` uses its vectorized implementation.
+            model_name `str`: Model in `TrainerModels` used for the predictions.
+            trainer_kwargs `Dict`: Kwargs of the model. Defaults to 100 trees using every core.
+            fit_rows `int`: Number of rows the model is fitted on, the predictions use all of them.
+            work_dir `str`: Folder for the zip and checkpoint files. Defaults to a temporary folder.
+            seed `int`: Seed of the synthetic data.
+            progress `Callable[[dict], None]`: Optional callback called with each result.
+
+        Returns:
+            report `dict`: Json serializable report with the environment (commit, library
+                versions), the parameters and one result per size and benchmark, holding its
+                durations, the best one and the rows per second of the best one. `rows` is the
+                number of rows processed, which for the ingest includes the test split.
+    """
+    trainer_kwargs = (
+        {"n_estimators": 100, "n_jobs": -1} if trainer_kwargs is None else trainer_kwargs
+    )
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "versions": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+        },
+        "params": {
+            "sizes": list(sizes),
+            "repeat": repeat,
+            "validation": validation,
+            "vectorized": vectorized,
+            "model_name": model_name,
+            "trainer_kwargs": trainer_kwargs,
+            "fit_rows": fit_rows,
+            "seed": seed,
+        },
+        "results": [],
+    }
+
+    def record(size: int, name: str, durations: List[float], rows: int = None, **extra):
+        rows = size if rows is None else rows
+        result = {
+            "size": size,
+            "rows": rows,
+            "benchmark": name,
+            "seconds": durations,
+            "best_seconds": min(durations),
+            "rows_per_second": rows / max(min(durations), 1e-9),
+            **extra,
+        }
+        report["results"].append(result)
+        if progress is not None:
+            progress(result)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = work_dir or temp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        for rows in sizes:
+            zip_path = os.path.join(work_dir, f"titanic_{rows}.zip")
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for split, split_rows in [("train", rows), ("test", max(1, rows // 2))]:
+                    archive.writestr(
+                        f"{split}.csv",
+                        synthesize_titanic(split_rows, split, seed).to_csv(index=False),
+                    )
+            durations, dataset = _timed(
+                lambda: TitanicDataset.create_from_zip(
+                    zip_path, validation=validation, chunksize=100_000
+                ),
+                repeat=repeat,
+            )
+            record(rows, "create_from_zip", durations, rows + max(1, rows // 2))
+            os.remove(zip_path)
+
+            data_cleaner = DataCleaning()
+            data_cleaner.fit(dataset.train_data)
+            durations, data = _timed(
+                data_cleaner.transform, lambda: dataset.train_data, repeat
+            )
+            record(rows, "data_cleaning.transform", durations)
+
+            feature_enricher = FeatureEnricher(vectorized=vectorized)
+            durations, _ = _timed(feature_enricher.fit, lambda: data, repeat)
+            record(rows, "feature_enricher.fit", durations)
+            for stage in ["names", "fam_size", "tickets", "cabins", "age_input", "dummies"]:
+                durations, stage_data = _timed(
+                    getattr(feature_enricher, stage), data.copy, repeat
+                )
+                data = stage_data
+                record(rows, f"feature_enricher.{stage}", durations)
+
+            X, y = data.drop(columns="Survived"), data["Survived"]
+            trainer = Trainer(model_name, **trainer_kwargs)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                trainer.fit(X.iloc[:fit_rows], y.iloc[:fit_rows])
+
+            pipeline = TrainModelPipeline(base_runs_folder=os.path.join(work_dir, "runs"))
+            dataset.train_data = data
+            pipeline.dataset = dataset
+            pipeline.data_cleaner = data_cleaner
+            pipeline.feature_enricher = feature_enricher
+            pipeline.trainer = trainer
+            ckpt_path = os.path.join(work_dir, f"bench_{rows}.ckpt")
+            durations, _ = _timed(lambda: pipeline.save(ckpt_path), repeat=repeat)
+            record(rows, "checkpoint.save", durations, bytes=os.path.getsize(ckpt_path))
+            durations, _ = _timed(lambda: TrainModelPipeline.load(ckpt_path), repeat=repeat)
+            record(rows, "checkpoint.load", durations)
+            os.remove(ckpt_path)
+            del pipeline, dataset
+
+            durations, _ = _timed(trainer.predict, lambda: X, repeat)
+            record(rows, "trainer.predict", durations)
+    return report
@@ -0,0 +1,41 @@
+import hashlib
+import json
+import os
+import pickle
+
+
+class StepCache:
+    """
+    Content-addressed cache of the outputs of the pipeline steps. Each output is stored under
+    the hash of everything the step depends on (see `key`), so it is reused only when all of
+    its inputs are exactly the same. Entries are written at `entry_path` by the pipeline's
+    `CheckpointWriter`, in the background like the checkpoints.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def key(cls, *parts) -> str:
+        """
+        Hashes the given json serializable parts, e.g. the key of the previous step,
+        a code version and the step's arguments.
+        """
+        serialized = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode()).hexdigest()
+
+    def entry_path(self, step: str, key: str) -> str:
+        """
+        File holding the cached output of `step` for `key`.
+        """
+        return os.path.join(self.cache_dir, step, key + ".pkl")
+
+    def load(self, step: str, key: str) -> dict:
+        """
+        Returns the cached output of `step` for `key` or None if it was not cached.
+        """
+        entry_path = self.entry_path(step, key)
+        if not os.path.isfile(entry_path):
+            return None
+        with open(entry_path, "rb") as f:
+            return pickle.load(f)
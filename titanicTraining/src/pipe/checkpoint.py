@@ -0,0 +1,87 @@
+import os
+import pickle
+import queue
+import tempfile
+import threading
+
+
+def write_pickle(path: str, obj):
+    """
+    Pickles `obj` into `path` atomically: it is written and flushed to disk in a temporary
+    file of the same folder first and then renamed, so `path` either holds the previous
+    content or the complete new one, even if the process dies halfway.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", dir=os.path.dirname(path) or "."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints in a background thread so the pipeline can go on with the next step
+    while they are serialized and written. Writes happen in submission order, each one with
+    `write_pickle`, and `wait` blocks until all the submitted ones are on disk.
+
+    The submitted objects must not be modified afterwards. The pipeline steps never modify
+    the outputs of previous steps in place, they replace them, so a shallow copy of the
+    step's attributes is enough as a snapshot.
+    """
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+        self.thread: threading.Thread = None
+        self.error: BaseException = None
+
+    def submit(self, path: str, obj):
+        """
+        Queues `obj` to be pickled into `path`.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name="checkpoint-writer", daemon=True
+            )
+            self.thread.start()
+        self.queue.put((path, obj))
+
+    def _run(self):
+        while True:
+            path, obj = self.queue.get()
+            try:
+                write_pickle(path, obj)
+            except BaseException as e:
+                if self.error is None:
+                    self.error = e
+            finally:
+                self.queue.task_done()
+
+    def wait(self):
+        """
+        Blocks until every submitted checkpoint is written. Raises a `CheckpointWriteException`
+        if any of them failed.
+        """
+        self.queue.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise CheckpointWriteException(
+                f"A checkpoint could not be written: {error}"
+            ) from error
+
+    def __getstate__(self):
+        # Threads and queues can not be pickled, a copy starts with no pending writes
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+
+class CheckpointWriteException(Exception):
+    """Exception thrown when a checkpoint could not be written."""
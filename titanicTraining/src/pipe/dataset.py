@@ -1,11 +1,44 @@
 from __future__ import annotations
 import pandas as pd
+import numpy as np
 import os
+import zipfile
+import hashlib
 import shutil
+import tempfile
+import contextlib
+from typing import Dict, Iterator, Tuple
 import pandera as pa
+from .validation import FastSchemaValidator
 
 
-DEFAULT_TEMP_UNZIP_DIR = os.path.join("temp", "data", "titanic")
+# Types of the raw columns that pandas could infer differently depending on the rows it sees
+# (e.g. a chunk where every ticket is numeric). Used when reading raw data in chunks.
+RAW_CSV_DTYPES = {
+    "Name": str,
+    "Sex": str,
+    "Ticket": str,
+    "Cabin": str,
+    "Embarked": str,
+    "Age": float,
+    "Fare": float,
+}
+
+# Version of the validation schema and of the cached dtypes. Bump it whenever any of them
+# change so previously cached data is not reused.
+SCHEMA_VERSION = 2
+
+# Rows per chunk of a `StreamingDataset` when no chunksize is given
+STREAM_CHUNKSIZE = 100_000
+
+# Compact types of the validated data kept in the cache
+CACHE_DTYPES = {
+    "Pclass": "int8",
+    "Sex": pd.CategoricalDtype(["female", "male"]),
+    "SibSp": "int8",
+    "Parch": "int8",
+    "Embarked": pd.CategoricalDtype(["S", "C", "Q"]),
+}
 
 
 class TitanicDataset:
@@ -14,44 +47,149 @@ class TitanicDataset:
     validation.
     """
 
-    def __init__(self, train_path: str, test_path: str):
+    def __init__(
+        self,
+        train_path: str,
+        test_path: str,
+        cache_dir: str = "",
+        validation: str = "pandera",
+        chunksize: int = None,
+        validation_sample: int = None,
+    ):
         """
         Reads and validates the training and testing data from paths.
 
             Parameters:
                 train_path `str`: Path to the train file.
                 test_path `str`: Path to the test file.
+                cache_dir `str`: Optional folder of a `DatasetCache`. When given, the validated
+                    data is cached there and later reads of the same files skip parsing and validation.
+                validation `str`: Validation engine, either 'pandera' or 'fast'. See `DatasetValidator.read_csv`.
+                chunksize `int`: Optional number of rows per chunk when streaming the files with the 'fast' engine.
+                validation_sample `int`: Optional number of rows per file, or per chunk, on which the 'fast'
+                    engine runs the value checks. See `FastSchemaValidator`.
         """
         if DatasetValidator.validate_paths(train_path, test_path):
-            unvalidated_train_data: pd.DataFrame = pd.read_csv(train_path)
-            self.train_data: pd.DataFrame = DatasetValidator.validate_data_schema(
-                unvalidated_train_data, "train"
-            )
+            if cache_dir:
+                cache = DatasetCache(cache_dir)
+                key = cache.key(train_path, test_path, validation_sample=validation_sample)
+                cached = cache.load(key)
+                if cached is None:
+                    cached = cache.save(
+                        key,
+                        TitanicDataset(
+                            train_path,
+                            test_path,
+                            validation=validation,
+                            chunksize=chunksize,
+                            validation_sample=validation_sample,
+                        ),
+                    )
+                self.train_data, self.test_data = cached.train_data, cached.test_data
+                return
 
-            unvalidated_test_data: pd.DataFrame = pd.read_csv(test_path)
-            self.test_data: pd.DataFrame = DatasetValidator.validate_data_schema(
-                unvalidated_test_data, "test"
+            self.train_data: pd.DataFrame = DatasetValidator.read_csv(
+                train_path, "train", validation, chunksize, validation_sample
             )
+            self.test_data: pd.DataFrame = DatasetValidator.read_csv(
+                test_path, "test", validation, chunksize, validation_sample
+            )
+
+    @classmethod
+    def from_dataframes(
+        cls,
+        train_data: pd.DataFrame,
+        test_data: pd.DataFrame,
+        validation: str = "pandera",
+        validation_sample: int = None,
+    ) -> TitanicDataset:
+        """
+        Validates already read training and testing data.
+
+            Parameters:
+                train_data `pandas.DataFrame`: Raw training data.
+                test_data `pandas.DataFrame`: Raw testing data.
+                validation `str`: Validation engine, either 'pandera' or 'fast'.
+                validation_sample `int`: Optional number of rows per frame on which the 'fast' engine
+                    runs the value checks.
+            Returns:
+                dataset `TitanicDataset`: Validated Dataset.
+        """
+        dataset: TitanicDataset = cls.__new__(cls)
+        dataset.train_data = DatasetValidator.validate_data_schema(
+            train_data, "train", validation, validation_sample
+        )
+        dataset.test_data = DatasetValidator.validate_data_schema(
+            test_data, "test", validation, validation_sample
+        )
+        return dataset
 
     @classmethod
-    def create_from_zip(cls, zip_path: str) -> TitanicDataset:
+    def create_from_zip(
+        cls,
+        zip_path: str,
+        cache_dir: str = "",
+        validation: str = "pandera",
+        chunksize: int = None,
+        validation_sample: int = None,
+    ) -> TitanicDataset:
         """
-        Takes a zip file path, unzip it in a temporary location to
-        read the data and deletes the temporary directory.
+        Takes a zip file path and reads the train and test csv files directly from
+        the archive members, without extracting them to disk. The files can be anywhere
+        inside the archive.
 
             Parameters:
                 zip_path `str`: Path to the zip file containing the train and test data
+                cache_dir `str`: Optional folder of a `DatasetCache`. When given, the validated
+                    data is cached there and later reads of the same zip skip parsing and validation.
+                validation `str`: Validation engine, either 'pandera' or 'fast'. See `DatasetValidator.read_csv`.
+                chunksize `int`: Optional number of rows per chunk when streaming the members with the 'fast' engine.
+                validation_sample `int`: Optional number of rows per file, or per chunk, on which the 'fast'
+                    engine runs the value checks. See `FastSchemaValidator`.
             Returns:
                 dataset `TitanicDataset`: Validated Dataset.
         """
         if os.path.isfile(zip_path):
             if zip_path.endswith(".zip"):
-                shutil.unpack_archive(zip_path, DEFAULT_TEMP_UNZIP_DIR)
-                dataset: TitanicDataset = TitanicDataset(
-                    train_path=os.path.join(DEFAULT_TEMP_UNZIP_DIR, "train.csv"),
-                    test_path=os.path.join(DEFAULT_TEMP_UNZIP_DIR, "test.csv"),
-                )
-                shutil.rmtree(DEFAULT_TEMP_UNZIP_DIR)
+                if cache_dir:
+                    cache = DatasetCache(cache_dir)
+                    key = cache.key(zip_path, validation_sample=validation_sample)
+                    cached = cache.load(key)
+                    if cached is None:
+                        cached = cache.save(
+                            key,
+                            cls.create_from_zip(
+                                zip_path,
+                                validation=validation,
+                                chunksize=chunksize,
+                                validation_sample=validation_sample,
+                            ),
+                        )
+                    return cached
+
+                try:
+                    with zipfile.ZipFile(zip_path) as archive:
+                        members = {
+                            os.path.basename(name): name
+                            for name in archive.namelist()
+                        }
+                        data = {}
+                        for split in ["train", "test"]:
+                            file_name = f"{split}.csv"
+                            if file_name not in members:
+                                raise DatasetIngestionException(
+                                    f"The zip file {zip_path} does not contain a {file_name} file."
+                                )
+                            with archive.open(members[file_name]) as member:
+                                data[split] = DatasetValidator.read_csv(
+                                    member, split, validation, chunksize, validation_sample
+                                )
+                except zipfile.BadZipFile as e:
+                    raise DatasetIngestionException(
+                        f"The specified file {zip_path} is not a valid zip file: {e}"
+                    )
+                dataset: TitanicDataset = cls.__new__(cls)
+                dataset.train_data, dataset.test_data = data["train"], data["test"]
                 return dataset
             else:
                 raise DatasetIngestionException(
@@ -63,6 +201,229 @@ class TitanicDataset:
             )
 
 
+class StreamingDataset:
+    """
+    Training and testing data larger than memory. Nothing is read up front: every call to
+    `chunks` streams the csv file again, from disk or from the zip archive, validating each
+    chunk as it is parsed (see `DatasetValidator.iter_csv`).
+    """
+
+    def __init__(
+        self,
+        train_path: str = "",
+        test_path: str = "",
+        zip_path: str = "",
+        validation: str = "fast",
+        chunksize: int = STREAM_CHUNKSIZE,
+        validation_sample: int = None,
+    ):
+        """
+        Checks that the data sources exist.
+
+            Parameters:
+                train_path `str`: Path to the train file.
+                test_path `str`: Path to the test file.
+                zip_path `str`: Path to a zip file with the train and test files, used instead of the paths.
+                validation `str`: Validation engine, either 'pandera' or 'fast'.
+                chunksize `int`: Number of rows per chunk.
+                validation_sample `int`: Optional number of rows per chunk on which the 'fast' engine
+                    runs the value checks.
+        """
+        self.train_path = train_path
+        self.test_path = test_path
+        self.zip_path = zip_path
+        self.validation = validation
+        self.chunksize = chunksize
+        self.validation_sample = validation_sample
+        # Rows of each split, known once it was streamed entirely
+        self.rows: Dict[str, int] = {}
+        if zip_path:
+            with self._open_zip() as archive:
+                self._zip_members(archive)
+        else:
+            DatasetValidator.validate_paths(train_path, test_path)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "validation_sample" not in state:
+            # Datasets pickled before the validation could be sampled
+            self.validation_sample = None
+
+    @contextlib.contextmanager
+    def _open_zip(self):
+        if not os.path.isfile(self.zip_path):
+            raise DatasetIngestionException(
+                f"The specified path {self.zip_path} does not contain a file."
+            )
+        if not self.zip_path.endswith(".zip"):
+            raise DatasetIngestionException(
+                f"The specified file {self.zip_path} is not a .zip file."
+            )
+        try:
+            with zipfile.ZipFile(self.zip_path) as archive:
+                yield archive
+        except zipfile.BadZipFile as e:
+            raise DatasetIngestionException(
+                f"The specified file {self.zip_path} is not a valid zip file: {e}"
+            )
+
+    def _zip_members(self, archive: zipfile.ZipFile) -> Dict[str, str]:
+        """
+        Split -> name of its csv file inside the archive.
+        """
+        members = {os.path.basename(name): name for name in archive.namelist()}
+        for split in ["train", "test"]:
+            if f"{split}.csv" not in members:
+                raise DatasetIngestionException(
+                    f"The zip file {self.zip_path} does not contain a {split}.csv file."
+                )
+        return {split: members[f"{split}.csv"] for split in ["train", "test"]}
+
+    def chunks(self, split: str = "train") -> Iterator[pd.DataFrame]:
+        """
+        Streams the validated chunks of a split, either 'train' or 'test'. Chunks are only
+        yielded once they are valid: the stream fails on the first invalid chunk, so the
+        transformers and the model are never fitted on invalid data.
+        """
+        rows = 0
+        if self.zip_path:
+            with self._open_zip() as archive:
+                member = self._zip_members(archive)[split]
+                with archive.open(member) as source:
+                    for chunk in DatasetValidator.iter_csv(
+                        source,
+                        split,
+                        self.validation,
+                        self.chunksize,
+                        self.validation_sample,
+                        fail_fast=True,
+                    ):
+                        rows += len(chunk)
+                        yield chunk
+        else:
+            source = self.train_path if split == "train" else self.test_path
+            for chunk in DatasetValidator.iter_csv(
+                source,
+                split,
+                self.validation,
+                self.chunksize,
+                self.validation_sample,
+                fail_fast=True,
+            ):
+                rows += len(chunk)
+                yield chunk
+        self.rows[split] = rows
+
+
+class DatasetCache:
+    """
+    Local cache of validated datasets. The data is stored in feather files with compact
+    dtypes (see `CACHE_DTYPES`) under a key made of the hash of the source files' content
+    and the `SCHEMA_VERSION`, so a cached entry is only reused for the exact same data.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def key(cls, *paths: str, validation_sample: int = None) -> str:
+        """
+        Hashes the content of the given source files together with the schema version. Data
+        whose values were only checked on a `validation_sample` gets its own key, so it is never
+        taken for fully validated data.
+        """
+        digest = hashlib.sha256(f"schema-{SCHEMA_VERSION}".encode())
+        if validation_sample is not None:
+            digest.update(f"sample-{validation_sample}".encode())
+        for path in paths:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        """
+        Folder holding the cached entry of `key`.
+        """
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str) -> TitanicDataset:
+        """
+        Returns the cached dataset for `key` or None if it was not cached.
+        """
+        entry_path = self.entry_path(key)
+        if not os.path.isdir(entry_path):
+            return None
+        dataset: TitanicDataset = TitanicDataset.__new__(TitanicDataset)
+        dataset.train_data, dataset.test_data = self.restore_missing(
+            pd.read_feather(os.path.join(entry_path, "train.feather")),
+            pd.read_feather(os.path.join(entry_path, "test.feather")),
+        )
+        return dataset
+
+    def save(self, key: str, dataset: TitanicDataset) -> TitanicDataset:
+        """
+        Converts the dataset to the compact dtypes and caches it under `key`. The entry is
+        written in a temporary folder first and then renamed, so concurrent writers and
+        readers never see a partial entry.
+
+            Returns:
+                dataset `TitanicDataset`: The dataset with the compact dtypes, exactly as it
+                will be read from the cache.
+        """
+        dataset.train_data, dataset.test_data = self.compact(
+            dataset.train_data, dataset.test_data
+        )
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix=f"{key}.", dir=self.cache_dir)
+        dataset.train_data.to_feather(os.path.join(temp_path, "train.feather"))
+        dataset.test_data.to_feather(os.path.join(temp_path, "test.feather"))
+        try:
+            os.rename(temp_path, self.entry_path(key))
+        except OSError:
+            # Another process cached the same data first
+            shutil.rmtree(temp_path, ignore_errors=True)
+        return dataset
+
+    @classmethod
+    def restore_missing(cls, *frames: pd.DataFrame) -> Tuple[pd.DataFrame, ...]:
+        """
+        Feather reads the missing values of string columns as None. They are turned back into
+        NaN, as `pandas.read_csv` leaves them, so cached and fresh data are the same.
+        """
+        for frame in frames:
+            for column in frame.columns[frame.dtypes == object]:
+                frame[column] = frame[column].fillna(np.NaN)
+        return frames
+
+    @classmethod
+    def compact(cls, *frames: pd.DataFrame) -> Tuple[pd.DataFrame, ...]:
+        """
+        Converts the frames to the compact cache dtypes. Integer columns with values out of the
+        range of their compact type keep their type, since casting would wrap them around.
+        """
+        return tuple(
+            frame.astype(cls.compact_dtypes(frame)).reset_index(drop=True)
+            for frame in frames
+        )
+
+    @classmethod
+    def compact_dtypes(cls, frame: pd.DataFrame) -> dict:
+        """
+        Column -> compact dtype of the columns of `frame` that can be converted without loss.
+        """
+        dtypes = {}
+        for col, dtype in CACHE_DTYPES.items():
+            if col not in frame:
+                continue
+            if pd.api.types.is_integer_dtype(dtype) and len(frame):
+                limits = np.iinfo(dtype)
+                if frame[col].min() < limits.min or frame[col].max() > limits.max:
+                    continue
+            dtypes[col] = dtype
+        return dtypes
+
+
 class DatasetValidator:
     """
     Class with a series of utility functions to validate the existence
@@ -135,7 +496,27 @@ class DatasetValidator:
         return True
 
     @classmethod
-    def validate_data_schema(cls, data: pd.DataFrame, split: str = "test") -> bool:
+    def schema(cls, split: str) -> pa.DataFrameSchema:
+        """
+        Returns the validation schema of the given split, either 'train' or 'test'.
+        """
+        if split == "test":
+            return cls.test_schema
+        elif split == "train":
+            return cls.train_schema
+        else:
+            raise InvalidOptionException(
+                f'{split} is an invalid option for split. Valid options are "train" or "test".'
+            )
+
+    @classmethod
+    def validate_data_schema(
+        cls,
+        data: pd.DataFrame,
+        split: str = "test",
+        engine: str = "pandera",
+        sample: int = None,
+    ) -> pd.DataFrame:
         """
         This will validate the data compliance with the expected schema. This validation is crucial
         for the for the rest of the ML pipeline to function properly.
@@ -143,19 +524,92 @@ class DatasetValidator:
             Parameters:
                 data `pandas.DataFrame`: Data to validate.
                 split `str`: Either 'train' or 'test'. Used to chose the appropiate validation schema.
+                engine `str`: Either 'pandera', which stops at the first failing check, or 'fast',
+                    the vectorized `FastSchemaValidator` which reports every failure at once.
+                sample `int`: Only for the 'fast' engine. Number of rows on which the value checks are run.
 
             Returns:
                 validated_Data `pandas.DataFrame`: Validated Data.
         """
-        if split == "test":
-            return cls.test_schema(data)
-        elif split == "train":
-            return cls.train_schema(data)
+        schema = cls.schema(split)
+        if engine == "pandera":
+            return schema(data)
+        elif engine == "fast":
+            return FastSchemaValidator(schema, sample).validate(data)
         else:
             raise InvalidOptionException(
-                f'{split} is an invalid option for split. Valid options are "train" or "test".'
+                f'{engine} is an invalid option for engine. Valid options are "pandera" or "fast".'
             )
 
+    @classmethod
+    def read_csv(
+        cls,
+        source,
+        split: str = "test",
+        engine: str = "pandera",
+        chunksize: int = None,
+        sample: int = None,
+    ) -> pd.DataFrame:
+        """
+        Reads and validates a raw csv file. With the 'fast' engine and a `chunksize` the file is
+        streamed and each chunk is validated as soon as it is parsed; the failures of every chunk
+        (duplicated ids across chunks included) are reported together once the whole file was read.
+        Chunks are parsed with `RAW_CSV_DTYPES` so their types do not depend on the rows they hold.
+
+            Parameters:
+                source `str | file`: Path or file object of the csv file.
+                split `str`: Either 'train' or 'test'. Used to chose the appropiate validation schema.
+                engine `str`: Either 'pandera' or 'fast'.
+                chunksize `int`: Optional number of rows per chunk. Only for the 'fast' engine.
+                sample `int`: Only for the 'fast' engine. Number of rows per chunk on which the value
+                    checks are run.
+
+            Returns:
+                validated_Data `pandas.DataFrame`: Validated Data.
+        """
+        if engine == "fast" and chunksize:
+            return pd.concat(list(cls.iter_csv(source, split, engine, chunksize, sample)))
+        return cls.validate_data_schema(pd.read_csv(source), split, engine, sample)
+
+    @classmethod
+    def iter_csv(
+        cls,
+        source,
+        split: str = "test",
+        engine: str = "fast",
+        chunksize: int = STREAM_CHUNKSIZE,
+        sample: int = None,
+        fail_fast: bool = False,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Streams a raw csv file in validated chunks parsed with `RAW_CSV_DTYPES`. With the 'fast'
+        engine the failures of every chunk (duplicated ids across chunks included) are raised
+        together once the last chunk was yielded, or as soon as a chunk fails with `fail_fast`.
+        With 'pandera' each chunk is validated on its own, so ids are only checked to be unique
+        within a chunk.
+
+            Parameters:
+                source `str | file`: Path or file object of the csv file.
+                split `str`: Either 'train' or 'test'. Used to chose the appropiate validation schema.
+                engine `str`: Either 'pandera' or 'fast'.
+                chunksize `int`: Number of rows per chunk.
+                sample `int`: Only for the 'fast' engine. Number of rows per chunk on which the value
+                    checks are run.
+                fail_fast `bool`: Only for the 'fast' engine. Raise on the first invalid chunk,
+                    before it is yielded.
+
+            Returns:
+                chunks `Iterator[pandas.DataFrame]`: Validated chunks.
+        """
+        chunks = pd.read_csv(source, dtype=RAW_CSV_DTYPES, chunksize=chunksize)
+        if engine == "fast":
+            yield from FastSchemaValidator(cls.schema(split), sample).validate_chunks(
+                chunks, fail_fast
+            )
+        else:
+            for chunk in chunks:
+                yield cls.validate_data_schema(chunk, split, engine)
+
 
 class DatasetIngestionException(Exception):
     """Exception thrown when there is an error reading the specified data source"""
@@ -0,0 +1,132 @@
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows, where the peak RSS is not reported
+    resource = None
+
+
+# Recorder of the stage being measured in the current context, see `measure`
+_active_recorder: contextvars.ContextVar = contextvars.ContextVar(
+    "active_metrics_recorder", default=None
+)
+
+
+def peak_rss() -> int:
+    """
+    Peak resident set size of the process so far in bytes, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports it in kilobytes and macOS in bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsRecorder:
+    """
+    Records the wall time, CPU time, peak RSS and throughput of the stages of a run. Stages can
+    be nested, and each one is recorded under the names of its enclosing stages joined by '/',
+    e.g. 'preprocessing/train_data/feature_enricher.names'.
+
+    While a stage is measured the recorder is active, so the `measure` calls of the code it
+    runs (e.g. the `FeatureEnricher` stages, which know nothing about the pipeline) are
+    recorded as its nested stages.
+
+    Hooks are called with the record of each stage as soon as it finishes, so the metrics can be
+    forwarded somewhere else (logs, a monitoring system) while the run is still going.
+    """
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self.hooks: List[Callable[[dict], None]] = []
+        self.stack: List[str] = []
+
+    def add_hook(self, hook: Callable[[dict], None]):
+        """
+        Registers a function called with the record of every finished stage.
+        """
+        self.hooks.append(hook)
+
+    @contextlib.contextmanager
+    def measure(self, name: str, rows: int = None):
+        """
+        Measures the block as the stage `name`. The yielded record can be updated inside the
+        block, e.g. setting its 'rows' once they are known.
+
+        The CPU time is the one of the whole process, so it includes the threads the stage
+        starts but not its child processes. The peak RSS is the high-water mark of the process
+        when the stage finished, and `peak_rss_increase_bytes` how much the stage raised it.
+
+            Parameters:
+                name `str`: Name of the stage.
+                rows `int`: Optional number of rows the stage processes.
+        """
+        self.stack.append(name)
+        record = {"stage": "/".join(self.stack), "rows": rows}
+        token = _active_recorder.set(self)
+        start_peak = peak_rss()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            _active_recorder.reset(token)
+            wall_seconds = time.perf_counter() - start_wall
+            cpu_seconds = time.process_time() - start_cpu
+            end_peak = peak_rss()
+            self.stack.pop()
+            record.update(
+                {
+                    "wall_seconds": wall_seconds,
+                    "cpu_seconds": cpu_seconds,
+                    "peak_rss_bytes": end_peak,
+                    "peak_rss_increase_bytes": end_peak - start_peak
+                    if end_peak is not None
+                    else None,
+                    "rows_per_second": record["rows"] / wall_seconds
+                    if record["rows"] is not None and wall_seconds > 0
+                    else None,
+                }
+            )
+            self.records.append(record)
+            for hook in self.hooks:
+                hook(record)
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the records in the order the stages finished, ready to be dumped as json.
+        """
+        return {"stages": self.records}
+
+    def save(self, path: str):
+        """
+        Writes the records as json in the given path.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def __getstate__(self):
+        # Hooks are usually closures or bound methods that can not be pickled
+        return {"records": self.records, "hooks": [], "stack": []}
+
+
+@contextlib.contextmanager
+def measure(name: str, rows: int = None):
+    """
+    Measures the block as the stage `name` of the active `MetricsRecorder`, if there is one.
+    Otherwise the block runs without being measured.
+    """
+    recorder: MetricsRecorder = _active_recorder.get()
+    if recorder is None:
+        yield {"stage": name, "rows": rows}
+        return
+    with recorder.measure(name, rows) as record:
+        yield record
@@ -1,15 +1,54 @@
 from abc import ABC, abstractmethod
-from .dataset import TitanicDataset
-from .preprocessing import DataCleaning, FeatureEnricher
+import pandas as pd
+from .dataset import TitanicDataset, DatasetCache, StreamingDataset, STREAM_CHUNKSIZE
+from .preprocessing import DataCleaning, FeatureEnricher, PREPROCESSING_VERSION
 from .train import Trainer
+from .artifact import InferencePipeline, ARTIFACT_SUFFIX
+from .tune import HyperparameterSearch
+from .cache import StepCache
+from .checkpoint import CheckpointWriter, CheckpointWriteException, write_pickle
+from .metrics import MetricsRecorder
 from rich import print
-import pandas as pd
 from .utils import makedir, make_current_runs_folder
+from typing import Iterator, Tuple
 import warnings
 import pickle
+import copy
+import yaml
 import os
 
 
+# Version of the checkpoint layout. Bump it whenever the checkpoint contents change.
+CHECKPOINT_FORMAT_VERSION = 1
+
+# Attributes produced by each step. They are what the step's checkpoint and cache entry hold.
+STEP_OUTPUTS = {
+    "ingest": ["dataset"],
+    "preprocessing": ["dataset", "data_cleaner", "feature_enricher"],
+    "tune": ["trainer_kwargs"],
+    "train": ["trainer"],
+    "evaluate": ["evaluation"],
+}
+
+# Attributes configuring the pipeline, stored in every checkpoint
+CONFIG_ATTRIBUTES = [
+    "train_path",
+    "test_path",
+    "zip_path",
+    "data_cache_dir",
+    "validation",
+    "ingest_chunksize",
+    "validation_sample",
+    "step_cache_dir",
+    "sparse_features",
+    "out_of_core",
+    "model_name",
+    "trainer_kwargs",
+    "model_ckpt_name",
+    "base_runs_folder",
+]
+
+
 class Pipeline(ABC):
     """
     Abstract class representing a Pipeline.
@@ -24,7 +63,7 @@ class Pipeline(ABC):
         pass
 
 
-class TrainModelPipeline(Pipeline):
+class TrainModelPipeline(InferencePipeline, Pipeline):
     def __init__(
         self,
         train_path: str = "",
@@ -32,16 +71,45 @@ class TrainModelPipeline(Pipeline):
         zip_path: str = "",
         base_runs_folder: str = "runs",
         model_ckpt_name: str = "train_pipeline",
+        data_cache_dir: str = "",
+        validation: str = "pandera",
+        ingest_chunksize: int = None,
+        validation_sample: int = None,
+        step_cache_dir: str = "",
+        sparse_features: bool = False,
+        out_of_core: bool = False,
+        model_name: str = "RandomForest",
         **trainer_kwargs
     ):
+        """
+        Parameters:
+            validation_sample `int`: Optional number of rows per file, or per chunk, on which the
+                'fast' validation runs the value checks. Column presence, dtypes and uniqueness
+                are still checked on every row.
+            out_of_core `bool`: Whether to stream the training data in chunks of `ingest_chunksize`
+                rows instead of loading it, for data larger than memory. The transformers are
+                fitted with `fit_chunks`, the model with `Trainer.fit_chunks` and the evaluation
+                is streamed as well. The data cache is not used and tuning is not available.
+        """
+        super().__init__()
         self.next_step = self.run
         self.dataset = None
+        self.evaluation = None
+        self.last_ckpt_path = None
+        self.checkpoint_writer = CheckpointWriter()
+        self.metrics = MetricsRecorder()
         self.train_path = train_path
         self.test_path = test_path
         self.zip_path = zip_path
-        self.data_cleaner = None
-        self.feature_enricher = None
-        self.trainer = None
+        self.data_cache_dir = data_cache_dir
+        self.validation = validation
+        self.ingest_chunksize = ingest_chunksize
+        self.validation_sample = validation_sample
+        self.step_cache_dir = step_cache_dir
+        self.step_keys = None
+        self.sparse_features = sparse_features
+        self.out_of_core = out_of_core
+        self.model_name = model_name
         self.trainer_kwargs = trainer_kwargs
         self.model_ckpt_name = model_ckpt_name
         self.base_runs_folder = base_runs_folder
@@ -54,113 +122,473 @@ class TrainModelPipeline(Pipeline):
         makedir(self.base_runs_folder)
         self.current_run_folder = make_current_runs_folder(self.base_runs_folder)
 
+    @property
+    def next_step_name(self) -> str:
+        """
+        Name of the next step in line, None once the pipeline finished.
+        """
+        return self.next_step.__name__ if self.next_step is not None else None
+
+    def checkpoint(self, step_name: str, state: dict, previous: str = None) -> dict:
+        """
+        Builds the checkpoint of a step: the pipeline config, the attributes in `state`
+        and the path of the previous checkpoint, relative to this one.
+        """
+        return {
+            "format_version": CHECKPOINT_FORMAT_VERSION,
+            "step": step_name,
+            "next_step": self.next_step_name,
+            "config": {name: getattr(self, name) for name in CONFIG_ATTRIBUTES},
+            "state": state,
+            "previous": previous,
+        }
+
+    def snapshot(self, names) -> dict:
+        """
+        Shallow copies of the given attributes. Steps replace the outputs of the previous
+        steps instead of modifying them, so this is enough to write them in the background.
+        """
+        return {name: copy.copy(getattr(self, name)) for name in names}
+
     def save(self, path):
         """
-        Saves self in the fiven path
+        Saves a self-contained checkpoint of the whole pipeline state in the given path
+        """
+        state = self.snapshot(
+            name for names in STEP_OUTPUTS.values() for name in names
+        )
+        write_pickle(path, self.checkpoint("snapshot", state))
+
+    def save_metrics(self):
+        """
+        Writes the metrics of the steps measured so far as 'metrics.json' in the run folder.
         """
-        f = open(path, "wb")
-        pickle.dump(self, f)
-        f.close()
+        self.metrics.save(os.path.join(self.current_run_folder, "metrics.json"))
+
+    def wait_for_checkpoints(self):
+        """
+        Blocks until every checkpoint and cache entry queued so far is written.
+        """
+        self.checkpoint_writer.wait()
+
+    def finish_steps(self, failed: bool = False):
+        """
+        Saves the metrics and waits for the queued checkpoints once the steps stopped. When a
+        step failed, a checkpoint that could not be written is only reported, so the exception
+        of the step is the one that propagates.
+        """
+        self.save_metrics()
+        if not failed:
+            self.wait_for_checkpoints()
+            return
+        try:
+            self.wait_for_checkpoints()
+        except CheckpointWriteException as e:
+            print(f"[bold yellow]Warning:[/bold yellow] {e}")
 
     @classmethod
     def load(cls, path):
         """
-        Loads instance object from the specified path
+        Loads a pipeline from the checkpoint at the specified path. Step checkpoints only hold
+        what their step produced, so the checkpoints of the previous steps are followed back to
+        the last one holding a dataset and their states are reassembled in order.
         """
-        f = open(path, "rb")
-        instance = pickle.load(f)
-        f.close()
+        checkpoints = []
+        ckpt_path = path
+        while True:
+            with open(ckpt_path, "rb") as f:
+                ckpt = pickle.load(f)
+            if isinstance(ckpt, TrainModelPipeline):
+                # Checkpoints written before step checkpoints pickled the whole pipeline
+                return ckpt
+            if ckpt["format_version"] > CHECKPOINT_FORMAT_VERSION:
+                raise InvalidCheckpointException(
+                    f"The checkpoint at {ckpt_path} has format version {ckpt['format_version']}, "
+                    f"but this version of the package can only read up to {CHECKPOINT_FORMAT_VERSION}."
+                )
+            checkpoints.append(ckpt)
+            if "dataset" in ckpt["state"] or ckpt["previous"] is None:
+                break
+            ckpt_path = os.path.join(os.path.dirname(ckpt_path), ckpt["previous"])
+            if not os.path.isfile(ckpt_path):
+                raise InvalidCheckpointException(
+                    f"The checkpoint at {path} depends on {ckpt_path}, which does not exist."
+                )
+
+        instance: TrainModelPipeline = cls.__new__(cls)
+        InferencePipeline.__init__(instance)
+        instance.dataset = None
+        instance.evaluation = None
+        instance.step_keys = None
+        instance.validation_sample = None
+        instance.sparse_features = False
+        instance.out_of_core = False
+        instance.model_name = "RandomForest"
+        instance.checkpoint_writer = CheckpointWriter()
+        instance.metrics = MetricsRecorder()
+        instance.__dict__.update(checkpoints[0]["config"])
+        for ckpt in reversed(checkpoints):
+            instance.__dict__.update(ckpt["state"])
+        next_step = checkpoints[0]["next_step"]
+        instance.next_step = getattr(instance, next_step) if next_step else None
+        instance.current_run_folder = os.path.dirname(os.path.dirname(path))
+        instance.last_ckpt_path = os.path.abspath(path)
         return instance
 
     def create_and_save_ckpt(self, step_name: str):
         """
-        Saves a checkpoint of self into the correct folder.
+        Saves the checkpoint of a finished step into the correct folder. It only holds the
+        attributes the step produced (see `STEP_OUTPUTS`) and a reference to the previous
+        checkpoint. The checkpoint is written in the background by the `CheckpointWriter`.
         """
         step_dir = os.path.join(self.current_run_folder, step_name)
         makedir(step_dir)
-        ckpt_path = os.path.join(step_dir, self.model_ckpt_name + ".ckpt")
-        self.save(ckpt_path)
+        ckpt_path = os.path.abspath(
+            os.path.join(step_dir, self.model_ckpt_name + ".ckpt")
+        )
+        previous = (
+            os.path.relpath(self.last_ckpt_path, step_dir)
+            if self.last_ckpt_path
+            else None
+        )
+        state = self.snapshot(STEP_OUTPUTS[step_name])
+        self.checkpoint_writer.submit(
+            ckpt_path, self.checkpoint(step_name, state, previous)
+        )
+        self.last_ckpt_path = ckpt_path
+
+    def compute_step_keys(self) -> dict:
+        """
+        Computes the cache key of each cached step from the hash of the source data, the
+        preprocessing code version and the trainer kwargs. Out of core, the chunk size is part
+        of the keys too, since the streamed dataset keeps it and the forest is grown chunk by
+        chunk. The ingested data itself is cached by the `DatasetCache` of `data_cache_dir`.
+        """
+        sources = [self.zip_path] if self.zip_path else [self.train_path, self.test_path]
+        inputs = [self.sparse_features, self.out_of_core]
+        if self.out_of_core:
+            inputs.append(self.ingest_chunksize or STREAM_CHUNKSIZE)
+        preprocessing_key = StepCache.key(
+            "preprocessing",
+            DatasetCache.key(*sources, validation_sample=self.validation_sample),
+            PREPROCESSING_VERSION,
+            *inputs,
+        )
+        train_key = StepCache.key(
+            "train", preprocessing_key, self.model_name, self.trainer_kwargs
+        )
+        return {"preprocessing": preprocessing_key, "train": train_key}
+
+    def cache_step_output(self, step_name: str):
+        """
+        Caches the attributes produced by the step, if step caching is enabled.
+        """
+        if self.step_cache_dir and self.step_keys:
+            entry_path = StepCache(self.step_cache_dir).entry_path(
+                step_name, self.step_keys[step_name]
+            )
+            makedir(os.path.dirname(entry_path))
+            self.checkpoint_writer.submit(
+                entry_path, self.snapshot(STEP_OUTPUTS[step_name])
+            )
+
+    def restore_cached_steps(self) -> bool:
+        """
+        Restores the outputs of the furthest step cached for the current inputs and
+        continues the pipeline from the step after it.
+
+            Returns:
+                restored `bool`: Whether any cached step was found.
+        """
+        cache = StepCache(self.step_cache_dir)
+        preprocessed = cache.load("preprocessing", self.step_keys["preprocessing"])
+        if preprocessed is None:
+            return False
+        self.__dict__.update(preprocessed)
+        self.next_step = self.train
+        self.create_and_save_ckpt("preprocessing")
+        trained = cache.load("train", self.step_keys["train"])
+        if trained is None:
+            print("[yellow]Step: [/yellow]Ingesting and Preprocessing [green](cached)[/green]")
+            self.next_step(continue_next=True)
+            return True
+
+        print(
+            "[yellow]Step: [/yellow]Ingesting, Preprocessing and Training [green](cached)[/green]"
+        )
+        self.__dict__.update(trained)
+        self.feature_plan = None
+        self.next_step = self.evaluate
+        self.create_and_save_ckpt("train")
+        self.next_step(continue_next=True)
+        return True
 
     def ingest(self, continue_next=False):
         print("[yellow]Step: [/yellow]Ingesting")
-        self.create_and_save_ckpt("ingest")
-        self.dataset = (
-            TitanicDataset(self.train_path, self.test_path)
-            if not self.zip_path
-            else TitanicDataset.create_from_zip(self.zip_path)
-        )
+        with self.metrics.measure("ingest") as stage:
+            if self.out_of_core:
+                # The data is only checked here, it is streamed by the next steps
+                self.dataset = StreamingDataset(
+                    self.train_path,
+                    self.test_path,
+                    self.zip_path,
+                    self.validation,
+                    self.ingest_chunksize or STREAM_CHUNKSIZE,
+                    self.validation_sample,
+                )
+            else:
+                self.dataset = (
+                    TitanicDataset(
+                        self.train_path,
+                        self.test_path,
+                        self.data_cache_dir,
+                        self.validation,
+                        self.ingest_chunksize,
+                        self.validation_sample,
+                    )
+                    if not self.zip_path
+                    else TitanicDataset.create_from_zip(
+                        self.zip_path,
+                        self.data_cache_dir,
+                        self.validation,
+                        self.ingest_chunksize,
+                        self.validation_sample,
+                    )
+                )
+                stage["rows"] = len(self.dataset.train_data) + len(
+                    self.dataset.test_data
+                )
         self.next_step = self.preprocessing
+        self.create_and_save_ckpt("ingest")
         if continue_next:
             self.next_step(continue_next=True)
 
     def preprocessing(self, continue_next=False):
         print("[yellow]Step: [/yellow]Preprocessing")
-        self.create_and_save_ckpt("preprocessing")
         self.data_cleaner = DataCleaning()
-        self.feature_enricher = FeatureEnricher()
-
-        # Preprocess Training Data
-        self.dataset.train_data = self.data_cleaner.fit_transform(
-            self.dataset.train_data
-        )
-        self.dataset.train_data = self.feature_enricher.fit_transform(
-            self.dataset.train_data
-        )
-
-        # Preprocess Testing Data
-        self.dataset.test_data = self.data_cleaner.transform(self.dataset.test_data)
-        self.dataset.test_data = self.feature_enricher.transform(self.dataset.test_data)
-
+        self.feature_enricher = FeatureEnricher(sparse=self.sparse_features)
+        if self.out_of_core:
+            self.fit_transformers_on_chunks()
+        else:
+            self.preprocess_in_memory()
+        self.cache_step_output("preprocessing")
         self.next_step = self.train
+        self.create_and_save_ckpt("preprocessing")
         if continue_next:
             self.next_step(continue_next=True)
 
+    def preprocess_in_memory(self):
+        """
+        Fits the transformers on the training data and transforms both splits.
+        """
+        train_rows, test_rows = len(self.dataset.train_data), len(self.dataset.test_data)
+        with self.metrics.measure("preprocessing", train_rows + test_rows):
+            # Preprocess Training Data
+            with self.metrics.measure("train_data", train_rows):
+                self.dataset.train_data = self.data_cleaner.fit_transform(
+                    self.dataset.train_data
+                )
+                # The cleaner returns new frames, so they are enriched in place
+                self.dataset.train_data = self.feature_enricher.fit_transform(
+                    self.dataset.train_data, inplace=True
+                )
+
+            # Preprocess Testing Data
+            with self.metrics.measure("test_data", test_rows):
+                self.dataset.test_data = self.data_cleaner.transform(
+                    self.dataset.test_data
+                )
+                self.dataset.test_data = self.feature_enricher.transform(
+                    self.dataset.test_data, inplace=True
+                )
+
+    def fit_transformers_on_chunks(self):
+        """
+        Fits the transformers on the streamed training data: a first pass fits the cleaner and
+        a second one the enricher on the cleaned chunks. The data itself is transformed chunk
+        by chunk when it is streamed again, see `feature_chunks`.
+        """
+        with self.metrics.measure("preprocessing") as stage:
+            with self.metrics.measure("data_cleaner") as cleaner_stage:
+                self.data_cleaner.fit_chunks(self.dataset.chunks("train"))
+                cleaner_stage["rows"] = self.dataset.rows["train"]
+            with self.metrics.measure("feature_enricher", self.dataset.rows["train"]):
+                self.feature_enricher.fit_chunks(
+                    self.data_cleaner.transform(chunk, inplace=True)
+                    for chunk in self.dataset.chunks("train")
+                )
+            stage["rows"] = 2 * self.dataset.rows["train"]
+
+    def feature_chunks(self, split: str = "train") -> Iterator[Tuple[pd.DataFrame, pd.Series]]:
+        """
+        Streams the features and labels of a split of the out of core dataset, one chunk at a time.
+        """
+        for chunk in self.dataset.chunks(split):
+            features = self.feature_enricher.transform(
+                self.data_cleaner.transform(chunk, inplace=True), inplace=True
+            )
+            yield features.iloc[:, 1:], features.iloc[:, 0]
+
     def train(self, continue_next=False):
         print("[yellow]Step: [/yellow]Training")
-        self.create_and_save_ckpt("train")
-        with warnings.catch_warnings():
+        with warnings.catch_warnings(), self.metrics.measure("train") as stage:
             warnings.simplefilter("ignore")
-            self.trainer = Trainer(**self.trainer_kwargs)
-            self.trainer.fit(
-                self.dataset.train_data.iloc[:, 1:], self.dataset.train_data.iloc[:, 0]
-            )
-            self.next_step = self.evaluate
-            if continue_next:
-                self.next_step(
-                    self.dataset.train_data.iloc[:, 1:],
-                    self.dataset.train_data.iloc[:, 0],
+            self.trainer = Trainer(self.model_name, **self.trainer_kwargs)
+            self.feature_plan = None
+            if self.out_of_core:
+                self.trainer.fit_chunks(
+                    self.feature_chunks(),
+                    rows=self.dataset.rows.get("train"),
+                    classes=[0, 1],
+                )
+                stage["rows"] = self.dataset.rows["train"]
+            else:
+                stage["rows"] = len(self.dataset.train_data)
+                self.trainer.fit(
+                    self.dataset.train_data.iloc[:, 1:], self.dataset.train_data.iloc[:, 0]
                 )
+            self.cache_step_output("train")
+        self.next_step = self.evaluate
+        self.create_and_save_ckpt("train")
+        if continue_next:
+            self.next_step(continue_next=True)
 
-    def evaluate(self, X, y):
+    def evaluate(self, X=None, y=None, continue_next=False):
+        """
+        Evaluates the trained model, by default on the training data, and exports the model artifact.
+        """
         print("[yellow]Step: [/yellow]Evaluating")
-        self.create_and_save_ckpt("evaluate")
-        evaluation_obj, evaluation_str = self.trainer.evaluate(X, y)
+        with self.metrics.measure("evaluate") as stage:
+            if X is None and self.out_of_core:
+                self.evaluation, evaluation_str = self.trainer.evaluate_chunks(
+                    self.feature_chunks()
+                )
+                stage["rows"] = self.dataset.rows["train"]
+            else:
+                if X is None:
+                    X = self.dataset.train_data.iloc[:, 1:]
+                    y = self.dataset.train_data.iloc[:, 0]
+                stage["rows"] = len(X)
+                self.evaluation, evaluation_str = self.trainer.evaluate(X, y)
         print("\n\n[green]Evaluation Metrics[/green]")
         print(evaluation_str)
+        self.next_step = None
+        self.create_and_save_ckpt("evaluate")
+        self.export(
+            os.path.join(
+                self.current_run_folder,
+                "evaluate",
+                self.model_ckpt_name + ARTIFACT_SUFFIX,
+            )
+        )
 
-    def predict(self, X):
+    def tune(self, search: HyperparameterSearch) -> pd.DataFrame:
         """
-        Performs a prediction from preprocessed data
+        Searches the trainer hyperparameters over the preprocessed training data, running the
+        ingest and preprocessing steps first if they are still pending. The trial table and the
+        best config are written in the 'tune' folder of the run, and the best config becomes the
+        trainer kwargs so resuming from the 'tune' checkpoint trains with it.
+
+            Parameters:
+                search `HyperparameterSearch`: Search to run.
+
+            Returns:
+                trials `pandas.DataFrame`: One row per trial, best ones first.
         """
-        prediction = self.trainer.predict(X)
-        return prediction
+        if self.out_of_core:
+            raise OutOfCoreException(
+                "Tuning needs the training data in memory, it is not available with out_of_core."
+            )
+        if self.next_step_name == "run":
+            self.ingest()
+        if self.next_step_name == "preprocessing":
+            self.preprocessing()
+        print("[yellow]Step: [/yellow]Tuning")
+        with self.metrics.measure("tune", len(self.dataset.train_data)):
+            trials = search.run(
+                self.dataset.train_data.iloc[:, 1:], self.dataset.train_data.iloc[:, 0]
+            )
+        self.trainer_kwargs = search.best_config()
+        self.next_step = self.train
+
+        tune_dir = os.path.join(self.current_run_folder, "tune")
+        makedir(tune_dir)
+        trials.to_csv(os.path.join(tune_dir, "trials.csv"), index=False)
+        with open(os.path.join(tune_dir, "best_config.yaml"), "w") as f:
+            yaml.safe_dump(
+                {
+                    "trainer_args": self.trainer_kwargs,
+                    "best_score": search.best_score,
+                },
+                f,
+            )
+        self.create_and_save_ckpt("tune")
+        self.save_metrics()
+        self.wait_for_checkpoints()
+        return trials
 
-    def tranform_predict(self, X: pd.DataFrame, inplace: bool = False):
+    def run(self, continue_next=False):
         """
-        Performs a prediction from unprocessed data.
+        Runs the whole pipeline. With a `step_cache_dir`, the steps whose inputs did not change
+        since a previous run are restored from the cache instead of executed.
         """
-        X_aux = X if inplace else X.copy()
-        X_aux = self.data_cleaner.transform(X_aux)
-        X_aux = self.feature_enricher.transform(X_aux)
-        return self.predict(X_aux)
+        try:
+            if self.step_cache_dir:
+                self.step_keys = self.compute_step_keys()
+            if not (self.step_cache_dir and self.restore_cached_steps()):
+                self.ingest(continue_next=True)
+        except BaseException:
+            self.finish_steps(failed=True)
+            raise
+        self.finish_steps()
 
-    def run(self, continue_next=False):
-        self.ingest(continue_next=True)
+    def update_config(self, **config) -> dict:
+        """
+        Changes the config attributes of a loaded pipeline, e.g. before resuming it. Once the data
+        was ingested `out_of_core` is fixed by the kind of dataset, and once the features were
+        built `sparse_features` is fixed by the enricher, so those keep their checkpoint values.
+
+            Parameters:
+                config: New values of the attributes in `CONFIG_ATTRIBUTES`.
+
+            Returns:
+                kept `dict`: Attributes given a different value that kept their checkpoint value.
+        """
+        fixed = {}
+        if self.dataset is not None:
+            fixed["out_of_core"] = isinstance(self.dataset, StreamingDataset)
+        if self.feature_enricher is not None and self.feature_enricher.fitted:
+            fixed["sparse_features"] = self.feature_enricher.sparse
+        kept = {}
+        for name, value in config.items():
+            if name in fixed and value != fixed[name]:
+                kept[name] = fixed[name]
+                value = fixed[name]
+            setattr(self, name, value)
+        return kept
 
     def resume(self, step=None):
         """
         Resumes the training from the given step or from the next step in line.
         """
-        self.initialize_folders()
         self.next_step = step if step else self.next_step
-        self.next_step(continue_next=True)
+        if self.next_step is None:
+            print("[green]The pipeline already finished, there is nothing to resume.[/green]")
+            return
+        self.initialize_folders()
+        if self.step_cache_dir:
+            self.step_keys = self.compute_step_keys()
+        try:
+            self.next_step(continue_next=True)
+        except BaseException:
+            self.finish_steps(failed=True)
+            raise
+        self.finish_steps()
+
+
+class InvalidCheckpointException(Exception):
+    """Exception thrown when a checkpoint is missing or can not be read by this version."""
+
+
+class OutOfCoreException(Exception):
+    """Exception thrown when a step can not run on data streamed out of core."""
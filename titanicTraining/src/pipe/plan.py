@@ -0,0 +1,345 @@
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Union
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+from .preprocessing import (
+    DataCleaning,
+    FeatureEnricher,
+    UnfittedException,
+    TICKET_LETTERS,
+    LOW_TICKET_LETTERS,
+)
+
+
+# Order of the raw fields when a record is given as a tuple instead of a dict
+RECORD_FIELDS = [
+    "PassengerId",
+    "Pclass",
+    "Name",
+    "Sex",
+    "Age",
+    "SibSp",
+    "Parch",
+    "Ticket",
+    "Fare",
+    "Cabin",
+    "Embarked",
+]
+
+# Models a `ForestPlan` can be compiled from
+FOREST_MODELS = (RandomForestClassifier, ExtraTreesClassifier)
+
+
+def _is_null(value) -> bool:
+    """
+    Cheap null check for python scalars (None and NaN).
+    """
+    return value is None or value != value
+
+
+class FeaturePlan:
+    """
+    Compiled version of a fitted `DataCleaning` + `FeatureEnricher` pair. It turns a single raw
+    record (dict or tuple) directly into a NumPy feature row using precomputed lookup tables,
+    skipping all the pandas machinery, which is what dominates the latency of one-row predictions.
+    """
+
+    def __init__(
+        self,
+        data_cleaner: DataCleaning,
+        feature_enricher: FeatureEnricher,
+        feature_names: Sequence[str],
+    ):
+        """
+        Parameters:
+            data_cleaner `DataCleaning`: Fitted data cleaner.
+            feature_enricher `FeatureEnricher`: Fitted feature enricher.
+            feature_names `Sequence[str]`: Ordered names of the features the model was trained with.
+        """
+        if not data_cleaner.fitted or not feature_enricher.fitted:
+            raise UnfittedException(
+                "A feature plan can only be compiled from fitted transformers."
+            )
+
+        self.feature_names: List[str] = list(feature_names)
+        self.positions: Dict[str, int] = {
+            name: position for position, name in enumerate(self.feature_names)
+        }
+        self.fare_mean: float = float(data_cleaner.fare_mean)
+
+        # (Name_Title, Pclass) -> mean age of the group in the training data
+        self.age_means: Dict[tuple, float] = {
+            key: float(value) for key, value in feature_enricher.age_means.items()
+        }
+        self.age_global_mean: float = float(feature_enricher.age_global_mean)
+
+        # Tercile edges of the training cabin numbers and the position of each bin column
+        self.cabin_edges: List[float] = feature_enricher.cabin_bins.tolist()
+        self.cabin_positions: List[int] = [
+            self.positions[column] for column in feature_enricher.cabin_num_columns
+        ]
+
+        # Column -> {category -> position of its one-hot column}
+        encoder = feature_enricher.dummies_encoder
+        encoded_names = encoder.get_feature_names_out(feature_enricher.columns)
+        self.onehot_positions: Dict[str, Dict] = {}
+        offset = 0
+        for column, categories in zip(feature_enricher.columns, encoder.categories_):
+            self.onehot_positions[column] = {
+                category: self.positions[encoded_names[offset + i]]
+                for i, category in enumerate(categories.tolist())
+            }
+            offset += len(categories)
+
+        # Same dtype as the continuous features of the DataFrame transform, so both round alike
+        self.row: np.ndarray = np.zeros((1, len(self.feature_names)), dtype=np.float32)
+
+    def transform_record(
+        self, record: Union[dict, tuple], out: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Maps a raw record into its feature row.
+
+            Parameters:
+                record `dict | tuple`: Raw passenger. Tuples must follow `RECORD_FIELDS` order.
+                out `numpy.ndarray`: Optional 1D array where the features will be written.
+
+            Returns:
+                row `numpy.ndarray`: 1D array with the features in `feature_names` order.
+        """
+        if not isinstance(record, dict):
+            record = dict(zip(RECORD_FIELDS, record))
+        row = self.row[0] if out is None else out
+        row[:] = 0.0
+        positions = self.positions
+        onehot = self.onehot_positions
+
+        name = record["Name"]
+        title = name.split(",")[1].split()[0]
+        row[positions["Name_Len"]] = len(name)
+
+        fare = record["Fare"]
+        row[positions["Fare"]] = self.fare_mean if _is_null(fare) else fare
+
+        pclass = record["Pclass"]
+        age = record["Age"]
+        if _is_null(age):
+            row[positions["Age_Null_Flag"]] = 1
+            age = self.age_means.get((title, pclass), self.age_global_mean)
+        row[positions["Age"]] = age
+
+        ticket = str(record["Ticket"])
+        row[positions["Ticket_Len"]] = len(ticket)
+        ticket_lett = ticket[0]
+        if ticket_lett not in TICKET_LETTERS:
+            ticket_lett = (
+                "Low_ticket" if ticket_lett in LOW_TICKET_LETTERS else "Other_ticket"
+            )
+
+        cabin = record["Cabin"]
+        # Missing cabins have the letter 'n' and no number
+        cabin = "n" if _is_null(cabin) else str(cabin)
+        cabin_num = cabin.split(" ")[-1][1:]
+        if cabin_num != "":
+            cabin_num = int(cabin_num)
+            edges = self.cabin_edges
+            cabin_bin = 0 if cabin_num == edges[0] else bisect_left(edges, cabin_num) - 1
+            if 0 <= cabin_bin < len(self.cabin_positions):
+                row[self.cabin_positions[cabin_bin]] = 1
+
+        fam_size = record["SibSp"] + record["Parch"]
+        fam_size = "Solo" if fam_size == 0 else "Nuclear" if fam_size <= 3 else "Big"
+
+        embarked = record["Embarked"]
+        values = {
+            "Pclass": pclass,
+            "Sex": record["Sex"],
+            "Embarked": "S" if _is_null(embarked) else embarked,
+            "Ticket_Lett": ticket_lett,
+            "Cabin_Letter": cabin[0],
+            "Name_Title": title,
+            "Fam_Size": fam_size,
+        }
+        for column, value in values.items():
+            position = onehot[column].get(value)
+            # Unknown categories are ignored, just like the one-hot encoder does
+            if position is not None:
+                row[position] = 1
+        return row
+
+    def transform_records(self, records: Sequence[Union[dict, tuple]]) -> np.ndarray:
+        """
+        Maps several raw records into a feature matrix.
+        """
+        matrix = np.zeros((len(records), len(self.feature_names)), dtype=np.float32)
+        for i, record in enumerate(records):
+            self.transform_record(record, out=matrix[i])
+        return matrix
+
+
+class ForestPlan:
+    """
+    Compiled version of a fitted forest classifier (see `FOREST_MODELS`). The nodes of all the
+    trees are kept in flat NumPy arrays (see `NODE_ARRAYS`), which a model artifact stores as
+    `.npy` files that can be memory-mapped, so processes loading the same artifact share them.
+    It predicts like the forest's `predict`, so it can stand in for the forest in a `Trainer`.
+
+    Rows are walked down every tree at once with NumPy, skipping the input validation and thread
+    dispatching of the forest's `predict`, which take most of the time for a few rows. A single
+    row of a forest of up to `LIST_WALK_TREES` trees is walked in plain python instead, faster
+    for a few trees. Large batches are slower than the forest's compiled `predict`.
+    """
+
+    # Flat node arrays, the children of every node pointing at their index in these arrays
+    NODE_ARRAYS = ["roots", "left", "right", "feature", "threshold", "leaf_proba"]
+    # Up to this many trees, rows are walked over python lists copied from the node arrays
+    LIST_WALK_TREES = 64
+    # (row, tree) pairs walked together by `predict_proba`, bounding its temporary arrays
+    PAIRS_PER_BLOCK = 1 << 20
+
+    def __init__(self, model):
+        """
+        Parameters:
+            model: Fitted `RandomForestClassifier` or `ExtraTreesClassifier`.
+        """
+        roots, left, right, feature, threshold, leaf_proba = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            roots.append(offset)
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            feature.append(tree.feature)
+            threshold.append(tree.threshold)
+            # Same normalization as `DecisionTreeClassifier.predict_proba`
+            value = tree.value[:, 0, :]
+            leaf_proba.append(value / value.sum(axis=1, keepdims=True))
+            offset += tree.node_count
+        self._set_arrays(
+            {
+                "roots": np.array(roots, dtype=np.int64),
+                "left": np.concatenate(left).astype(np.int64),
+                "right": np.concatenate(right).astype(np.int64),
+                "feature": np.concatenate(feature).astype(np.int64),
+                "threshold": np.concatenate(threshold),
+                "leaf_proba": np.concatenate(leaf_proba),
+            },
+            model.classes_,
+            type(model).__name__,
+        )
+
+    def _set_arrays(self, arrays: Dict[str, np.ndarray], classes, model_class: str):
+        for name in self.NODE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes: np.ndarray = np.asarray(classes)
+        # Name of the forest class the plan was compiled from
+        self.model_class = model_class
+        self._lists = None
+
+    @classmethod
+    def from_arrays(
+        cls, arrays: Dict[str, np.ndarray], classes, model_class: str
+    ) -> "ForestPlan":
+        """
+        Builds a plan from its `NODE_ARRAYS`, e.g. memory-mapped from a model artifact.
+
+            Parameters:
+                arrays `Dict[str, numpy.ndarray]`: Name -> array of the `NODE_ARRAYS`.
+                classes: Classes of the forest.
+                model_class `str`: Name of the forest class the arrays were compiled from.
+        """
+        plan: ForestPlan = cls.__new__(cls)
+        plan._set_arrays(arrays, classes, model_class)
+        return plan
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Name -> array of the `NODE_ARRAYS`.
+        """
+        return {name: getattr(self, name) for name in self.NODE_ARRAYS}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_lists"] = None
+        return state
+
+    @classmethod
+    def supports(cls, model) -> bool:
+        """
+        Whether `model` can be compiled into a `ForestPlan`.
+        """
+        return isinstance(model, FOREST_MODELS) and model.n_outputs_ == 1
+
+    def predict_row(self, row: np.ndarray):
+        """
+        Predicts the class of a single feature row, the same one the forest's `predict` gives.
+
+            Parameters:
+                row `numpy.ndarray`: 1D float32 array with the features in training order.
+
+            Returns:
+                prediction: Predicted class.
+        """
+        if len(self.roots) <= self.LIST_WALK_TREES:
+            return self._predict_row_lists(row)
+        return self.predict(row[np.newaxis])[0]
+
+    def _predict_row_lists(self, row: np.ndarray):
+        if self._lists is None:
+            self._lists = tuple(
+                getattr(self, name).tolist()
+                for name in ["roots", "left", "right", "feature", "threshold", "leaf_proba"]
+            )
+        roots, left, right, feature, threshold, leaf_proba = self._lists
+        x = row.tolist()
+        total = [0.0] * len(self.classes)
+        for node in roots:
+            while left[node] != -1:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            for i, proba in enumerate(leaf_proba[node]):
+                total[i] += proba
+        return self.classes[total.index(max(total))]
+
+    def predict_proba(self, X) -> np.ndarray:
+        """
+        Mean class probabilities of the trees for every row of the feature matrix `X`. Blocks of
+        rows are walked down all the trees at once, one level per step, so the number of NumPy
+        calls depends on the depth of the trees and not on their number.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        trees = len(self.roots)
+        proba = np.empty((len(X), len(self.classes)))
+        block_rows = max(1, self.PAIRS_PER_BLOCK // trees)
+        for start in range(0, len(X), block_rows):
+            block = X[start : start + block_rows]
+            values = block.ravel()
+            # One (row, tree) pair per position, `offsets` pointing at the row in `values`
+            offsets = np.repeat(np.arange(len(block)) * block.shape[1], trees)
+            nodes = np.tile(self.roots, len(block))
+            positions = np.arange(len(nodes))
+            leaves = np.empty_like(nodes)
+            while True:
+                # Roots can be leaves too, so the pairs that reached one are set aside first
+                walking = self.left[nodes] != -1
+                leaves[positions[~walking]] = nodes[~walking]
+                positions, nodes = positions[walking], nodes[walking]
+                offsets = offsets[walking]
+                if not len(nodes):
+                    break
+                nodes = np.where(
+                    values[offsets + self.feature[nodes]] <= self.threshold[nodes],
+                    self.left[nodes],
+                    self.right[nodes],
+                )
+            # Summed tree by tree, like the forest averages them, so ties break alike
+            proba[start : start + len(block)] = (
+                self.leaf_proba[leaves].reshape(len(block), trees, -1).sum(axis=1)
+            )
+        return proba / trees
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predicts the class of every row of the feature matrix `X`.
+        """
+        return self.classes.take(self.predict_proba(X).argmax(axis=1))
@@ -1,7 +1,36 @@
+from __future__ import annotations
 import pandas as pd
 import numpy as np
-from typing import List
+import scipy.sparse
+from typing import Dict, Iterable, List
 from sklearn.preprocessing import OneHotEncoder
+from .metrics import measure
+from .sketch import QuantileSketch
+
+
+# Version of the DataCleaning and FeatureEnricher transformations. Bump it whenever the
+# features they produce change so cached preprocessing outputs are not reused.
+PREPROCESSING_VERSION = 3
+
+# First letters of the tickets that are kept as their own category
+TICKET_LETTERS = ["1", "2", "3", "S", "P", "C", "A"]
+# First letters of the tickets that are grouped into the 'Low_ticket' category
+LOW_TICKET_LETTERS = ["W", "4", "7", "6", "L", "5", "8"]
+# Categories of the Fam_Size feature, from the smallest families to the biggest ones
+FAM_SIZES = ["Solo", "Nuclear", "Big"]
+# Centroids of the sketch of the cabin numbers when fitting on chunks, see `QuantileSketch`
+CABIN_SKETCH_CENTROIDS = 1024
+
+
+def _replace_column(data: pd.DataFrame, column: str, values: pd.Series):
+    """
+    Replaces a column of the frame in place keeping its position. Assigning values of another
+    dtype to a column copies the whole block it shares with the columns of its old dtype,
+    while deleting it first only slices that block.
+    """
+    loc = data.columns.get_loc(column)
+    del data[column]
+    data.insert(loc, column, values)
 
 
 class DataCleaning:
@@ -12,19 +41,53 @@ class DataCleaning:
 
     def __init__(self):
         self.fare_mean = 0.0
+        # Statistics the fare mean is computed from, merged by `partial_fit`
+        self.fare_sum = 0.0
+        self.fare_count = 0
         self.fitted = False
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "fare_count" not in state:
+            # Instances pickled before the statistics were kept can not be updated
+            self.fare_sum, self.fare_count = None, None
+
     def fit(self, data: pd.DataFrame):
         """
         This will gather all the info needed for later transforming the data.
         This should be done with the training set.
         """
-        self.fare_mean = data["Fare"].mean()
+        self.fare_sum, self.fare_count = 0.0, 0
+        self.partial_fit(data)
+
+    def partial_fit(self, data: pd.DataFrame):
+        """
+        Updates the fitted info with a new batch of data, e.g. the rows added since the last
+        fit, by merging its statistics with the ones of the data seen so far. Only the new
+        batch is read, and the result is the same as fitting on all the data at once.
+        """
+        if self.fare_count is None:
+            raise MissingStatisticsException(
+                "This data cleaning was fitted without keeping its statistics, fit it again before updating it."
+            )
+        self.fare_sum += float(data["Fare"].sum())
+        self.fare_count += int(data["Fare"].count())
+        self.fare_mean = self.fare_sum / self.fare_count if self.fare_count else np.NaN
         self.fitted = True
 
+    def fit_chunks(self, chunks: Iterable[pd.DataFrame]):
+        """
+        Same as `fit` for data streamed in chunks, e.g. the training data of a `StreamingDataset`,
+        so only one chunk is in memory at a time.
+        """
+        self.fare_sum, self.fare_count = 0.0, 0
+        for chunk in chunks:
+            self.partial_fit(chunk)
+
     def transform(self, data: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
         """
         This will transformed the data based on the info previously fitted.
+        The data is copied once, or modified in place with `inplace`.
         """
         if not self.fitted:
             raise UnfittedException(
@@ -32,8 +95,20 @@ class DataCleaning:
             )
 
         transformed_data: pd.DataFrame = data if inplace else data.copy()
-        transformed_data["Fare"] = data["Fare"].fillna(self.fare_mean)
-        transformed_data["Embarked"] = transformed_data["Embarked"].fillna("S")
+        _replace_column(
+            transformed_data,
+            "Fare",
+            transformed_data["Fare"].fillna(self.fare_mean).astype(np.float32),
+        )
+        embarked = transformed_data["Embarked"]
+        if isinstance(embarked.dtype, pd.CategoricalDtype) and "S" not in embarked.cat.categories:
+            embarked = embarked.cat.add_categories("S")
+        _replace_column(
+            transformed_data, "Embarked", embarked.fillna("S").astype("category")
+        )
+        _replace_column(
+            transformed_data, "Sex", transformed_data["Sex"].astype("category")
+        )
         del transformed_data["PassengerId"]
         return transformed_data
 
@@ -44,16 +119,56 @@ class DataCleaning:
         self.fit(data)
         return self.transform(data, inplace)
 
+    def to_dict(self) -> dict:
+        """
+        Returns the fitted parameters as plain python types, ready to be dumped as json.
+        """
+        if not self.fitted:
+            raise UnfittedException("Data cleaning must be fitted before exporting it.")
+        return {
+            "fare_mean": float(self.fare_mean),
+            "fare_sum": self.fare_sum,
+            "fare_count": self.fare_count,
+        }
+
+    @classmethod
+    def from_dict(cls, params: dict) -> DataCleaning:
+        """
+        Creates a fitted instance from the parameters returned by `to_dict`.
+        """
+        data_cleaner = cls()
+        data_cleaner.fare_mean = params["fare_mean"]
+        # Exported before the statistics were kept, see `partial_fit`
+        data_cleaner.fare_sum = params.get("fare_sum")
+        data_cleaner.fare_count = params.get("fare_count")
+        data_cleaner.fitted = True
+        return data_cleaner
+
 
 class FeatureEnricher:
     """
-    Class in charge of the feature engineering
+    Class in charge of the feature engineering. The features are kept compact all along:
+    the categorical ones are pandas categories, the flags and one-hot columns are uint8,
+    the lengths uint16 and the ages and fares float32.
     """
 
-    def __init__(self):
+    def __init__(self, vectorized: bool = False, sparse: bool = False):
+        """
+        Parameters:
+            vectorized `bool`: Whether to build the features with pandas `.str` accessors and NumPy
+                operations instead of per row python lambdas. Both paths produce the same features.
+            sparse `bool`: Whether the dummy columns are pandas sparse columns built from a SciPy
+                sparse matrix, so their memory scales with the number of ones instead of rows x categories.
+                See `train.model_input` for how they are passed to the models.
+        """
         self.fitted: bool = False
-        self.age_nan_replace_proxy = None
-        self.cabin_num_1 = None
+        self.vectorized: bool = vectorized
+        self.sparse: bool = sparse
+        self.age_means: pd.Series = None
+        self.age_global_mean: float = np.NaN
+        self.cabin_bins: np.ndarray = None
+        self.cabin_num_columns: List[str] = []
+        self._reset_statistics()
         self.columns = [
             "Pclass",
             "Sex",
@@ -67,14 +182,47 @@ class FeatureEnricher:
             handle_unknown="ignore", sparse_output=False
         )
 
+    def _name_titles(self, names: pd.Series) -> pd.Series:
+        """
+        Extracts the title of each passenger name, i.e. the first word after the first comma.
+        """
+        if self.vectorized:
+            return names.str.extract(r"^[^,]*,\s*([^\s,]+)", expand=False)
+        return names.apply(lambda x: x.split(",")[1]).apply(lambda x: x.split()[0])
+
+    def _cabin_numbers(self, cabins: pd.Series) -> pd.Series:
+        """
+        Extracts the number of the last cabin of each passenger. Missing cabins or cabins
+        without a number are returned as NaN.
+        """
+        if self.vectorized:
+            cabin_nums = cabins.astype(str).str.rsplit(" ", n=1).str[-1].str[1:]
+            return pd.to_numeric(cabin_nums.mask(cabins.isna() | (cabin_nums == "")))
+
+        cabin_nums = cabins.apply(
+            lambda x: np.NaN if pd.isnull(x) else str(x).split(" ")[-1][1:]
+        )
+        return cabin_nums.apply(
+            lambda x: int(x) if not pd.isnull(x) and x != "" else np.NaN
+        )
+
+    def _cabin_letters(self, cabins: pd.Series) -> pd.Series:
+        """
+        Extracts the first letter of each cabin code, 'n' for missing cabins.
+        """
+        if self.vectorized:
+            return cabins.astype(str).str[0].mask(cabins.isna(), "n")
+        return cabins.apply(lambda x: "n" if pd.isnull(x) else str(x)[0])
+
     def names(self, data: pd.DataFrame) -> pd.DataFrame:
         """
         This will generate features related with the 'Name' column in our data.
         """
-        data["Name_Len"] = data["Name"].apply(lambda x: len(x))
-        data["Name_Title"] = (
-            data["Name"].apply(lambda x: x.split(",")[1]).apply(lambda x: x.split()[0])
-        )
+        if self.vectorized:
+            data["Name_Len"] = data["Name"].str.len().astype(np.uint16)
+        else:
+            data["Name_Len"] = data["Name"].apply(lambda x: len(x)).astype(np.uint16)
+        data["Name_Title"] = self._name_titles(data["Name"]).astype("category")
         del data["Name"]
         return data
 
@@ -84,10 +232,25 @@ class FeatureEnricher:
         of its 'Name_Title' + 'Pclass' group if it exists. The idea is that the status of a passenger
         is a good proxy for its age, so we try to find the passengers with most similar status
         by looking at other in the same class and with the same name title (Dr, Mr, Sr, Capt, etc).
+        Groups that were not seen while fitting fall back to the global age mean.
         """
         # Best proxy for age is social status given by name_title + Pclass. We will try to replace as much as we can with just that
-        data["Age_Null_Flag"] = data["Age"].apply(lambda x: 1 if pd.isnull(x) else 0)
-        data["Age"] = self.age_nan_replace_proxy.transform(lambda x: x.fillna(x.mean()))
+        if self.vectorized:
+            data["Age_Null_Flag"] = data["Age"].isnull().astype(np.uint8)
+        else:
+            data["Age_Null_Flag"] = (
+                data["Age"].apply(lambda x: 1 if pd.isnull(x) else 0).astype(np.uint8)
+            )
+        group_keys = pd.MultiIndex.from_arrays([data["Name_Title"], data["Pclass"]])
+        group_means = self.age_means.reindex(group_keys).to_numpy()
+        group_means[np.isnan(group_means)] = self.age_global_mean
+        _replace_column(
+            data,
+            "Age",
+            data["Age"]
+            .fillna(pd.Series(group_means, index=data.index))
+            .astype(np.float32),
+        )
         return data
 
     def fam_size(self, data: pd.DataFrame) -> pd.DataFrame:
@@ -96,10 +259,9 @@ class FeatureEnricher:
         parents and children aboard the titanic.
 
         """
-        data["Fam_Size"] = np.where(
-            (data["SibSp"] + data["Parch"]) == 0,
-            "Solo",
-            np.where((data["SibSp"] + data["Parch"]) <= 3, "Nuclear", "Big"),
+        fam_size = data["SibSp"] + data["Parch"]
+        data["Fam_Size"] = pd.Categorical.from_codes(
+            np.where(fam_size == 0, 0, np.where(fam_size <= 3, 1, 2)), FAM_SIZES
         )
         del data["SibSp"]
         del data["Parch"]
@@ -112,17 +274,25 @@ class FeatureEnricher:
         information about the first letter of the ticket (which hopefully can have some info
         about the location of the cabin inside the titanic)
         """
-        data["Ticket_Lett"] = data["Ticket"].apply(lambda x: str(x)[0]).astype(str)
-        data["Ticket_Lett"] = np.where(
-            (data["Ticket_Lett"]).isin(["1", "2", "3", "S", "P", "C", "A"]),
-            data["Ticket_Lett"],
+        if self.vectorized:
+            data["Ticket_Lett"] = data["Ticket"].astype(str).str[0]
+        else:
+            data["Ticket_Lett"] = data["Ticket"].apply(lambda x: str(x)[0]).astype(str)
+        data["Ticket_Lett"] = pd.Categorical(
             np.where(
-                (data["Ticket_Lett"]).isin(["W", "4", "7", "6", "L", "5", "8"]),
-                "Low_ticket",
-                "Other_ticket",
-            ),
+                (data["Ticket_Lett"]).isin(TICKET_LETTERS),
+                data["Ticket_Lett"],
+                np.where(
+                    (data["Ticket_Lett"]).isin(LOW_TICKET_LETTERS),
+                    "Low_ticket",
+                    "Other_ticket",
+                ),
+            )
         )
-        data["Ticket_Len"] = data["Ticket"].apply(lambda x: len(x))
+        if self.vectorized:
+            data["Ticket_Len"] = data["Ticket"].str.len().astype(np.uint16)
+        else:
+            data["Ticket_Len"] = data["Ticket"].apply(lambda x: len(x)).astype(np.uint16)
         del data["Ticket"]
         return data
 
@@ -130,22 +300,19 @@ class FeatureEnricher:
         """
         Extracts the first letter of the cabin code as a new feature.
         Adds categorical values wich indicates weather or not a cabin's number
-        is in some quartil of the training cabin number's data
+        is in some tercile of the training cabin number's data. The tercile edges are
+        computed once while fitting.
         """
-        data["Cabin_Letter"] = data["Cabin"].apply(lambda x: str(x)[0])
-        data["Cabin_num"] = pd.qcut(self.cabin_num_1, 3)
-
-        # All this extra steps for the concat is to basically to not brake the inplace nature of this function
-        temp = pd.concat(
-            (data, pd.get_dummies(data["Cabin_num"], prefix="Cabin_num")),
-            axis=1,
-            copy=False,
-            ignore_index=False,
+        data["Cabin_Letter"] = self._cabin_letters(data["Cabin"]).astype("category")
+        cabin_bin = pd.cut(
+            self._cabin_numbers(data["Cabin"]),
+            self.cabin_bins,
+            labels=False,
+            include_lowest=True,
         )
-        data.drop(data.index[0:], inplace=True)
-        data[temp.columns] = temp
+        for i, column in enumerate(self.cabin_num_columns):
+            data[column] = (cabin_bin == i).astype(np.uint8)
         del data["Cabin"]
-        del data["Cabin_num"]
         return data
 
     def dummies(
@@ -153,22 +320,68 @@ class FeatureEnricher:
         data: pd.DataFrame,
     ) -> pd.DataFrame:
         """
-        Converts unique values of certain columns into dummy columns (True, False)
+        Converts unique values of certain columns into uint8 dummy columns (1, 0), one per
+        category seen while fitting. Unknown categories get all their columns set to 0.
+        With `sparse` the dummy columns are sparse and only their ones are stored.
         """
+        categories = self.dummies_encoder.categories_
+        offsets = np.cumsum([0] + [len(values) for values in categories])
+        names = self.dummies_encoder.get_feature_names_out(self.columns)
+        rows = np.arange(len(data), dtype=np.int32)
+        if self.sparse:
+            row_ids, column_ids = [], []
+        else:
+            dense = np.zeros((len(data), offsets[-1]), dtype=np.uint8)
+        for column, values, offset in zip(self.columns, categories, offsets):
+            codes = self._category_codes(data[column], values)
+            known = codes >= 0
+            if self.sparse:
+                row_ids.append(rows[known])
+                column_ids.append((offset + codes[known]).astype(np.int32))
+            else:
+                dense[rows[known], offset + codes[known]] = 1
 
-        new_cols = self.dummies_encoder.transform(data[self.columns])
-        data = pd.concat(
-            (
-                data,
-                pd.DataFrame.from_records(
-                    new_cols,
-                    columns=self.dummies_encoder.get_feature_names_out(self.columns),
+        if self.sparse:
+            row_ids = np.concatenate(row_ids)
+            matrix = scipy.sparse.csc_matrix(
+                (
+                    np.ones(len(row_ids), dtype=np.uint8),
+                    (row_ids, np.concatenate(column_ids)),
                 ),
-            ),
-            axis=1,
-        )
+                shape=(len(data), offsets[-1]),
+            )
+            dummies = pd.DataFrame.sparse.from_spmatrix(
+                matrix, index=data.index, columns=names
+            )
+        else:
+            dummies = pd.DataFrame(dense, columns=names, index=data.index)
+        # Deleting columns only slices the blocks of the frame and copy=False reuses them, so
+        # the rest of the columns are not copied (only dtypes split in several blocks are merged)
         for column in self.columns:
             del data[column]
+        return pd.concat((data, dummies), axis=1, copy=False)
+
+    @staticmethod
+    def _category_codes(column: pd.Series, categories: np.ndarray) -> np.ndarray:
+        """
+        Position of each value of `column` in `categories`, -1 for values not in them.
+        Categorical columns are mapped through their categories instead of value by value.
+        """
+        index = pd.Index(categories)
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # The code -1 of missing values picks the -1 appended at the end
+            category_codes = np.append(index.get_indexer(column.cat.categories), -1)
+            return category_codes[column.cat.codes.to_numpy()]
+        return index.get_indexer(column)
+
+    def run_stages(self, data: pd.DataFrame, stages: List[str]) -> pd.DataFrame:
+        """
+        Runs the given feature stages in order, each one measured as 'feature_enricher.<stage>'
+        by the active `MetricsRecorder`, if any.
+        """
+        for stage in stages:
+            with measure(f"feature_enricher.{stage}", len(data)):
+                data = getattr(self, stage)(data)
         return data
 
     def fit(self, data: pd.DataFrame, inplace: bool = False):
@@ -176,32 +389,150 @@ class FeatureEnricher:
         This will gather all the info needed for later transforming more data.
         This should be run once with the training set.
         """
+        self._reset_statistics()
+        self.partial_fit(data, inplace)
+
+    def partial_fit(self, data: pd.DataFrame, inplace: bool = False):
+        """
+        Updates the fitted info with a new batch of cleaned data, e.g. the rows added since the
+        last fit, by merging its statistics with the ones of the data seen so far: the sums and
+        counts of the ages are added up, the cabin numbers merged into the `QuantileSketch` and
+        the categories of the dummy columns extended with the new ones. Only the new batch is
+        read, and the result is the same as fitting on all the data at once, except for the
+        cabin bins once the sketch holds more than `CABIN_SKETCH_CENTROIDS` distinct numbers.
+        New categories add dummy columns, so models trained on the previous features have to
+        be trained again.
+        """
+        if self.cabin_sketch is None:
+            raise MissingStatisticsException(
+                "This feature enricher was fitted without keeping its statistics, fit it again before updating it."
+            )
         aux_data = data if inplace else data.copy()
-        aux_data["Name_Title"] = (
-            aux_data["Name"]
-            .apply(lambda x: x.split(",")[1])
-            .apply(lambda x: x.split()[0])
-        )
-        self.age_nan_replace_proxy = aux_data.groupby(["Name_Title", "Pclass"])["Age"]
-        self.cabin_num_1 = data["Cabin"].apply(lambda x: str(x).split(" ")[-1][1:])
-        self.cabin_num_1.replace("an", np.NaN, inplace=True)
-        self.cabin_num_1 = self.cabin_num_1.apply(
-            lambda x: int(x) if not pd.isnull(x) and x != "" else np.NaN
+        seen = self._seen_categories()
+        self._accumulate(aux_data, seen)
+        self._finish_fit(seen)
+
+    def fit_chunks(self, chunks: Iterable[pd.DataFrame]):
+        """
+        Same as `fit` for cleaned data streamed in chunks, so only one chunk is in memory at a
+        time. The statistics of every chunk are merged like in `partial_fit`, and the fitted
+        info is computed once from them at the end. The chunks are modified while fitting.
+        """
+        self._reset_statistics()
+        seen = {}
+        for chunk in chunks:
+            self._accumulate(chunk, seen)
+        self._finish_fit(seen)
+
+    def _reset_statistics(self):
+        """
+        Forgets the statistics and the categories of the data seen so far.
+        """
+        # Sum and count of the known ages of each (Name_Title, Pclass) group and of all of them
+        self.age_stats: pd.DataFrame = None
+        self.age_sum: float = 0.0
+        self.age_count: int = 0
+        self.cabin_sketch = QuantileSketch(CABIN_SKETCH_CENTROIDS)
+        self.fitted = False
+
+    def _drop_statistics(self):
+        """
+        Marks the statistics as unknown, so `partial_fit` refuses to update the fitted info.
+        """
+        self.age_stats, self.age_sum, self.age_count, self.cabin_sketch = None, None, None, None
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "cabin_sketch" not in state:
+            # Instances pickled before the statistics were kept
+            self._drop_statistics()
+
+    def _seen_categories(self) -> Dict[str, pd.Series]:
+        """
+        Categories of each dummy column seen so far, i.e. the ones of the fitted encoder.
+        """
+        if not self.fitted:
+            return {}
+        return {
+            column: pd.Series(values)
+            for column, values in zip(self.columns, self.dummies_encoder.categories_)
+        }
+
+    def _accumulate(self, data: pd.DataFrame, seen: Dict[str, pd.Series]) -> pd.DataFrame:
+        """
+        Adds the statistics of the data to the ones of the data seen so far and the values of
+        its dummy columns to `seen`. The names, fam_size and tickets stages are run on the
+        data in place, as the dummy columns need them.
+        """
+        self.cabin_sketch.update(self._cabin_numbers(data["Cabin"]))
+        cabin_letters = self._cabin_letters(data["Cabin"])
+        data = self.run_stages(data, ["names", "fam_size", "tickets"])
+        age_stats = (
+            data["Age"]
+            .groupby([data["Name_Title"].astype(object), data["Pclass"]])
+            .agg(["sum", "count"])
         )
-        # Some preprocessing that need to be done to the training data before getting all the dummies
-        aux_data = self.names(aux_data)
-        aux_data = self.fam_size(aux_data)
-        aux_data = self.tickets(aux_data)
-        aux_data = self.cabins(aux_data)
+        self.age_stats = (
+            age_stats
+            if self.age_stats is None
+            else self.age_stats.add(age_stats, fill_value=0)
+        )
+        self.age_sum += float(data["Age"].sum())
+        self.age_count += int(data["Age"].count())
+        for column in self.columns:
+            values = (
+                cabin_letters if column == "Cabin_Letter" else data[column]
+            ).drop_duplicates()
+            seen[column] = (
+                values
+                if column not in seen
+                else pd.concat((seen[column], values), ignore_index=True).drop_duplicates()
+            )
+        return data
 
-        self.dummies_encoder.fit(aux_data[self.columns])
+    def _finish_fit(self, seen: Dict[str, pd.Series]):
+        """
+        Computes the fitted info from the statistics of the data seen so far.
+        """
+        # (Name_Title, Pclass) -> mean age table. Groups without any known age are left out
+        known = self.age_stats[self.age_stats["count"] > 0].sort_index()
+        self.age_means = (known["sum"] / known["count"]).rename("Age")
+        self.age_means.index.names = ["Name_Title", "Pclass"]
+        self.age_global_mean = self.age_sum / self.age_count if self.age_count else np.NaN
+        self.cabin_bins = self.cabin_sketch.quantiles(np.linspace(0, 1, 4))
+        self.cabin_num_columns = self._cabin_num_columns(self.cabin_bins)
+
+        # The encoder only needs the values seen, so it is fitted on a frame made of them
+        size = max(len(values) for values in seen.values())
+        # Encoders loaded by `from_dict` are pinned to the categories they were exported with
+        self.dummies_encoder.set_params(categories="auto")
+        self.dummies_encoder.fit(
+            pd.DataFrame(
+                {
+                    column: values.to_numpy()[np.arange(size) % len(values)]
+                    for column, values in seen.items()
+                }
+            )
+        )
         self.fitted = True
 
+    @staticmethod
+    def _cabin_num_columns(cabin_bins: np.ndarray) -> List[str]:
+        """
+        Names of the cabin number columns, one per interval between the bin edges, named
+        like the intervals of `pandas.qcut`.
+        """
+        intervals = pd.cut(
+            pd.Series([], dtype=float), cabin_bins, include_lowest=True, precision=3
+        ).cat.categories
+        return [f"Cabin_num_{interval}" for interval in intervals]
+
     def transform(
         self, data: pd.DataFrame, inplace: bool = False, prev_fitted: bool = False
     ) -> pd.DataFrame:
         """
         This will transformed the data based on the info previously fitted.
+        The data is copied once, or modified in place with `inplace`.
         """
         if not self.fitted:
             raise UnfittedException(
@@ -211,23 +542,113 @@ class FeatureEnricher:
         transformed_data = data if inplace else data.copy()
         # If already fitted, avoid repreating some features already created
         if not prev_fitted:
-            transformed_data = self.names(transformed_data)
-            transformed_data = self.fam_size(transformed_data)
-            transformed_data = self.tickets(transformed_data)
-            transformed_data = self.cabins(transformed_data)
-
-        transformed_data = self.age_input(transformed_data)
-        transformed_data = self.dummies(transformed_data)
-        return transformed_data
+            transformed_data = self.run_stages(
+                transformed_data, ["names", "fam_size", "tickets", "cabins"]
+            )
+        return self.run_stages(transformed_data, ["age_input", "dummies"])
 
     def fit_transform(self, data: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
         """
         This will fit the FeatureEnricher model and then transform it using both times the received data.
         """
         aux_data = data if inplace else data.copy()
+        # Fitting already ran the names, fam_size and tickets stages on the data
         self.fit(aux_data, True)
+        aux_data = self.run_stages(aux_data, ["cabins"])
         return self.transform(aux_data, True, True)
 
+    def to_dict(self) -> dict:
+        """
+        Returns the fitted lookup tables as plain python types, ready to be dumped as json.
+        """
+        if not self.fitted:
+            raise UnfittedException(
+                "Feature enricher must be fitted before exporting it."
+            )
+        return {
+            "vectorized": self.vectorized,
+            "sparse": self.sparse,
+            "columns": self.columns,
+            "age_means": [
+                [title, int(pclass), float(age)]
+                for (title, pclass), age in self.age_means.items()
+            ],
+            "age_global_mean": float(self.age_global_mean),
+            "cabin_bins": self.cabin_bins.tolist(),
+            "cabin_num_columns": self.cabin_num_columns,
+            "categories": [
+                categories.tolist() for categories in self.dummies_encoder.categories_
+            ],
+            "age_stats": None
+            if self.age_stats is None
+            else [
+                [title, int(pclass), float(stats["sum"]), int(stats["count"])]
+                for (title, pclass), stats in self.age_stats.iterrows()
+            ],
+            "age_sum": self.age_sum,
+            "age_count": self.age_count,
+            "cabin_sketch": None
+            if self.cabin_sketch is None
+            else self.cabin_sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, params: dict) -> FeatureEnricher:
+        """
+        Creates a fitted instance from the lookup tables returned by `to_dict`.
+        """
+        feature_enricher = cls(
+            vectorized=params["vectorized"], sparse=params.get("sparse", False)
+        )
+        feature_enricher.columns = params["columns"]
+        feature_enricher.age_means = pd.Series(
+            [age for _, _, age in params["age_means"]],
+            index=pd.MultiIndex.from_tuples(
+                [(title, pclass) for title, pclass, _ in params["age_means"]],
+                names=["Name_Title", "Pclass"],
+            ),
+            name="Age",
+            dtype=float,
+        )
+        feature_enricher.age_global_mean = params["age_global_mean"]
+        feature_enricher.cabin_bins = np.array(params["cabin_bins"])
+        feature_enricher.cabin_num_columns = params["cabin_num_columns"]
+        if params.get("cabin_sketch") is None:
+            # Exported before the statistics were kept, see `partial_fit`
+            feature_enricher._drop_statistics()
+        else:
+            feature_enricher.age_stats = pd.DataFrame(
+                [[total, count] for _, _, total, count in params["age_stats"]],
+                index=pd.MultiIndex.from_arrays(
+                    [
+                        [title for title, _, _, _ in params["age_stats"]],
+                        [pclass for _, pclass, _, _ in params["age_stats"]],
+                    ],
+                    names=["Name_Title", "Pclass"],
+                ),
+                columns=["sum", "count"],
+            )
+            feature_enricher.age_sum = params["age_sum"]
+            feature_enricher.age_count = params["age_count"]
+            feature_enricher.cabin_sketch = QuantileSketch.from_dict(params["cabin_sketch"])
+
+        # The encoder only needs its categories, so it is fitted on a single row made of them
+        categories = [np.array(values) for values in params["categories"]]
+        feature_enricher.dummies_encoder.set_params(categories=categories)
+        feature_enricher.dummies_encoder.fit(
+            pd.DataFrame(
+                {
+                    column: values[:1]
+                    for column, values in zip(feature_enricher.columns, categories)
+                }
+            )
+        )
+        feature_enricher.fitted = True
+        return feature_enricher
+
 
 class UnfittedException(Exception):
     """Excpetion thrown when something tries to transform the data before fitting the classes."""
+
+class MissingStatisticsException(Exception):
+    """Exception thrown when updating a class fitted without keeping the statistics partial_fit merges."""
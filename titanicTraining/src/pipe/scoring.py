@@ -0,0 +1,136 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from .dataset import RAW_CSV_DTYPES
+
+
+# Pipeline loaded by each worker process of a ParallelScorer
+_worker_pipeline = None
+
+
+def _load_worker_pipeline(pipeline_path: str, mmap: bool = True):
+    """
+    Initializer of the worker processes. Loads the fitted pipeline once per worker.
+    """
+    global _worker_pipeline
+    from .artifact import load_inference_pipeline
+
+    _worker_pipeline = load_inference_pipeline(pipeline_path, mmap)
+
+
+def _predict_partition(data: pd.DataFrame, processed: bool) -> np.ndarray:
+    """
+    Predicts a partition of the data inside a worker process.
+    """
+    if processed:
+        return _worker_pipeline.predict(data)
+    return _worker_pipeline.tranform_predict(data, inplace=True)
+
+
+class ParallelScorer:
+    """
+    Scores batches of data in a pool of processes. Each worker loads the fitted pipeline once and
+    runs cleaning, feature enrichment and prediction over its own partition of the input, so the
+    pandas feature engineering scales with the number of cores. Results come back in input order.
+    """
+
+    def __init__(self, pipeline_path: str, workers: int, mmap: bool = True):
+        """
+        Parameters:
+            pipeline_path `str`: Path to the model artifact or pipeline checkpoint each worker will load.
+            workers `int`: Number of worker processes.
+            mmap `bool`: Whether the workers memory-map the model artifact, sharing its pages.
+                See `InferencePipeline.load_artifact`.
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_load_worker_pipeline,
+            initargs=(pipeline_path, mmap),
+        )
+
+    def _map(self, X: pd.DataFrame, processed: bool) -> np.ndarray:
+        """
+        Splits `X` in one contiguous partition per worker and gathers the predictions in order.
+        """
+        if len(X) == 0:
+            return np.empty(0)
+        bounds = np.linspace(0, len(X), min(self.workers, len(X)) + 1, dtype=int)
+        partitions = [X.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        results = self.executor.map(_predict_partition, partitions, repeat(processed))
+        return np.concatenate(list(results))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Performs a prediction from preprocessed data
+        """
+        return self._map(X, processed=True)
+
+    def tranform_predict(self, X: pd.DataFrame, inplace: bool = False) -> np.ndarray:
+        """
+        Performs a prediction from unprocessed data. The input is never modified since each
+        worker gets its own copy of its partition.
+        """
+        return self._map(X, processed=False)
+
+    def close(self):
+        """
+        Shuts the worker processes down.
+        """
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def predict_csv(
+    predictor,
+    data_path: str,
+    output_path: str,
+    processed: bool = False,
+    chunksize: int = None,
+) -> pd.DataFrame:
+    """
+    Performs predictions over a csv file and writes them to `output_path` along with the
+    first column of the data (usually the PassengerId). When `chunksize` is given the file
+    is streamed in chunks of that many rows and the results are appended incrementally,
+    so memory usage is bounded by the chunk size.
+
+        Parameters:
+            predictor `InferencePipeline | ParallelScorer`: Object used to make the predictions.
+            data_path `str`: Path to the csv file with the data.
+            output_path `str`: Path of the csv file where the predictions are written.
+            processed `bool`: Whether the data is already processed or is raw data.
+            chunksize `int`: Optional number of rows to process at a time.
+
+        Returns:
+            predictions `pandas.DataFrame`: Predictions of the first chunk.
+    """
+    dtype = None if processed else RAW_CSV_DTYPES
+    chunks = (
+        pd.read_csv(data_path, dtype=dtype, chunksize=chunksize)
+        if chunksize
+        else [pd.read_csv(data_path, dtype=dtype)]
+    )
+    first_predictions = None
+    for data in chunks:
+        if "Survived" in data.columns:
+            del data["Survived"]
+        first_column = data.iloc[:, 0]
+        predictions = (
+            predictor.predict(X=data)
+            if processed
+            else predictor.tranform_predict(X=data, inplace=True)
+        )
+        predictions = pd.DataFrame({"Survived": predictions}, index=first_column.index)
+        predictions = pd.concat((first_column, predictions), axis=1)
+        if first_predictions is None:
+            first_predictions = predictions
+            predictions.to_csv(output_path, index=False)
+        else:
+            predictions.to_csv(output_path, mode="a", header=False, index=False)
+    return first_predictions
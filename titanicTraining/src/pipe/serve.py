@@ -0,0 +1,322 @@
+from __future__ import annotations
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from .plan import RECORD_FIELDS
+
+
+# Latencies kept to compute the percentiles exposed by the server
+LATENCY_WINDOW = 10000
+
+HTTP_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+def records_to_frame(records: List[dict]) -> pd.DataFrame:
+    """
+    Builds the raw data frame of a list of JSON passenger records, with the same column types
+    as the raw csv files (JSON nulls become NaN, ages and fares are floats).
+    """
+    frame = pd.DataFrame.from_records(records, columns=RECORD_FIELDS)
+    for column in ["Name", "Sex", "Ticket", "Cabin", "Embarked"]:
+        frame[column] = frame[column].where(frame[column].notna(), np.nan)
+    frame[["Age", "Fare"]] = frame[["Age", "Fare"]].astype(float)
+    return frame
+
+
+class ServerStats:
+    """
+    Latency and throughput counters of a `PredictionServer`.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.records = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record_request(self, latency: float, records: int):
+        self.requests += 1
+        self.records += records
+        self.latencies.append(latency)
+
+    def snapshot(self) -> Dict:
+        """
+        Returns the counters, the p50/p99 latency in milliseconds over the last
+        `LATENCY_WINDOW` requests and the throughput since the server started.
+        """
+        elapsed = time.perf_counter() - self.started
+        latencies = np.fromiter(self.latencies, dtype=float) * 1000
+        p50, p99 = (
+            np.percentile(latencies, [50, 99]).tolist()
+            if len(latencies) > 0
+            else (None, None)
+        )
+        return {
+            "requests": self.requests,
+            "records": self.records,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": self.records / self.batches if self.batches else None,
+            "latency_p50_ms": p50,
+            "latency_p99_ms": p99,
+            "requests_per_second": self.requests / elapsed,
+            "records_per_second": self.records / elapsed,
+            "uptime_seconds": elapsed,
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests into micro batches. A batch is closed when it holds
+    `max_batch_size` records or `max_wait` seconds after its first request arrived, whatever
+    happens first, and is predicted with a single call in a worker thread so the event loop keeps
+    accepting requests meanwhile.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[pd.DataFrame], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+        stats: ServerStats = None,
+    ):
+        """
+        Parameters:
+            predict `Callable`: Function making the predictions of a raw data frame.
+            max_batch_size `int`: Maximum number of records per batch.
+            max_wait `float`: Maximum seconds a request waits for other requests to join its batch.
+            stats `ServerStats`: Optional counters where the number of batches is kept.
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = stats if stats is not None else ServerStats()
+        self.queue: asyncio.Queue = None
+        self.task: asyncio.Task = None
+
+    def start(self):
+        """
+        Starts the batching loop on the running event loop.
+        """
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, records: List[dict]) -> np.ndarray:
+        """
+        Queues the records of a request and waits for their predictions.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[List[dict], asyncio.Future]]:
+        """
+        Waits for a request and gathers the ones arriving until the batch is full or expires.
+        """
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            records = [record for request_records, _ in batch for record in request_records]
+            self.stats.batches += 1
+            try:
+                predictions = await loop.run_in_executor(
+                    None, self.predict, records_to_frame(records)
+                )
+            except Exception:
+                # Do not let a malformed request fail the rest of its batch
+                for request_records, future in batch:
+                    try:
+                        future.set_result(
+                            await loop.run_in_executor(
+                                None, self.predict, records_to_frame(request_records)
+                            )
+                        )
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            start = 0
+            for request_records, future in batch:
+                end = start + len(request_records)
+                future.set_result(predictions[start:end])
+                start = end
+
+
+class PredictionServer:
+    """
+    Minimal asyncio HTTP/1.1 server making predictions with a pipeline loaded once.
+
+    Endpoints:
+        POST /predict: Body with a JSON passenger record, a list of records or {"records": [...]}.
+            Answers {"predictions": [...]} in the same order.
+        GET /metrics: Latency percentiles, throughput and batching counters.
+        GET /health: {"status": "ok"}.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+    ):
+        """
+        Parameters:
+            pipeline `InferencePipeline`: Fitted pipeline used for the predictions.
+            host `str`: Interface to listen on.
+            port `int`: Port to listen on. 0 picks a free port.
+            max_batch_size `int`: Maximum number of records per micro batch.
+            max_wait `float`: Maximum seconds a request waits for others to join its micro batch.
+        """
+        self.pipeline = pipeline
+        self.host = host
+        self.port = port
+        self.stats = ServerStats()
+        self.batcher = MicroBatcher(
+            self._predict, max_batch_size, max_wait, stats=self.stats
+        )
+        self.server: asyncio.AbstractServer = None
+
+    def _predict(self, data: pd.DataFrame) -> np.ndarray:
+        return self.pipeline.tranform_predict(data, inplace=True)
+
+    async def start(self):
+        """
+        Starts listening. The actual port is available in `self.port` afterwards.
+        """
+        self.batcher.start()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of a connection, keeping it alive until the client closes it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, response = await self._route(method, path, body)
+                except Exception as e:
+                    # The client always gets an answer, even for requests nobody expected
+                    self.stats.errors += 1
+                    status, response = 500, {"error": f"Request failed: {e}"}
+                payload = json.dumps(response).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    ).encode()
+                    + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        if path == "/predict":
+            if method != "POST":
+                return 405, {"error": "Use POST to make predictions."}
+            return await self._handle_predict(body)
+        if path == "/metrics":
+            return 200, self.stats.snapshot()
+        if path == "/health":
+            return 200, {"status": "ok"}
+        return 404, {"error": f"Unknown path {path}."}
+
+    async def _handle_predict(self, body: bytes) -> Tuple[int, Dict]:
+        start = time.perf_counter()
+        try:
+            records = json.loads(body)
+        except json.JSONDecodeError as e:
+            self.stats.errors += 1
+            return 400, {"error": f"Invalid JSON body: {e}"}
+        if isinstance(records, dict):
+            records = records["records"] if "records" in records else [records]
+        if not isinstance(records, list):
+            self.stats.errors += 1
+            return 400, {
+                "error": 'The body must be a record, a list of records or {"records": [...]}.'
+            }
+        missing = {
+            field
+            for record in records
+            for field in RECORD_FIELDS
+            if not isinstance(record, dict) or field not in record
+        }
+        if missing or len(records) == 0:
+            self.stats.errors += 1
+            return 400, {
+                "error": f"Every record must be an object with the fields {RECORD_FIELDS}. Missing: {sorted(missing)}."
+            }
+        try:
+            predictions = await self.batcher.submit(records)
+        except Exception as e:
+            self.stats.errors += 1
+            return 500, {"error": f"Prediction failed: {e}"}
+        self.stats.record_request(time.perf_counter() - start, len(records))
+        return 200, {"predictions": predictions.tolist()}
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import numpy as np
+from typing import Iterable
+
+
+class QuantileSketch:
+    """
+    Mergeable summary of the distribution of a numeric column, for data streamed in chunks.
+    Values are kept as sorted centroids (value, count). While there are at most
+    `max_centroids` distinct values the sketch holds them all and its quantiles are exact,
+    the same `pandas.Series.quantile` returns. Past that, the closest centroids are merged
+    into their weighted mean (the streaming histogram of Ben-Haim and Tom-Tov), so the
+    memory stays bounded and the quantiles become approximations.
+    """
+
+    def __init__(self, max_centroids: int = 1024):
+        """
+        Parameters:
+            max_centroids `int`: Maximum number of centroids kept.
+        """
+        self.max_centroids = max_centroids
+        self.values = np.empty(0, dtype=np.float64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of values summarized, missing values excluded.
+        """
+        return int(self.counts.sum())
+
+    def update(self, values: Iterable[float]):
+        """
+        Adds the values to the sketch. Missing values are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+        self._add(values, counts)
+
+    def merge(self, other: QuantileSketch):
+        """
+        Adds the values summarized by another sketch to this one.
+        """
+        self._add(other.values, other.counts)
+
+    def _add(self, values: np.ndarray, counts: np.ndarray):
+        values, inverse = np.unique(
+            np.concatenate((self.values, values)), return_inverse=True
+        )
+        self.values = values
+        self.counts = np.bincount(
+            inverse, weights=np.concatenate((self.counts, counts)), minlength=len(values)
+        ).astype(np.int64)
+        self._compress()
+
+    def _compress(self):
+        """
+        Merges the closest pairs of centroids until at most `max_centroids` are left.
+        """
+        while len(self.values) > self.max_centroids:
+            excess = len(self.values) - self.max_centroids
+            # Pick the closest pairs first, skipping pairs that share a centroid
+            paired = np.zeros(len(self.values), dtype=bool)
+            lefts = []
+            for left in np.argsort(np.diff(self.values), kind="stable"):
+                if not paired[left] and not paired[left + 1]:
+                    paired[left] = paired[left + 1] = True
+                    lefts.append(left)
+                    if len(lefts) == excess:
+                        break
+            lefts = np.array(lefts)
+            counts = self.counts[lefts] + self.counts[lefts + 1]
+            values = (
+                self.values[lefts] * self.counts[lefts]
+                + self.values[lefts + 1] * self.counts[lefts + 1]
+            ) / counts
+            keep = ~paired
+            self.values = np.concatenate((self.values[keep], values))
+            self.counts = np.concatenate((self.counts[keep], counts))
+            order = np.argsort(self.values, kind="stable")
+            self.values, self.counts = self.values[order], self.counts[order]
+
+    def quantiles(self, q: Iterable[float]) -> np.ndarray:
+        """
+        Quantiles of the summarized values, linearly interpolated between the closest ranks
+        like `pandas.Series.quantile`. NaN when the sketch is empty.
+
+            Parameters:
+                q `Iterable[float]`: Quantiles to compute, between 0 and 1.
+
+            Returns:
+                quantiles `numpy.ndarray`: One value per quantile.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.values):
+            return np.full(q.shape, np.NaN)
+        ends = np.cumsum(self.counts)
+        position = q * (ends[-1] - 1)
+        lower_rank = np.floor(position)
+        fraction = position - lower_rank
+        # Value at a rank is the centroid whose cumulative count first exceeds it
+        lower = self.values[np.searchsorted(ends, lower_rank, side="right")]
+        upper = self.values[
+            np.minimum(
+                np.searchsorted(ends, lower_rank + 1, side="right"), len(ends) - 1
+            )
+        ]
+        return np.where(
+            fraction >= 0.5,
+            upper - (upper - lower) * (1 - fraction),
+            lower + (upper - lower) * fraction,
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Returns the centroids as plain python types, ready to be dumped as json.
+        """
+        return {
+            "max_centroids": self.max_centroids,
+            "values": self.values.tolist(),
+            "counts": self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, params: dict) -> QuantileSketch:
+        """
+        Creates a sketch from the centroids returned by `to_dict`.
+        """
+        sketch = cls(params["max_centroids"])
+        sketch.values = np.array(params["values"], dtype=np.float64)
+        sketch.counts = np.array(params["counts"], dtype=np.int64)
+        return sketch
@@ -1,41 +1,213 @@
 from enum import Enum
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import (
+    RandomForestClassifier,
+    ExtraTreesClassifier,
+    HistGradientBoostingClassifier,
+)
 from sklearn.metrics import classification_report
-from typing import Tuple
+from typing import Dict, Iterable, List, Tuple, Union
+import numpy as np
+import pandas as pd
+
+# Models that train and predict on SciPy sparse matrices
+SPARSE_INPUT_MODELS = (RandomForestClassifier, ExtraTreesClassifier)
 
 class TrainerModels:
+    """
+    Registry of the models a `Trainer` can train, by name.
+    """
     RandomForest = RandomForestClassifier
+    ExtraTrees = ExtraTreesClassifier
+    HistGradientBoosting = HistGradientBoostingClassifier
+
+    @classmethod
+    def names(cls) -> Dict[str, type]:
+        """
+        Name -> model class of every registered model.
+        """
+        return {
+            name: model
+            for name, model in vars(cls).items()
+            if isinstance(model, type) and not name.startswith("_")
+        }
+
+    @classmethod
+    def get(cls, name: str) -> type:
+        """
+        Returns the model class registered under `name`.
+        """
+        models = cls.names()
+        if name not in models:
+            raise InvalidModelException(
+                f"{name} is not a registered model. Valid options are {list(models)}."
+            )
+        return models[name]
+
+def model_input(X, model):
+    """
+    Prepares features for `model`. DataFrames with sparse columns, e.g. the dummies of a
+    sparse `FeatureEnricher`, become a float32 CSR matrix for the models that support them
+    and are densified, column by column, for the rest. Anything else is returned as is.
+
+        Parameters:
+            X: Features.
+            model: Model class or instance the features are for.
+
+        Returns:
+            X: Features the model can take.
+    """
+    if not isinstance(X, pd.DataFrame):
+        return X
+    sparse_columns = [
+        column
+        for column, dtype in X.dtypes.items()
+        if isinstance(dtype, pd.SparseDtype)
+    ]
+    if not sparse_columns:
+        return X
+    model_class = model if isinstance(model, type) else type(model)
+    if issubclass(model_class, SPARSE_INPUT_MODELS):
+        return X.astype(pd.SparseDtype(np.float32, 0)).sparse.to_coo().tocsr()
+    return X.assign(
+        **{column: X[column].sparse.to_dense() for column in sparse_columns}
+    )
 
 class Trainer:
     """
     Class in charge of training a model and keeping track of the arguments that were used
     for creating and training the model. 
     """
-    def __init__(self, model: TrainerModels = TrainerModels.RandomForest, *model_args, **model_kwargs):
+    def __init__(self, model: Union[str, type] = TrainerModels.RandomForest, *model_args, **model_kwargs):
+        """
+        Parameters:
+            model `str | type`: Name of a model in `TrainerModels` (e.g. 'HistGradientBoosting') or a model class.
+            model_args, model_kwargs: Forwarded to the model constructor.
+        """
+        if isinstance(model, str):
+            model = TrainerModels.get(model)
         self.model = model(*model_args, **model_kwargs)
         self.model_args = model_args
         self.model_kwargs = model_kwargs
         self.trainer_args = None
         self.trainer_kwargs = None
+        self.feature_names: List[str] = None
     
 
+    @classmethod
+    def from_model(cls, model, **model_kwargs) -> "Trainer":
+        """
+        Wraps an already fitted model, e.g. one loaded from a model artifact.
+        """
+        trainer = cls.__new__(cls)
+        trainer.model = model
+        trainer.model_args = ()
+        trainer.model_kwargs = model_kwargs
+        trainer.trainer_args = None
+        trainer.trainer_kwargs = None
+        trainer.feature_names = trainer._model_feature_names()
+        return trainer
+
+    def _model_feature_names(self) -> List[str]:
+        """
+        Feature names the model recorded while fitting, None if it was fitted without them.
+        """
+        names = getattr(self.model, "feature_names_in_", None)
+        return None if names is None else list(names)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "feature_names" not in state:
+            # Trainers pickled before the feature names were tracked here
+            self.feature_names = self._model_feature_names()
+
     def fit(self, X, y, *trainer_args, **trainer_kwargs):
         """
         This will fit training data `X` and training labels `y` to the chosen model.
         The extra args and kwargs will be forwarded to the models fit method. 
+        Sparse features are passed as described in `model_input`.
         """
         self.trainer_args = trainer_args
         self.trainer_kwargs = trainer_kwargs
-        self.model.fit(X, y, *trainer_args, **trainer_kwargs)
+        self.feature_names = list(X.columns) if isinstance(X, pd.DataFrame) else None
+        self.model.fit(model_input(X, self.model), y, *trainer_args, **trainer_kwargs)
         return self.model
     
+    def fit_chunks(self, chunks: Iterable[Tuple], rows: int = None, classes=None):
+        """
+        Fits the model on data streamed in (X, y) chunks, so only one chunk is in memory at a time.
+        Models with `partial_fit` are updated with every chunk. Forests are grown chunk by chunk
+        with `warm_start`, each tree trained on the chunk it was added with, so the fitted
+        forest is a forest of subsamples of the data. Its `n_estimators` trees are split among
+        the chunks by their rows, or each chunk adds `n_estimators` trees when `rows` is unknown.
+        Every chunk adds at least one tree so none of the data is left out: with more chunks
+        than `n_estimators` the forest ends up with one tree per chunk. OOB scores can not be computed this way, so `oob_score` is turned off.
+
+            Parameters:
+                chunks `Iterable[Tuple]`: (X, y) chunks, every one of them with all the classes.
+                rows `int`: Optional total number of rows of the chunks.
+                classes: Classes of the labels, needed by the models with `partial_fit`.
+        """
+        self.trainer_args = ()
+        self.trainer_kwargs = {}
+        if hasattr(self.model, "partial_fit"):
+            for X, y in chunks:
+                self.feature_names = list(X.columns) if isinstance(X, pd.DataFrame) else None
+                self.model.partial_fit(model_input(X, self.model), y, classes=classes)
+            return self.model
+        if not isinstance(self.model, SPARSE_INPUT_MODELS):
+            raise InvalidModelException(
+                f"{type(self.model).__name__} can not be fitted on chunks. Only forests and models with partial_fit can."
+            )
+
+        n_estimators = self.model.n_estimators
+        warm_start = self.model.warm_start
+        self.model.set_params(warm_start=True, oob_score=False)
+        seen_rows, trees = 0, 0
+        for X, y in chunks:
+            seen_rows += len(X)
+            chunk_trees = (
+                max(round(n_estimators * seen_rows / rows) - trees, 1)
+                if rows
+                else n_estimators
+            )
+            if trees and not np.array_equal(np.unique(y), self.model.classes_):
+                raise InvalidChunkException(
+                    f"Every chunk must have all the classes {list(self.model.classes_)}, but one only has {list(np.unique(y))}."
+                )
+            trees += chunk_trees
+            self.feature_names = list(X.columns) if isinstance(X, pd.DataFrame) else None
+            self.model.set_params(n_estimators=trees)
+            self.model.fit(model_input(X, self.model), y)
+        self.model.set_params(warm_start=warm_start)
+        return self.model
+
     def evaluate(self, X, y) -> Tuple[dict, str]:
         y_pred = self.predict(X)
         return classification_report(y, y_pred, output_dict=True), classification_report(y, y_pred)
 
+    def evaluate_chunks(self, chunks: Iterable[Tuple]) -> Tuple[dict, str]:
+        """
+        Same as `evaluate` for data streamed in (X, y) chunks. Only the labels and the
+        predictions of every chunk are kept.
+        """
+        labels, predictions = [], []
+        for X, y in chunks:
+            labels.append(np.asarray(y))
+            predictions.append(self.predict(X))
+        y, y_pred = np.concatenate(labels), np.concatenate(predictions)
+        return classification_report(y, y_pred, output_dict=True), classification_report(y, y_pred)
+
 
     def predict(self, X):
+        X = model_input(X, self.model)
+        if isinstance(X, pd.DataFrame) and not hasattr(self.model, "feature_names_in_"):
+            # Models fitted on a sparse matrix have no feature names to check them against
+            X = X.to_numpy()
         return self.model.predict(X)
-    
 
-    
\ No newline at end of file
+
+class InvalidModelException(Exception):
+    """Exception thrown when a model name is not registered in `TrainerModels`."""
+
+class InvalidChunkException(Exception):
+    """Exception thrown when a chunk of streamed training data can not be fitted."""
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from typing import Dict, List
+import warnings
+import pandas as pd
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV
+from .train import TrainerModels, model_input
+
+
+# Columns of the trial table, besides one `param_<name>` column per searched hyperparameter
+TRIAL_COLUMNS = [
+    "iter",
+    "n_resources",
+    "mean_test_score",
+    "std_test_score",
+    "mean_fit_time",
+    "rank_test_score",
+]
+
+
+class HyperparameterSearch:
+    """
+    Cross validated search over a grid of `Trainer` hyperparameters. The trials run in a pool of
+    `workers` processes which all receive the same preprocessed feature matrix (large arrays
+    are memory-mapped by joblib instead of copied to every worker).
+
+    With `halving` the search uses successive halving: every candidate is first evaluated on a
+    small share of the training rows and only the best `1 / factor` of them move on to the next
+    round, with `factor` times more rows, so poor configurations are stopped early.
+    """
+
+    def __init__(
+        self,
+        search_space: Dict[str, List],
+        base_kwargs: Dict = None,
+        model=TrainerModels.RandomForest,
+        cv: int = 5,
+        workers: int = -1,
+        halving: bool = True,
+        factor: int = 3,
+        scoring: str = "accuracy",
+    ):
+        """
+        Parameters:
+            search_space `Dict[str, List]`: Values to try for each hyperparameter.
+            base_kwargs `Dict`: Fixed hyperparameters shared by every trial, e.g. the config's trainer_args.
+            model `TrainerModels`: Model to tune.
+            cv `int`: Number of cross validation folds.
+            workers `int`: Number of processes running trials. -1 uses every core.
+            halving `bool`: Whether to use successive halving to stop poor trials early.
+            factor `int`: Share of candidates kept, and growth of the resources, in each halving round.
+            scoring `str`: scikit-learn scoring used to rank the trials.
+        """
+        if not search_space:
+            raise InvalidSearchSpaceException("The search space is empty.")
+        for name, values in search_space.items():
+            if not isinstance(values, list) or len(values) == 0:
+                raise InvalidSearchSpaceException(
+                    f"The search space of {name} must be a non empty list of values."
+                )
+        self.search_space = search_space
+        self.base_kwargs = {
+            name: value
+            for name, value in (base_kwargs or {}).items()
+            if name not in search_space
+        }
+        self.model = model
+        self.cv = cv
+        self.workers = workers
+        self.halving = halving
+        self.factor = factor
+        self.scoring = scoring
+        self.search = None
+
+    def run(self, X: pd.DataFrame, y: pd.Series) -> pd.DataFrame:
+        """
+        Runs the trials over the preprocessed features `X` and labels `y`. Sparse features
+        are passed as described in `train.model_input`.
+
+            Returns:
+                trials `pandas.DataFrame`: One row per trial, best ones first.
+        """
+        # Parallelism happens across trials, a model using every core per trial would oversubscribe
+        estimator_kwargs = dict(self.base_kwargs)
+        if "n_jobs" in self.model().get_params():
+            estimator_kwargs["n_jobs"] = 1
+        if self.halving:
+            self.search = HalvingGridSearchCV(
+                self.model(**estimator_kwargs),
+                self.search_space,
+                factor=self.factor,
+                cv=self.cv,
+                scoring=self.scoring,
+                n_jobs=self.workers,
+                refit=False,
+                # Keep enough rows in the first round for every fold to see both classes
+                min_resources="smallest",
+            )
+        else:
+            self.search = GridSearchCV(
+                self.model(**estimator_kwargs),
+                self.search_space,
+                cv=self.cv,
+                scoring=self.scoring,
+                n_jobs=self.workers,
+                refit=False,
+            )
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.search.fit(model_input(X, self.model), y)
+        return self.trials()
+
+    def trials(self) -> pd.DataFrame:
+        """
+        Table of the trials run, best ones first. With successive halving a configuration
+        appears once per round it took part in.
+        """
+        results = pd.DataFrame(self.search.cv_results_)
+        params = [f"param_{name}" for name in self.search_space]
+        columns = [column for column in TRIAL_COLUMNS if column in results] + params
+        trials = results[columns]
+        if "iter" in trials:
+            trials = trials.sort_values(
+                ["iter", "mean_test_score"], ascending=False, kind="stable"
+            )
+        else:
+            trials = trials.sort_values("rank_test_score", kind="stable")
+        return trials.reset_index(drop=True)
+
+    @property
+    def best_params(self) -> Dict:
+        return self.search.best_params_
+
+    @property
+    def best_score(self) -> float:
+        return float(self.search.best_score_)
+
+    def best_config(self) -> Dict:
+        """
+        The base hyperparameters updated with the best ones found, ready to be used as trainer_args.
+        """
+        config = dict(self.base_kwargs)
+        config.update(self.best_params)
+        return config
+
+
+class InvalidSearchSpaceException(Exception):
+    """Exception thrown when the hyperparameters search space is not valid."""
@@ -0,0 +1,283 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, List, Set
+import numpy as np
+import pandas as pd
+import pandera as pa
+from pandera.engines import pandas_engine
+
+
+FAILURE_CASES_COLUMNS = [
+    "schema_context",
+    "column",
+    "check",
+    "check_number",
+    "failure_case",
+    "index",
+]
+
+
+class FastSchemaValidator:
+    """
+    Vectorized validation engine for the pandera schemas used on ingestion. It applies the
+    same rules as the schema it is built from (column presence, dtypes, nullability, `isin`
+    and `greater_than_or_equal_to` checks, uniqueness) with plain pandas/NumPy operations and
+    reports the failures in the same format as pandera's lazy validation.
+
+    Failures are accumulated across calls to `collect`, so a file can be validated chunk by
+    chunk while it is being parsed (uniqueness included) and all the failures reported at once
+    with `raise_failures`.
+    """
+
+    def __init__(self, schema: pa.DataFrameSchema, sample: int = None):
+        """
+        Parameters:
+            schema `pandera.DataFrameSchema`: Schema whose rules will be applied.
+            sample `int`: Optional number of rows per frame on which the value checks are run.
+                Column presence, dtypes and uniqueness are always checked on every row.
+        """
+        self.schema = schema
+        self.sample = sample
+        self.failures: List[pd.DataFrame] = []
+        # Hashed set so checking each chunk against the keys seen before costs its own rows only
+        self.seen_unique_keys: Set = set()
+
+    def reset(self):
+        """
+        Forgets the failures and unique keys seen so far.
+        """
+        self.failures = []
+        self.seen_unique_keys = set()
+
+    def _failure(
+        self,
+        column: str,
+        check: str,
+        check_number,
+        failure_cases,
+        index,
+        schema_context: str = "Column",
+    ) -> pd.DataFrame:
+        """
+        Builds the failure cases rows of a single check.
+        """
+        failure_cases = list(failure_cases)
+        index = list(index) if index is not None else [None] * len(failure_cases)
+        return pd.DataFrame(
+            {
+                "schema_context": schema_context,
+                "column": column,
+                "check": check,
+                # Object columns so missing values stay None, as in pandera's report
+                "check_number": pd.Series([check_number] * len(index), dtype=object),
+                "failure_case": pd.Series(failure_cases, dtype=object),
+                "index": pd.Series(index, dtype=object),
+            },
+            columns=FAILURE_CASES_COLUMNS,
+        )
+
+    def collect(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Validates `data` and accumulates its failures.
+
+            Returns:
+                failure_cases `pandas.DataFrame`: Failures found in this frame only.
+        """
+        failures = []
+        checked = data
+        if self.sample is not None and len(data) > self.sample:
+            checked = data.sample(self.sample, random_state=0)
+
+        for name, column in self.schema.columns.items():
+            if name not in data.columns:
+                failures.append(
+                    self._failure(
+                        None,
+                        "column_in_dataframe",
+                        None,
+                        [name],
+                        None,
+                        "DataFrameSchema",
+                    )
+                )
+                continue
+            series = data[name]
+            if not column.dtype.check(pandas_engine.Engine.dtype(series.dtype)):
+                failures.append(
+                    self._failure(
+                        name, f"dtype('{column.dtype}')", None, [str(series.dtype)], None
+                    )
+                )
+            elif isinstance(column.dtype, pandas_engine.NpString):
+                inferred = pd.api.types.infer_dtype(series, skipna=True)
+                if inferred not in ("string", "empty"):
+                    not_str = series[
+                        series.notna() & ~series.map(lambda x: isinstance(x, str))
+                    ]
+                    failures.append(
+                        self._failure(
+                            name, f"dtype('{column.dtype}')", None, not_str, not_str.index
+                        )
+                    )
+
+            if column.nullable and not column.checks:
+                continue
+            values = checked[name]
+            nulls = values.isna()
+            if not column.nullable and nulls.any():
+                failures.append(
+                    self._failure(
+                        name,
+                        "not_nullable",
+                        None,
+                        values[nulls],
+                        values.index[nulls.to_numpy()],
+                    )
+                )
+            values = values[~nulls]
+
+            for check_number, check in enumerate(column.checks):
+                try:
+                    passed = self._run_check(check, values)
+                except Exception as e:
+                    # Like pandera, a check that can not run on the values (e.g. comparing
+                    # strings to a number) fails with the error as its failure case
+                    message = f'"{e.args[0]}"' if e.args else ""
+                    failures.append(
+                        self._failure(
+                            name,
+                            check.error,
+                            check_number,
+                            [f"{type(e).__name__}({message})"],
+                            None,
+                        )
+                    )
+                    continue
+                failed = values[~passed.to_numpy(dtype=bool)]
+                if len(failed) > 0:
+                    failures.append(
+                        self._failure(
+                            name, check.error, check_number, failed, failed.index
+                        )
+                    )
+
+        if self.schema.unique:
+            failures += self._unique_failures(data)
+
+        failures = (
+            pd.concat(failures, ignore_index=True)
+            if failures
+            else pd.DataFrame(columns=FAILURE_CASES_COLUMNS)
+        )
+        if len(failures) > 0:
+            self.failures.append(failures)
+        return failures
+
+    def _run_check(self, check: pa.Check, values: pd.Series) -> pd.Series:
+        """
+        Runs a column check on non null values, returning whether each of them passed.
+        """
+        if check.name == "isin":
+            return values.isin(check.statistics["allowed_values"])
+        if check.name == "greater_than_or_equal_to":
+            with np.errstate(invalid="ignore"):
+                return pd.Series(
+                    np.asarray(values >= check.statistics["min_value"]),
+                    index=values.index,
+                )
+        # Checks without a vectorized implementation run through pandera itself
+        return check(values).check_output
+
+    def _unique_failures(self, data: pd.DataFrame) -> List[pd.DataFrame]:
+        """
+        Checks the uniqueness of the schema's unique columns inside `data` and against
+        the keys seen in previously collected frames.
+        """
+        unique_columns = list(self.schema.unique)
+        if any(column not in data.columns for column in unique_columns):
+            return []
+        duplicated = data.duplicated(unique_columns, keep=False).to_numpy()
+        keys = (
+            data[unique_columns[0]].tolist()
+            if len(unique_columns) == 1
+            else list(zip(*(data[column].tolist() for column in unique_columns)))
+        )
+        duplicated |= np.fromiter(
+            map(self.seen_unique_keys.__contains__, keys), dtype=bool, count=len(keys)
+        )
+        self.seen_unique_keys.update(keys)
+        if not duplicated.any():
+            return []
+        return [
+            self._failure(
+                column,
+                "multiple_fields_uniqueness",
+                None,
+                data[column][duplicated],
+                data.index[duplicated],
+                "DataFrameSchema",
+            )
+            for column in unique_columns
+        ]
+
+    def failure_cases(self) -> pd.DataFrame:
+        """
+        All the failures accumulated so far.
+        """
+        if not self.failures:
+            return pd.DataFrame(columns=FAILURE_CASES_COLUMNS)
+        return pd.concat(self.failures, ignore_index=True)
+
+    def raise_failures(self):
+        """
+        Raises a `SchemaValidationException` with every accumulated failure, if any.
+        """
+        failure_cases = self.failure_cases()
+        if len(failure_cases) > 0:
+            raise SchemaValidationException(failure_cases)
+
+    def validate(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Validates a whole frame, reporting all of its failures at once.
+
+            Returns:
+                validated_data `pandas.DataFrame`: The same data, if valid.
+        """
+        self.reset()
+        self.collect(data)
+        self.raise_failures()
+        return data
+
+    def validate_chunks(
+        self, chunks: Iterable[pd.DataFrame], fail_fast: bool = False
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Validates the chunks as they are consumed, so validation overlaps with parsing.
+        Once every chunk has been yielded, all the failures are raised at once.
+
+            Parameters:
+                chunks `Iterable[pandas.DataFrame]`: Chunks to validate.
+                fail_fast `bool`: Raise the failures of the first invalid chunk before it is
+                    yielded, so nothing is fitted on invalid data while the stream is consumed.
+        """
+        self.reset()
+        for chunk in chunks:
+            self.collect(chunk)
+            if fail_fast:
+                self.raise_failures()
+            yield chunk
+        self.raise_failures()
+
+
+class SchemaValidationException(Exception):
+    """Exception thrown when data does not comply with the expected schema."""
+
+    def __init__(self, failure_cases: pd.DataFrame):
+        self.failure_cases = failure_cases
+        summary = (
+            failure_cases.groupby(["column", "check"], dropna=False)["failure_case"]
+            .agg(lambda cases: list(cases.unique()[:10]))
+            .to_string()
+        )
+        super().__init__(
+            f"A total of {len(failure_cases)} schema failures were found.\n{summary}"
+        )
@@ -0,0 +1,185 @@
+from pipe import DataCleaning, FeatureEnricher, Trainer, InferencePipeline, InvalidArtifactException, load_inference_pipeline
+from pipe.artifact import MANIFEST_FILE, ARTIFACT_FORMAT_VERSION
+from pipe.plan import ForestPlan
+import pandas as pd
+import numpy as np
+import json
+import tracemalloc
+
+
+TRAIN_COLS = ['PassengerId','Survived','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+TEST_COLS = ['PassengerId','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+
+VARIED_TRAIN = pd.DataFrame.from_records([
+    [1,0,3,"Braund, Mr. Owen Harris",'male',22.0,1,0,'A/5 21171',7.25,np.NaN,'S'],
+    [2,1,1,"Cumings, Mrs. John Bradley (Florence Briggs Thayer)",'female',38,1,0,'PC 17599',71.2833,'C85','C'],
+    [3,1,3,"Heikkinen, Miss. Laina",'female',26,0,0,'STON/O2. 3101282',7.925,'F G73','S'],
+    [4,1,1,"Rothes, the Countess. of (Lucy Noel Martha Dyer-Edwards)",'female',33,0,0,'110152',86.5,'B77','S'],
+    [5,0,1,"Fortune, Mr. Charles Alexander",'male',19,3,2,'19950',263,'C23 C25 C27','S'],
+    [6,0,1,"Blackwell, Mr. Stephen Weart",'male',45,0,0,'113784',35.5,'T','S'],
+    [7,1,2,"Laroche, Miss. Simonne Marie Anne Andree",'female',3,1,2,'SC/Paris 2123',41.5792,np.NaN,'C'],
+    [8,0,3,"Sage, Mr. Frederick",'male',np.NaN,8,2,'CA. 2343',69.55,np.NaN,np.NaN],
+    [9,1,1,"Bishop, Mrs. Dickinson H (Helen Walton)",'female',19,1,0,'11967',91.0792,'B49','C'],
+    [10,0,3,"Lindell, Mr. Edvard Bengtsson",'male',36,1,0,'349910',15.55,'D','S']],
+    columns=TRAIN_COLS) # pragma: no cover
+
+COMPLIANT_TEST = pd.DataFrame.from_records([
+    [892,3,"Kelly, Mr. James",'male',np.NaN,0,0,'W.E.P. 330911',7.8292,'E46','Q'],
+    [893,3,"Wilkes, Mrs. James (Ellen Needs)",'female',47,1,0,'363272',np.NaN,np.NaN,'S'],
+    [894,2,"Myles, Mr. Thomas Francis",'male',62,0,0,'240276',9.6875,'C92','Q']
+], columns=TEST_COLS) # pragma: no cover
+
+
+def fit_inference_pipeline(): # pragma: no cover
+    dc = DataCleaning()
+    fe = FeatureEnricher()
+    features = fe.fit_transform(dc.fit_transform(VARIED_TRAIN))
+    trainer = Trainer(n_estimators=10, random_state=1)
+    trainer.fit(features.iloc[:, 1:], features.iloc[:, 0])
+    return InferencePipeline(dc, fe, trainer)
+
+
+def with_payload(data, rows, columns): # pragma: no cover
+    """
+    Repeats the rows of the data and adds float columns that every transformation passes
+    through untouched, so any full copy of the frame shows up as a copy of the payload.
+    Returns the frame and the bytes of the payload.
+    """
+    data = pd.concat([data] * (rows // len(data)), ignore_index=True)
+    payload = np.random.default_rng(0).random((len(data), columns))
+    # Built from a dict so its columns are consolidated, as in a frame read from a csv
+    frame = pd.DataFrame({
+        **{column: data[column] for column in data.columns},
+        **{f"Extra_{i}": payload[:, i] for i in range(columns)},
+    })
+    return frame, payload.nbytes
+
+
+def peak_copies(function, payload_bytes): # pragma: no cover
+    """
+    Peak memory allocated while running the function, as a number of payload copies.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / payload_bytes
+    finally:
+        tracemalloc.stop()
+
+
+class TestModelArtifact: # pragma: no cover
+    def test_export_load(self, tmp_path):
+        """
+        A loaded artifact must transform and predict exactly like the pipeline it was exported from.
+        """
+        pipe = fit_inference_pipeline()
+        artifact_path = str(tmp_path / "model.artifact")
+        pipe.export(artifact_path)
+        loaded = load_inference_pipeline(artifact_path)
+
+        assert isinstance(loaded, InferencePipeline)
+        for data in [VARIED_TRAIN.drop(columns="Survived"), COMPLIANT_TEST]:
+            expected = pipe.feature_enricher.transform(pipe.data_cleaner.transform(data))
+            transformed = loaded.feature_enricher.transform(loaded.data_cleaner.transform(data))
+            pd.testing.assert_frame_equal(transformed, expected)
+            assert (loaded.tranform_predict(data) == pipe.tranform_predict(data)).all(), "Loaded artifact predictions differ"
+
+    def test_invalid_artifacts(self, tmp_path):
+        """
+        Loading should fail on directories without a manifest or with a newer format version.
+        """
+        try:
+            InferencePipeline.load_artifact(str(tmp_path))
+            assert 1 == 0, "Loading a directory without manifest should fail"
+        except InvalidArtifactException:
+            pass
+
+        artifact_path = tmp_path / "model.artifact"
+        fit_inference_pipeline().export(str(artifact_path))
+        manifest = json.loads((artifact_path / MANIFEST_FILE).read_text())
+        manifest["format_version"] = ARTIFACT_FORMAT_VERSION + 1
+        (artifact_path / MANIFEST_FILE).write_text(json.dumps(manifest))
+        try:
+            InferencePipeline.load_artifact(str(artifact_path))
+            assert 1 == 0, "Loading an artifact with a newer format version should fail"
+        except InvalidArtifactException:
+            pass
+
+    def test_memory_mapped_model(self, tmp_path):
+        """
+        The estimator arrays of a loaded artifact are memory-mapped unless asked otherwise.
+        """
+        from sklearn.ensemble import HistGradientBoostingClassifier
+
+        pipe = fit_inference_pipeline()
+        features = pipe.feature_enricher.transform(pipe.data_cleaner.transform(VARIED_TRAIN))
+        pipe.trainer = Trainer(HistGradientBoostingClassifier, max_iter=5, min_samples_leaf=1)
+        pipe.trainer.fit(features.iloc[:, 1:], features.iloc[:, 0])
+        artifact_path = str(tmp_path / "model.artifact")
+        pipe.export(artifact_path)
+
+        mapped = InferencePipeline.load_artifact(artifact_path)
+        in_memory = InferencePipeline.load_artifact(artifact_path, mmap=False)
+        assert isinstance(mapped.trainer.model._predictors[0][0].nodes, np.memmap), "Tree nodes should be memory-mapped"
+        assert not isinstance(in_memory.trainer.model._predictors[0][0].nodes, np.memmap), "Tree nodes should be in memory"
+        assert (mapped.tranform_predict(COMPLIANT_TEST) == pipe.tranform_predict(COMPLIANT_TEST)).all()
+
+    def test_memory_mapped_forest(self, tmp_path):
+        """
+        Forests are loaded as a plan over their memory-mapped node arrays and predict like the
+        fitted forest. Without mmap, or from a version 2 artifact, the fitted forest is loaded.
+        """
+        from sklearn.ensemble import RandomForestClassifier
+
+        pipe = fit_inference_pipeline()
+        artifact_path = tmp_path / "model.artifact"
+        pipe.export(str(artifact_path))
+        data = pd.concat([VARIED_TRAIN.drop(columns="Survived"), COMPLIANT_TEST], ignore_index=True)
+        expected = pipe.tranform_predict(data)
+
+        mapped = InferencePipeline.load_artifact(str(artifact_path))
+        assert isinstance(mapped.trainer.model, ForestPlan)
+        assert all(isinstance(array, np.memmap) for array in mapped.trainer.model.to_arrays().values()), "Node arrays should be memory-mapped"
+        assert (mapped.tranform_predict(data) == expected).all()
+        assert [mapped.predict_record(record) for record in data.to_dict("records")] == expected.tolist()
+        in_memory = InferencePipeline.load_artifact(str(artifact_path), mmap=False)
+        assert isinstance(in_memory.trainer.model, RandomForestClassifier)
+
+        # Exported again from the node arrays, without the fitted forest
+        reexported_path = tmp_path / "reexported.artifact"
+        mapped.export(str(reexported_path))
+        assert not (reexported_path / "model.joblib").exists()
+        for mmap in [True, False]:
+            reloaded = InferencePipeline.load_artifact(str(reexported_path), mmap=mmap)
+            assert isinstance(reloaded.trainer.model, ForestPlan)
+            assert (reloaded.tranform_predict(data) == expected).all()
+
+        manifest = json.loads((artifact_path / MANIFEST_FILE).read_text())
+        manifest["format_version"] = 2
+        del manifest["forest"]
+        (artifact_path / MANIFEST_FILE).write_text(json.dumps(manifest))
+        legacy = InferencePipeline.load_artifact(str(artifact_path))
+        assert isinstance(legacy.trainer.model, RandomForestClassifier)
+        assert (legacy.tranform_predict(data) == expected).all()
+
+    def test_transform_copies(self):
+        """
+        Transforming copies the input frame at most once, and never with inplace.
+        """
+        pipe = fit_inference_pipeline()
+        data, payload_bytes = with_payload(COMPLIANT_TEST, 20000, 100)
+        expected = pipe.transform(data.copy(), inplace=True)
+
+        copied = data.copy()
+        copies = peak_copies(lambda: pipe.transform(copied), payload_bytes)
+        assert 1 <= copies < 2, f"Transforming should copy the input once, peak was {copies:.2f} copies"
+        pd.testing.assert_frame_equal(copied, data)
+
+        inplace = data.copy()
+        copies = peak_copies(lambda: pipe.transform(inplace, inplace=True), payload_bytes)
+        assert copies < 0.5, f"Transforming in place should not copy the input, peak was {copies:.2f} copies"
+
+        cleaned = data.copy()
+        copies = peak_copies(lambda: pipe.data_cleaner.transform(cleaned, inplace=True), payload_bytes)
+        assert copies < 0.5, f"Cleaning in place should not copy the input, peak was {copies:.2f} copies"
+        pd.testing.assert_frame_equal(pipe.transform(data), expected)
@@ -0,0 +1,59 @@
+from pipe import DatasetValidator, TrainerModels, compare_models, run_benchmarks, synthesize_titanic
+from pipe.bench import BENCHMARKS
+import json
+import pandas as pd
+import numpy as np
+
+
+class TestBench: # pragma: no cover
+    def test_synthesize_titanic(self):
+        """
+        The synthetic data is valid for the dataset schemas.
+        """
+        train_data = synthesize_titanic(500)
+        test_data = synthesize_titanic(200, "test", seed=1)
+        assert len(train_data) == 500 and len(test_data) == 200
+        assert "Survived" not in test_data
+        DatasetValidator.validate_data_schema(train_data, "train")
+        DatasetValidator.validate_data_schema(test_data, "test")
+        assert train_data["Age"].isnull().any() and train_data["Cabin"].isnull().any()
+        assert synthesize_titanic(500).equals(train_data), "The same seed should give the same data"
+
+    def test_run_benchmarks(self, tmp_path):
+        """
+        Every hot path is timed for every size and the report is json serializable.
+        """
+        results = []
+        report = run_benchmarks(
+            [300, 600],
+            repeat=2,
+            trainer_kwargs={"n_estimators": 5},
+            work_dir=str(tmp_path),
+            progress=results.append,
+        )
+        json.dumps(report)
+        assert report["results"] == results
+        assert [(r["size"], r["benchmark"]) for r in results] == [
+            (size, name) for size in [300, 600] for name in BENCHMARKS
+        ]
+        for result in results:
+            assert len(result["seconds"]) == 2 and result["best_seconds"] == min(result["seconds"])
+            assert result["rows_per_second"] > 0
+        assert results[0]["rows"] == 450, "The ingest also reads the test split"
+        assert [r["bytes"] > 0 for r in results if r["benchmark"] == "checkpoint.save"] == [True, True]
+        assert not [name for name in tmp_path.iterdir() if name.suffix in [".zip", ".ckpt"]]
+
+    def test_compare_models(self):
+        """
+        Every model is compared on the same feature matrix.
+        """
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+        y = pd.Series((X["a"] > 0).astype(int))
+        results = compare_models(X, y, latency_samples=5)
+        assert results["model"].tolist() == list(TrainerModels.names())
+        assert (results["fit_seconds"] > 0).all() and (results["predict_p50_ms"] <= results["predict_p99_ms"]).all()
+        assert (results["accuracy"] > 0.8).all()
+
+        results = compare_models(X, y, {"ExtraTrees": {"n_estimators": 5}}, latency_samples=5)
+        assert results["model"].tolist() == ["ExtraTrees"]
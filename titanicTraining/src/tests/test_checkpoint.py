@@ -0,0 +1,56 @@
+from pipe.checkpoint import CheckpointWriter, CheckpointWriteException, write_pickle
+import pipe.checkpoint
+import os
+import pickle
+import threading
+
+
+class TestCheckpointWriter: # pragma: no cover
+    def test_background_writes(self, tmp_path, monkeypatch):
+        """
+        Submitting returns before the checkpoint is written and wait blocks until it is on disk.
+        """
+        release = threading.Event()
+
+        def slow_write_pickle(path, obj):
+            release.wait(5)
+            write_pickle(path, obj)
+
+        monkeypatch.setattr(pipe.checkpoint, "write_pickle", slow_write_pickle)
+        writer = CheckpointWriter()
+        paths = [str(tmp_path / f"{i}.ckpt") for i in range(3)]
+        for i, path in enumerate(paths):
+            writer.submit(path, {"step": i})
+        assert not any(os.path.exists(path) for path in paths), "Submitting should not wait for the write"
+
+        release.set()
+        writer.wait()
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                assert pickle.load(f) == {"step": i}
+        assert sorted(os.listdir(tmp_path)) == ["0.ckpt", "1.ckpt", "2.ckpt"], "No temporary files should be left"
+
+    def test_failed_writes(self, tmp_path):
+        """
+        A failed write is raised by wait and does not leave a partial checkpoint behind.
+        """
+        writer = CheckpointWriter()
+        writer.submit(str(tmp_path / "missing" / "a.ckpt"), {"step": 0})
+        try:
+            writer.wait()
+            assert 1 == 0, "Wait should raise the error of the failed write"
+        except CheckpointWriteException:
+            pass
+
+        path = str(tmp_path / "a.ckpt")
+        write_pickle(path, {"step": 0})
+        writer.submit(path, {"step": 1, "unpicklable": threading.Lock()})
+        try:
+            writer.wait()
+            assert 1 == 0, "Wait should raise the error of the failed write"
+        except CheckpointWriteException:
+            pass
+        with open(path, "rb") as f:
+            assert pickle.load(f) == {"step": 0}, "The previous checkpoint should be kept intact"
+        assert os.listdir(tmp_path) == ["a.ckpt"], "No temporary files should be left"
+        writer.wait()
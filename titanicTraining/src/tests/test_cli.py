@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import yaml
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # pragma: no cover
+HEAVY_MODULES = ["numpy", "pandas", "pandera", "sklearn", "scipy", "joblib"] # pragma: no cover
+
+# Runs the cli with the given arguments and prints the heavy modules it imported
+IMPORTED_MODULES_SCRIPT = """
+import sys
+import cli
+sys.argv = ["titanic"] + sys.argv[1:]
+try:
+    cli.app()
+except SystemExit:
+    pass
+print("imported:" + ",".join(m for m in %r if m in sys.modules))
+""" % HEAVY_MODULES # pragma: no cover
+
+
+class TestCli: # pragma: no cover
+    def test_help(self):
+        """
+        The help of the cli lists its commands.
+        """
+        result = subprocess.run(
+            [sys.executable, "cli.py", "--help"], cwd=SRC_DIR, capture_output=True, text=True
+        )
+        assert result.returncode == 0 and "predict" in result.stdout
+
+    def test_lazy_imports(self):
+        """
+        The help of the cli and of its commands and argument errors do not import the
+        data and model libraries.
+        """
+        for args in [["--help"], ["run", "--help"], ["predict", "--help"], ["bench", "--sizes", "x"], ["tune", "--bogus"]]:
+            result = subprocess.run(
+                [sys.executable, "-c", IMPORTED_MODULES_SCRIPT, *args],
+                cwd=SRC_DIR,
+                capture_output=True,
+                text=True,
+            )
+            imported = result.stdout.rsplit("imported:", 1)[1].strip()
+            assert imported == "", f"titanic {' '.join(args)} imported {imported}"
+
+    def test_in_memory_commands_out_of_core(self, tmp_path):
+        """
+        Tuning and comparing models exit with an error before ingesting anything when the
+        config streams the data out of core.
+        """
+        config = {
+            "data_zip": str(tmp_path / "titanic.zip"),
+            "base_runs_folder": str(tmp_path / "runs"),
+            "out_of_core": True,
+            "trainer_args": {},
+            "tune": {"search_space": {"n_estimators": [10]}},
+        }
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.dump(config))
+        for command in ["tune", "compare-models"]:
+            result = subprocess.run(
+                [sys.executable, "cli.py", command, "--config-file", str(config_file)],
+                cwd=SRC_DIR,
+                capture_output=True,
+                text=True,
+            )
+            assert "needs the training data in memory" in result.stdout, f"titanic {command} should reject out_of_core"
+        assert not (tmp_path / "runs").exists(), "Nothing should run before the error"
@@ -1,7 +1,10 @@
 import pandas as pd
 import os
 import shutil
-from pipe import TitanicDataset, DatasetValidator, DatasetIngestionException, InvalidOptionException
+import zipfile
+import pandera as pa
+from pipe import TitanicDataset, StreamingDataset, DatasetValidator, DatasetCache, DatasetIngestionException, InvalidOptionException
+from pipe import FastSchemaValidator, SchemaValidationException
 
 TRAIN_COLS = ['PassengerId','Survived','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
 TEST_COLS = ['PassengerId','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
@@ -67,6 +70,184 @@ class TestTitanicDataset: # pragma: no cover
         except DatasetIngestionException as e:
             assert 1 == 1
 
+    def test_create_from_zip_members(self, tmp_path, monkeypatch):
+        """
+        Members are read straight from the archive, wherever they are inside it, without extracting anything.
+        """
+        monkeypatch.chdir(tmp_path)
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        zip_file_path = tmp_path / 'nested.zip'
+        with zipfile.ZipFile(zip_file_path, 'w') as archive:
+            archive.write(temp_train, 'titanic/train.csv')
+            archive.write(temp_test, 'titanic/test.csv')
+
+        dataset_from_paths = TitanicDataset(train_path=str(temp_train), test_path=str(temp_test))
+        dataset_from_zip = TitanicDataset.create_from_zip(str(zip_file_path))
+        assert dataset_from_paths.train_data.equals(dataset_from_zip.train_data), 'Train data should be read from the nested member'
+        assert dataset_from_paths.test_data.equals(dataset_from_zip.test_data), 'Test data should be read from the nested member'
+        assert sorted(os.listdir(tmp_path)) == ['nested.zip', 'test.csv', 'train.csv'], 'Nothing should be extracted to disk'
+
+        with zipfile.ZipFile(tmp_path / 'missing.zip', 'w') as archive:
+            archive.writestr('train.csv', COMPLIANT_TRAIN.to_csv(index=False))
+        try:
+            TitanicDataset.create_from_zip(str(tmp_path / 'missing.zip'))
+            assert 1 == 0, "Create from zip should fail when the archive has no test.csv"
+        except DatasetIngestionException as e:
+            pass
+
+        (tmp_path / 'corrupt.zip').write_text('not a zip')
+        try:
+            TitanicDataset.create_from_zip(str(tmp_path / 'corrupt.zip'))
+            assert 1 == 0, "Create from zip should fail when the file is not a valid zip"
+        except DatasetIngestionException as e:
+            pass
+
+    def test_cached_ingestion(self, tmp_path, monkeypatch):
+        """
+        A cached dataset is read back without parsing or validating, with compact dtypes, and
+        the cache is only reused for the exact same source content.
+        """
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        zip_file_path = tmp_path / 'titanic.zip'
+        with zipfile.ZipFile(zip_file_path, 'w') as archive:
+            archive.write(temp_train, 'train.csv')
+            archive.write(temp_test, 'test.csv')
+        cache_dir = str(tmp_path / 'cache')
+
+        first = TitanicDataset.create_from_zip(str(zip_file_path), cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1, 'The validated data should have been cached'
+        assert first.train_data['Sex'].dtype == 'category' and first.train_data['Pclass'].dtype == 'int8'
+
+        def fail(*args, **kwargs):
+            raise AssertionError('Cached data should not be parsed or validated again')
+        monkeypatch.setattr(DatasetValidator, 'validate_data_schema', fail)
+        monkeypatch.setattr(pd, 'read_csv', fail)
+        second = TitanicDataset.create_from_zip(str(zip_file_path), cache_dir=cache_dir)
+        pd.testing.assert_frame_equal(first.train_data, second.train_data)
+        pd.testing.assert_frame_equal(first.test_data, second.test_data)
+        assert not second.train_data['Cabin'].map(lambda cabin: cabin is None).any(), 'Missing values should be read back as NaN'
+        monkeypatch.undo()
+
+        from_paths = TitanicDataset(str(temp_train), str(temp_test), cache_dir=cache_dir)
+        pd.testing.assert_frame_equal(from_paths.train_data, second.train_data)
+        assert len(os.listdir(cache_dir)) == 2, 'Different sources should get different cache entries'
+        assert DatasetCache(cache_dir).key(str(temp_train)) != DatasetCache(cache_dir).key(str(temp_test))
+
+    def test_cached_out_of_range(self, tmp_path):
+        """
+        Values that do not fit the compact cache dtypes are cached with their own type instead
+        of wrapping around.
+        """
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        train = COMPLIANT_TRAIN.copy()
+        train.loc[0, 'SibSp'] = 200
+        train.loc[1, 'Parch'] = 1000
+        train.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        cache_dir = str(tmp_path / 'cache')
+
+        for _ in range(2):
+            cached = TitanicDataset(str(temp_train), str(temp_test), cache_dir=cache_dir)
+            assert cached.train_data['SibSp'].tolist() == train['SibSp'].tolist()
+            assert cached.train_data['Parch'].tolist() == train['Parch'].tolist()
+            assert cached.train_data['Pclass'].dtype == 'int8' and cached.test_data['SibSp'].dtype == 'int8'
+
+    def test_sampled_ingestion(self, tmp_path):
+        """
+        The validation sample reaches the 'fast' engine when reading the files and streaming them,
+        and sampled data is cached apart from fully validated data.
+        """
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        train = pd.concat([COMPLIANT_TRAIN] * 10, ignore_index=True)
+        train['PassengerId'] = range(len(train))
+        train.loc[0, 'Pclass'] = 4
+        train.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        cache_dir = str(tmp_path / 'cache')
+
+        # The value checks of the sample do not see the first row
+        sampled = TitanicDataset(str(temp_train), str(temp_test), cache_dir=cache_dir, validation='fast', chunksize=10, validation_sample=2)
+        assert len(sampled.train_data) == len(train)
+        streamed = StreamingDataset(str(temp_train), str(temp_test), chunksize=10, validation_sample=2)
+        assert sum(len(chunk) for chunk in streamed.chunks('train')) == len(train)
+        try:
+            TitanicDataset(str(temp_train), str(temp_test), cache_dir=cache_dir, validation='fast', chunksize=10)
+            assert 1 == 0, "Fully validated reads should not reuse the sampled cache entry"
+        except SchemaValidationException:
+            pass
+        assert len(os.listdir(cache_dir)) == 1
+
+class TestStreamingDataset: # pragma: no cover
+    def test_chunks(self, tmp_path):
+        """
+        Every pass streams the whole split in validated chunks, from the files or from the zip,
+        and records its number of rows once it finished.
+        """
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        zip_file_path = tmp_path / 'titanic.zip'
+        with zipfile.ZipFile(zip_file_path, 'w') as archive:
+            archive.write(temp_train, 'data/train.csv')
+            archive.write(temp_test, 'data/test.csv')
+        dataset = TitanicDataset(str(temp_train), str(temp_test))
+
+        for streamed in [
+            StreamingDataset(str(temp_train), str(temp_test), chunksize=2),
+            StreamingDataset(zip_path=str(zip_file_path), validation='pandera', chunksize=2),
+        ]:
+            assert streamed.rows == {}
+            for _ in range(2):
+                chunks = list(streamed.chunks('train'))
+                assert [len(chunk) for chunk in chunks] == [2, 1]
+                pd.testing.assert_frame_equal(pd.concat(chunks), dataset.train_data, check_dtype=False)
+            pd.testing.assert_frame_equal(pd.concat(streamed.chunks('test')), dataset.test_data, check_dtype=False)
+            assert streamed.rows == {'train': len(COMPLIANT_TRAIN), 'test': len(COMPLIANT_TEST)}
+
+        UNCOMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        try:
+            list(StreamingDataset(str(temp_train), str(temp_test), chunksize=2).chunks('train'))
+            assert 1 == 0, "Streaming should reject uncompliant data"
+        except SchemaValidationException:
+            pass
+        for kwargs in [dict(train_path=str(tmp_path / 'missing.csv'), test_path=str(temp_test)), dict(zip_path=str(temp_train))]:
+            try:
+                StreamingDataset(**kwargs)
+                assert 1 == 0, "Missing or invalid sources should be rejected up front"
+            except DatasetIngestionException:
+                pass
+
+    def test_chunks_fail_fast(self, tmp_path):
+        """
+        The stream fails on the first invalid chunk, before it is yielded, instead of once the
+        whole split was consumed.
+        """
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        invalid = UNCOMPLIANT_TRAIN.assign(PassengerId=UNCOMPLIANT_TRAIN['PassengerId'] + 3)
+        pd.concat([COMPLIANT_TRAIN, invalid, COMPLIANT_TRAIN.assign(PassengerId=[7, 8, 9])]).to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+
+        for validation in ['fast', 'pandera']:
+            yielded = []
+            try:
+                for chunk in StreamingDataset(str(temp_train), str(temp_test), validation=validation, chunksize=3).chunks('train'):
+                    yielded.append(chunk)
+                assert 1 == 0, "Streaming should reject uncompliant data"
+            except (SchemaValidationException, pa.errors.SchemaError):
+                pass
+            assert len(yielded) == 1, f"Only the chunk before the invalid one should be yielded with {validation}"
+
+
 class TestDatasetValidator(): # pragma: no cover
     def test_validate_paths(self, tmp_path):
         """
@@ -140,3 +321,86 @@ class TestDatasetValidator(): # pragma: no cover
             pass
 
 
+class TestFastSchemaValidator(): # pragma: no cover
+    def test_same_failures_as_pandera(self):
+        """
+        The fast engine reports exactly the failures pandera reports with lazy validation.
+        """
+        wrong_types = COMPLIANT_TEST.assign(Age=['abc', 1, 2], SibSp=['x', 0, 1])
+        for data, split in [(UNCOMPLIANT_TRAIN, 'train'), (UNCOMPLIANT_TEST, 'test'), (COMPLIANT_TEST.drop(columns='Name'), 'test'), (wrong_types, 'test')]:
+            schema = DatasetValidator.schema(split)
+            try:
+                schema.validate(data, lazy=True)
+                assert 1 == 0, "Pandera should reject the uncompliant data"
+            except pa.errors.SchemaErrors as e:
+                expected = e.failure_cases
+            try:
+                DatasetValidator.validate_data_schema(data, split, engine='fast')
+                assert 1 == 0, "The fast engine should reject the uncompliant data"
+            except SchemaValidationException as e:
+                pd.testing.assert_frame_equal(e.failure_cases, expected, check_dtype=False)
+
+        pd.testing.assert_frame_equal(DatasetValidator.validate_data_schema(COMPLIANT_TEST, engine='fast'), COMPLIANT_TEST)
+        try:
+            DatasetValidator.validate_data_schema(COMPLIANT_TEST, engine='other')
+            assert 1 == 0, "Schema validator should throw error on invalid engine"
+        except InvalidOptionException as e:
+            pass
+
+    def test_streaming_validation(self, tmp_path):
+        """
+        Streamed ingestion validates each chunk and reports the failures of every chunk at once,
+        including ids duplicated across chunks.
+        """
+        temp_train = tmp_path / 'train.csv'
+        temp_test = tmp_path / 'test.csv'
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        dataset = TitanicDataset(str(temp_train), str(temp_test))
+        streamed = TitanicDataset(str(temp_train), str(temp_test), validation='fast', chunksize=2)
+        pd.testing.assert_frame_equal(streamed.train_data, dataset.train_data, check_dtype=False)
+        pd.testing.assert_frame_equal(streamed.test_data, dataset.test_data, check_dtype=False)
+
+        uncompliant = pd.concat([UNCOMPLIANT_TEST, UNCOMPLIANT_TEST.iloc[:1]])
+        uncompliant.to_csv(temp_test, index=False)
+        try:
+            DatasetValidator.read_csv(str(temp_test), 'test', engine='fast', chunksize=2)
+            assert 1 == 0, "Streamed validation should reject the uncompliant data"
+        except SchemaValidationException as e:
+            failures = e.failure_cases
+            assert set(failures['column']) == {'Pclass', 'Sex', 'Parch', 'Embarked', 'PassengerId'}, 'Every failure should be reported'
+            duplicated = failures[failures['check'] == 'multiple_fields_uniqueness']
+            assert duplicated['index'].tolist() == [3], 'The id repeated in another chunk should be reported'
+            assert len(failures) == 9, "The repeated row fails its own checks again"
+
+    def test_sampled_validation(self):
+        """
+        With a sample the value checks only see some rows, while dtypes are checked on the whole frame.
+        """
+        data = pd.concat([COMPLIANT_TEST] * 10 + [UNCOMPLIANT_TEST.iloc[[0]]], ignore_index=True)
+        data['PassengerId'] = range(len(data))
+        failures = FastSchemaValidator(DatasetValidator.test_schema, sample=5).collect(data)
+        assert len(failures) <= 2, 'Only the sampled rows should be checked'
+        data['Age'] = data['Age'].astype(int)
+        failures = FastSchemaValidator(DatasetValidator.test_schema, sample=5).collect(data)
+        assert (failures['check'] == "dtype('float64')").any(), 'Dtypes should always be checked'
+
+    def test_unique_keys_across_chunks(self):
+        """
+        Keys of several columns are checked against every previous chunk, and the keys seen
+        are forgotten when the validator is reset.
+        """
+        schema = pa.DataFrameSchema({'Pclass': pa.Column(int), 'Ticket': pa.Column(str)}, unique=['Pclass', 'Ticket'])
+        chunks = [
+            pd.DataFrame({'Pclass': [1, 1], 'Ticket': ['a', 'b']}, index=[0, 1]),
+            pd.DataFrame({'Pclass': [2, 3], 'Ticket': ['a', 'a']}, index=[2, 3]),
+            pd.DataFrame({'Pclass': [1, 3], 'Ticket': ['b', 'c']}, index=[4, 5]),
+        ]
+        validator = FastSchemaValidator(schema)
+        try:
+            list(validator.validate_chunks(chunks))
+            assert 1 == 0, 'Keys repeated in a later chunk should be rejected'
+        except SchemaValidationException as e:
+            assert e.failure_cases['index'].tolist() == [4, 4]
+            assert e.failure_cases['failure_case'].tolist() == [1, 'b']
+        assert len(list(validator.validate_chunks(chunks[:2]))) == 2, 'Keys of a previous validation should be forgotten'
@@ -0,0 +1,59 @@
+from pipe import MetricsRecorder, measure
+import pickle
+import json
+
+
+class TestMetricsRecorder: # pragma: no cover
+    def test_nested_stages(self, tmp_path):
+        """
+        Stages measured inside another one, directly or through `measure`, are recorded
+        under its name.
+        """
+        recorder = MetricsRecorder()
+        finished = []
+        recorder.add_hook(finished.append)
+        with recorder.measure("step", 10) as step:
+            with measure("stage", 10):
+                sum(range(10000))
+            step["rows"] = 20
+        assert [record["stage"] for record in recorder.records] == ["step/stage", "step"]
+        assert finished == recorder.records
+        assert recorder.records[1]["rows"] == 20
+        assert recorder.records[1]["wall_seconds"] >= recorder.records[0]["wall_seconds"]
+        assert recorder.records[1]["rows_per_second"] == 20 / recorder.records[1]["wall_seconds"]
+        assert recorder.records[1]["peak_rss_increase_bytes"] >= 0
+
+        path = str(tmp_path / "run" / "metrics.json")
+        recorder.save(path)
+        with open(path) as f:
+            assert json.load(f) == recorder.to_dict()
+
+    def test_inactive(self):
+        """
+        `measure` does nothing outside of a recorder's stage, even after one finished.
+        """
+        recorder = MetricsRecorder()
+        with recorder.measure("step"):
+            pass
+        with measure("stage") as stage:
+            pass
+        assert stage["stage"] == "stage" and len(recorder.records) == 1
+
+        try:
+            with recorder.measure("failing"):
+                raise ValueError()
+        except ValueError:
+            pass
+        assert recorder.records[-1]["stage"] == "failing", "Failing stages should be recorded too"
+        assert recorder.stack == []
+
+    def test_pickle(self):
+        """
+        Pickled recorders keep their records but not their hooks.
+        """
+        recorder = MetricsRecorder()
+        recorder.add_hook(lambda record: None)
+        with recorder.measure("step"):
+            pass
+        copy = pickle.loads(pickle.dumps(recorder))
+        assert copy.records == recorder.records and copy.hooks == []
@@ -1,4 +1,7 @@
-from pipe import TrainModelPipeline
+from pipe import TrainModelPipeline, ParallelScorer, predict_csv, load_inference_pipeline, StreamingDataset, HyperparameterSearch, synthesize_titanic
+from pipe.pipeline import OutOfCoreException
+from pipe.checkpoint import CheckpointWriteException
+from pipe.artifact import is_artifact
 import pandas as pd
 import numpy as np
 import os
@@ -155,3 +158,436 @@ class TestTrainModelPipeline:  # pragma: no cover
         ckpt_pipe = TrainModelPipeline.load(ckpt_path)
         ckpt_pipe.resume()
         ckpt_pipe.tranform_predict(pd.read_csv(temp_test))
+
+    def test_predict_record(self, tmp_path):
+        """
+        Pipelines loaded from a checkpoint predict single records like they predict DataFrames.
+        """
+        temp_train, temp_test = self.write_csvs(tmp_path)
+        TrainModelPipeline(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+        ).run()
+        pipeline = TrainModelPipeline.load(
+            tmp_path / "runs" / "run_0" / "evaluate" / "train_pipeline.ckpt"
+        )
+        expected = pipeline.tranform_predict(pd.read_csv(temp_test))
+        predicted = [pipeline.predict_record(record) for record in COMPLIANT_TEST.to_dict("records")]
+        assert predicted == expected.tolist()
+
+    def test_predict_csv_chunks(self, tmp_path):
+        """
+        Predicting a csv file in chunks writes the same predictions as predicting it at once.
+        """
+        temp_train, temp_test = self.write_csvs(tmp_path)
+        pipeline = TrainModelPipeline(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+        )
+        pipeline.run()
+
+        single_shot_path = str(tmp_path / "predictions.csv")
+        chunked_path = str(tmp_path / "chunked_predictions.csv")
+        returned = pipeline.predict_csv(temp_test, single_shot_path)
+        pipeline.predict_csv(temp_test, chunked_path, chunksize=2)
+        single_shot = pd.read_csv(single_shot_path)
+        assert single_shot.columns.tolist() == ["PassengerId", "Survived"]
+        assert single_shot["PassengerId"].tolist() == COMPLIANT_TEST["PassengerId"].tolist()
+        assert (single_shot["Survived"] == pipeline.tranform_predict(pd.read_csv(temp_test))).all()
+        assert single_shot.equals(returned.reset_index(drop=True))
+        assert single_shot.equals(pd.read_csv(chunked_path)), "Chunked predictions should be the same as the single shot ones"
+
+    def test_parallel_scoring(self, tmp_path):
+        """
+        Scoring in a pool of processes gives the predictions of the pipeline, in input order,
+        without modifying the input.
+        """
+        temp_train, temp_test = str(tmp_path / "train.csv"), str(tmp_path / "test.csv")
+        synthesize_titanic(500, seed=1).to_csv(temp_train, index=False)
+        synthesize_titanic(101, "test", seed=2).to_csv(temp_test, index=False)
+        pipeline = TrainModelPipeline(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+            random_state=1,
+        )
+        pipeline.run()
+        test_data = pd.read_csv(temp_test)
+        expected = pipeline.tranform_predict(test_data)
+        features = pipeline.transform(test_data).drop(columns="Survived", errors="ignore")
+
+        ckpt_path = os.path.join(pipeline.current_run_folder, "evaluate", "train_pipeline.ckpt")
+        with ParallelScorer(ckpt_path, workers=3) as scorer:
+            assert (scorer.tranform_predict(test_data) == expected).all(), "Parallel predictions should be in input order"
+            assert (scorer.predict(features) == expected).all()
+            assert len(scorer.tranform_predict(test_data.iloc[:0])) == 0
+            scored_path = str(tmp_path / "predictions.csv")
+            pipeline.predict_csv(temp_test, scored_path)
+            scorer_path = str(tmp_path / "parallel_predictions.csv")
+            predict_csv(scorer, temp_test, scorer_path, chunksize=40)
+        assert test_data.equals(pd.read_csv(temp_test)), "Parallel predictions should not modify the input"
+        assert pd.read_csv(scored_path).equals(pd.read_csv(scorer_path))
+
+    def test_export_artifact(self, tmp_path):
+        """
+        Finished runs export a model artifact that predicts like the pipeline, also when the
+        scoring workers load it.
+        """
+        temp_train, temp_test = self.write_csvs(tmp_path)
+        pipeline = TrainModelPipeline(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+        )
+        pipeline.run()
+        artifact_path = os.path.join(pipeline.current_run_folder, "evaluate", "train_pipeline.artifact")
+        assert is_artifact(artifact_path)
+
+        artifact = load_inference_pipeline(artifact_path)
+        assert not isinstance(artifact, TrainModelPipeline), "Artifacts only hold the inference state"
+        test_data = pd.read_csv(temp_test)
+        expected = pipeline.tranform_predict(test_data)
+        assert (artifact.tranform_predict(test_data) == expected).all()
+        with ParallelScorer(artifact_path, workers=2) as scorer:
+            assert (scorer.tranform_predict(test_data) == expected).all()
+
+    def test_data_cache(self, tmp_path):
+        """
+        Runs on a cached dataset fit and predict exactly like runs on freshly read data,
+        missing values included.
+        """
+        temp_train, temp_test = str(tmp_path / "train.csv"), str(tmp_path / "test.csv")
+        synthesize_titanic(300, seed=1).to_csv(temp_train, index=False)
+        synthesize_titanic(50, "test", seed=2).to_csv(temp_test, index=False)
+        kwargs = dict(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+            random_state=1,
+        )
+        uncached = TrainModelPipeline(**kwargs)
+        uncached.run()
+        fresh, cached = [
+            TrainModelPipeline(data_cache_dir=str(tmp_path / "cache"), **kwargs)
+            for _ in range(2)
+        ]
+        fresh.ingest()
+        cached.ingest()
+        assert len(os.listdir(tmp_path / "cache")) == 1, "The second run should read the cached data"
+        for split in ["train_data", "test_data"]:
+            pd.testing.assert_frame_equal(
+                getattr(cached.dataset, split), getattr(fresh.dataset, split)
+            )
+        assert cached.dataset.train_data["Cabin"].isna().any()
+        assert not cached.dataset.train_data["Cabin"].map(lambda cabin: cabin is None).any()
+
+        cached.preprocessing(continue_next=True)
+        cached.wait_for_checkpoints()
+        test_data = pd.read_csv(temp_test)
+        pd.testing.assert_frame_equal(
+            cached.transform(test_data), uncached.transform(test_data)
+        )
+        assert cached.evaluation == uncached.evaluation
+        assert (cached.tranform_predict(test_data) == uncached.tranform_predict(test_data)).all()
+
+    def test_step_cache(self, tmp_path, monkeypatch):
+        """
+        Steps whose inputs did not change are restored from the step cache instead of executed.
+        """
+        temp_train = str(tmp_path / "train.csv")
+        temp_test = str(tmp_path / "test.csv")
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        kwargs = dict(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            step_cache_dir=str(tmp_path / "step_cache"),
+            random_state=1,
+        )
+        first = TrainModelPipeline(n_estimators=10, **kwargs)
+        first.run()
+        expected = first.tranform_predict(pd.read_csv(temp_test))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("A cached step should not be executed again")
+
+        import pipe.pipeline
+
+        monkeypatch.setattr(pipe.pipeline, "TitanicDataset", fail)
+        monkeypatch.setattr(pipe.pipeline.DataCleaning, "fit", fail)
+        changed = TrainModelPipeline(n_estimators=20, **kwargs)
+        changed.run()
+        assert changed.trainer.model.n_estimators == 20, "Only the training should run again"
+
+        monkeypatch.setattr(pipe.pipeline.Trainer, "fit", fail)
+        same = TrainModelPipeline(n_estimators=10, **kwargs)
+        same.run()
+        assert (same.tranform_predict(pd.read_csv(temp_test)) == expected).all()
+        assert os.path.isdir(
+            os.path.join(same.current_run_folder, "evaluate", "train_pipeline.artifact")
+        ), "The evaluation should still be exported for the new run"
+
+        monkeypatch.undo()
+        COMPLIANT_TRAIN.iloc[:2].to_csv(temp_train, index=False)
+        other_data = TrainModelPipeline(n_estimators=10, **kwargs)
+        other_data.run()
+        assert len(other_data.dataset.train_data) == 2, "Changed data should not reuse the cache"
+
+    def test_step_checkpoints(self, tmp_path):
+        """
+        Checkpoints are written after each step, hold only what the step produced and
+        are reassembled with the previous ones when loaded.
+        """
+        import pickle
+
+        temp_train = str(tmp_path / "train.csv")
+        temp_test = str(tmp_path / "test.csv")
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        pipeline = TrainModelPipeline(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+            random_state=1,
+        )
+        pipeline.run()
+        expected = pipeline.tranform_predict(pd.read_csv(temp_test))
+
+        run_folder = pipeline.current_run_folder
+        ckpt_paths = {
+            step: os.path.join(run_folder, step, "train_pipeline.ckpt")
+            for step in ["ingest", "preprocessing", "train", "evaluate"]
+        }
+        expected_states = {
+            "ingest": ["dataset"],
+            "preprocessing": ["dataset", "data_cleaner", "feature_enricher"],
+            "train": ["trainer"],
+            "evaluate": ["evaluation"],
+        }
+        for step, path in ckpt_paths.items():
+            with open(path, "rb") as f:
+                ckpt = pickle.load(f)
+            assert ckpt["step"] == step
+            assert sorted(ckpt["state"]) == sorted(expected_states[step]), f"The {step} checkpoint should only hold its own outputs"
+
+        ingested = TrainModelPipeline.load(ckpt_paths["ingest"])
+        assert ingested.next_step_name == "preprocessing" and "Survived" in ingested.dataset.train_data
+        trained = TrainModelPipeline.load(ckpt_paths["train"])
+        assert trained.next_step_name == "evaluate"
+        assert (trained.tranform_predict(pd.read_csv(temp_test)) == expected).all(), "The train checkpoint should hold the trained model"
+        evaluated = TrainModelPipeline.load(ckpt_paths["evaluate"])
+        assert evaluated.next_step is None and evaluated.evaluation is not None
+        evaluated.resume()
+
+        preprocessed = TrainModelPipeline.load(ckpt_paths["preprocessing"])
+        preprocessed.resume()
+        assert preprocessed.next_step is None
+        assert (preprocessed.tranform_predict(pd.read_csv(temp_test)) == expected).all()
+        resumed_train = os.path.join(preprocessed.current_run_folder, "train", "train_pipeline.ckpt")
+        assert (TrainModelPipeline.load(resumed_train).tranform_predict(pd.read_csv(temp_test)) == expected).all(), "Resumed checkpoints should point back to the original run"
+
+    def test_checkpoint_write_failures(self, tmp_path, monkeypatch):
+        """
+        A checkpoint that could not be written fails a run that succeeded, but does not hide
+        the exception of a step that failed.
+        """
+        import pipe.checkpoint
+        from pipe import Trainer
+
+        temp_train = str(tmp_path / "train.csv")
+        temp_test = str(tmp_path / "test.csv")
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        kwargs = dict(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+        )
+
+        def fail_write(path, obj):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(pipe.checkpoint, "write_pickle", fail_write)
+        try:
+            TrainModelPipeline(**kwargs).run()
+            assert 1 == 0, "A run whose checkpoints were not written should fail"
+        except CheckpointWriteException:
+            pass
+
+        def fail_fit(self, X, y):
+            raise ValueError("fit failed")
+
+        monkeypatch.setattr(Trainer, "fit", fail_fit)
+        try:
+            TrainModelPipeline(**kwargs).run()
+            assert 1 == 0, "The failing step should fail the run"
+        except ValueError as e:
+            assert str(e) == "fit failed", "The exception of the step should propagate"
+
+    def test_step_metrics(self, tmp_path):
+        """
+        Every step and feature stage is measured, reported to the hooks and written
+        in the run folder.
+        """
+        import json
+
+        temp_train = str(tmp_path / "train.csv")
+        temp_test = str(tmp_path / "test.csv")
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        pipeline = TrainModelPipeline(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            n_estimators=10,
+        )
+        finished = []
+        pipeline.metrics.add_hook(lambda record: finished.append(record["stage"]))
+        pipeline.run()
+
+        with open(os.path.join(pipeline.current_run_folder, "metrics.json")) as f:
+            stages = {record["stage"]: record for record in json.load(f)["stages"]}
+        assert finished == list(stages)
+        for step in ["ingest", "preprocessing", "train", "evaluate"]:
+            assert step in stages, f"The {step} step should be measured"
+        for stage in ["names", "fam_size", "tickets", "cabins", "age_input", "dummies"]:
+            for split in ["train_data", "test_data"]:
+                assert f"preprocessing/{split}/feature_enricher.{stage}" in stages
+        assert stages["ingest"]["rows"] == len(COMPLIANT_TRAIN) + len(COMPLIANT_TEST)
+        assert stages["preprocessing/test_data"]["rows"] == len(COMPLIANT_TEST)
+        for record in stages.values():
+            assert record["wall_seconds"] > 0 and record["cpu_seconds"] >= 0
+            assert record["peak_rss_bytes"] > 0 and record["rows_per_second"] > 0
+        assert stages["preprocessing"]["wall_seconds"] >= stages["preprocessing/train_data"]["wall_seconds"]
+
+    def test_out_of_core(self, tmp_path):
+        """
+        Out of core runs stream the training data in chunks, fit the same transformers as
+        in memory runs, grow the forest chunk by chunk and can be resumed.
+        """
+        temp_train = str(tmp_path / "train.csv")
+        temp_test = str(tmp_path / "test.csv")
+        synthesize_titanic(2000, seed=1).to_csv(temp_train, index=False)
+        synthesize_titanic(100, "test", seed=2).to_csv(temp_test, index=False)
+        kwargs = dict(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            validation="fast",
+            ingest_chunksize=600,
+            n_estimators=10,
+            random_state=1,
+        )
+        in_memory = TrainModelPipeline(**kwargs)
+        in_memory.run()
+        pipeline = TrainModelPipeline(out_of_core=True, **kwargs)
+        pipeline.run()
+
+        assert isinstance(pipeline.dataset, StreamingDataset)
+        assert pipeline.dataset.rows["train"] == 2000
+        assert np.isclose(pipeline.data_cleaner.fare_mean, in_memory.data_cleaner.fare_mean)
+        assert pipeline.feature_enricher.cabin_num_columns == in_memory.feature_enricher.cabin_num_columns
+        assert len(pipeline.trainer.model.estimators_) == 10
+        assert pipeline.evaluation["accuracy"] > 0.7
+        test_data = pd.read_csv(temp_test)
+        pd.testing.assert_frame_equal(
+            pipeline.transform(test_data), in_memory.transform(test_data)
+        )
+        expected = pipeline.tranform_predict(test_data)
+
+        trained = TrainModelPipeline.load(
+            os.path.join(pipeline.current_run_folder, "train", "train_pipeline.ckpt")
+        )
+        assert trained.out_of_core and trained.dataset.rows["train"] == 2000
+        trained.resume()
+        assert trained.evaluation == pipeline.evaluation
+        assert (trained.tranform_predict(test_data) == expected).all()
+        try:
+            TrainModelPipeline(out_of_core=True, **kwargs).tune(
+                HyperparameterSearch({"n_estimators": [5, 10]})
+            )
+            assert 1 == 0, "Tuning should not be available out of core"
+        except OutOfCoreException:
+            pass
+
+    def test_out_of_core_step_keys(self, tmp_path):
+        """
+        Out of core, the chunk size changes the data the forest is grown from, so it is part of
+        the step keys. In memory it is not.
+        """
+        temp_train, temp_test = self.write_csvs(tmp_path)
+        kwargs = dict(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            step_cache_dir=str(tmp_path / "step_cache"),
+        )
+
+        def keys(**config):
+            return TrainModelPipeline(**kwargs, **config).compute_step_keys()
+
+        assert keys(ingest_chunksize=100) == keys(ingest_chunksize=200)
+        streamed = keys(out_of_core=True, ingest_chunksize=100)
+        other_chunks = keys(out_of_core=True, ingest_chunksize=200)
+        assert streamed["preprocessing"] != other_chunks["preprocessing"]
+        assert streamed["train"] != other_chunks["train"]
+        assert keys(out_of_core=True) == keys(out_of_core=True, ingest_chunksize=100000)
+
+    def test_resume_with_new_config(self, tmp_path):
+        """
+        Reloading the config before resuming keeps the flags the steps already run fixed.
+        """
+        temp_train = str(tmp_path / "train.csv")
+        temp_test = str(tmp_path / "test.csv")
+        synthesize_titanic(1000, seed=1).to_csv(temp_train, index=False)
+        synthesize_titanic(100, "test", seed=2).to_csv(temp_test, index=False)
+        kwargs = dict(
+            train_path=temp_train,
+            test_path=temp_test,
+            base_runs_folder=str(tmp_path / "runs"),
+            validation="fast",
+            ingest_chunksize=400,
+            n_estimators=10,
+            random_state=1,
+        )
+        in_memory = TrainModelPipeline(**kwargs)
+        in_memory.run()
+        streamed = TrainModelPipeline(out_of_core=True, **kwargs)
+        streamed.run()
+
+        ingested = TrainModelPipeline.load(
+            os.path.join(in_memory.current_run_folder, "ingest", "train_pipeline.ckpt")
+        )
+        kept = ingested.update_config(out_of_core=True, sparse_features=True)
+        assert kept == {"out_of_core": False}
+        assert not ingested.out_of_core and ingested.sparse_features
+        ingested.resume()
+        assert ingested.feature_enricher.sparse
+        assert ingested.evaluation == in_memory.evaluation
+
+        preprocessed = TrainModelPipeline.load(
+            os.path.join(streamed.current_run_folder, "preprocessing", "train_pipeline.ckpt")
+        )
+        kept = preprocessed.update_config(
+            out_of_core=False, sparse_features=True, model_ckpt_name="resumed"
+        )
+        assert kept == {"out_of_core": True, "sparse_features": False}
+        assert preprocessed.model_ckpt_name == "resumed"
+        preprocessed.resume()
+        assert preprocessed.evaluation == streamed.evaluation
+
+    def write_csvs(self, tmp_path):
+        temp_train, temp_test = str(tmp_path / "train.csv"), str(tmp_path / "test.csv")
+        COMPLIANT_TRAIN.to_csv(temp_train, index=False)
+        COMPLIANT_TEST.to_csv(temp_test, index=False)
+        return temp_train, temp_test
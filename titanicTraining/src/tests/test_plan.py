@@ -0,0 +1,125 @@
+from pipe import DataCleaning, FeatureEnricher, FeaturePlan, InferencePipeline, Trainer, RECORD_FIELDS, synthesize_titanic
+from pipe.plan import ForestPlan
+import pandas as pd
+import numpy as np
+import time
+
+
+TRAIN_COLS = ['PassengerId','Survived','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+
+VARIED_TRAIN = pd.DataFrame.from_records([
+    [1,0,3,"Braund, Mr. Owen Harris",'male',22.0,1,0,'A/5 21171',7.25,np.NaN,'S'],
+    [2,1,1,"Cumings, Mrs. John Bradley (Florence Briggs Thayer)",'female',38,1,0,'PC 17599',71.2833,'C85','C'],
+    [3,1,3,"Heikkinen, Miss. Laina",'female',26,0,0,'STON/O2. 3101282',7.925,'F G73','S'],
+    [4,1,1,"Rothes, the Countess. of (Lucy Noel Martha Dyer-Edwards)",'female',33,0,0,'110152',86.5,'B77','S'],
+    [5,0,1,"Fortune, Mr. Charles Alexander",'male',19,3,2,'19950',263,'C23 C25 C27','S'],
+    [6,0,1,"Blackwell, Mr. Stephen Weart",'male',45,0,0,'113784',35.5,'T','S'],
+    [7,1,2,"Laroche, Miss. Simonne Marie Anne Andree",'female',3,1,2,'SC/Paris 2123',41.5792,np.NaN,'C'],
+    [8,0,3,"Sage, Mr. Frederick",'male',np.NaN,8,2,'CA. 2343',69.55,np.NaN,np.NaN],
+    [9,1,1,"Bishop, Mrs. Dickinson H (Helen Walton)",'female',19,1,0,'11967',91.0792,'B49','C'],
+    [10,0,3,"Lindell, Mr. Edvard Bengtsson",'male',36,1,0,'349910',15.55,'D','S']],
+    columns=TRAIN_COLS) # pragma: no cover
+
+
+def fit_plan(): # pragma: no cover
+    dc = DataCleaning()
+    fe = FeatureEnricher()
+    features = fe.fit_transform(dc.fit_transform(VARIED_TRAIN))
+    X, y = features.iloc[:, 1:], features.iloc[:, 0]
+    return FeaturePlan(dc, fe, X.columns), X, y
+
+
+class TestFeaturePlan: # pragma: no cover
+    def test_plan_matches_transform(self):
+        """
+        The compiled plan must produce the same feature rows as the DataFrame transform.
+        """
+        plan, X, _ = fit_plan()
+        raw = VARIED_TRAIN.drop(columns="Survived")
+
+        from_dicts = plan.transform_records(raw.to_dict("records"))
+        from_tuples = plan.transform_records(list(raw[RECORD_FIELDS].itertuples(index=False)))
+
+        expected = X.to_numpy(dtype=float)
+        assert np.allclose(from_dicts, expected, equal_nan=True), "Plan features from dicts differ from the transform ones"
+        assert np.allclose(from_tuples, expected, equal_nan=True), "Plan features from tuples differ from the transform ones"
+
+    def test_plan_predictions(self):
+        """
+        Predictions made through the plan must be the same as the ones made with the DataFrame features.
+        """
+        plan, X, y = fit_plan()
+        trainer = Trainer(n_estimators=10, random_state=1)
+        trainer.fit(X, y)
+        raw = VARIED_TRAIN.drop(columns="Survived").to_dict("records")
+
+        expected = trainer.predict(X)
+        predicted = trainer.predict(pd.DataFrame(plan.transform_records(raw), columns=X.columns))
+        assert (expected == predicted).all(), "Predictions through the plan differ from the DataFrame ones"
+
+        start = time.perf_counter()
+        for record in raw * 100:
+            plan.transform_record(record)
+        per_record = (time.perf_counter() - start) / (len(raw) * 100)
+        assert per_record < 1e-3, f"Transforming a record took {per_record * 1e6:.0f}us"
+
+    def test_single_leaf_trees(self):
+        """
+        Trees whose root is a leaf, e.g. fitted on a bootstrap sample of a single class, are
+        walked right by the python and NumPy walks.
+        """
+        plan, X, y = fit_plan()
+        rows = X.to_numpy(dtype=np.float32)
+        for n_estimators in [10, ForestPlan.LIST_WALK_TREES + 16]:
+            trainer = Trainer(n_estimators=n_estimators, random_state=4)
+            trainer.fit(X.iloc[:3], y.iloc[:3])
+            assert any(tree.tree_.node_count == 1 for tree in trainer.model.estimators_)
+            forest_plan = ForestPlan(trainer.model)
+            expected = trainer.predict(X)
+            assert (forest_plan.predict(rows) == expected).all()
+            assert [forest_plan.predict_row(row) for row in rows] == expected.tolist()
+
+    def test_predict_record(self):
+        """
+        Single record predictions walk the compiled forest and give the same classes as the
+        DataFrame predictions, within the per record latency budget for small forests.
+        """
+        raw = synthesize_titanic(1000, seed=1)
+        dc = DataCleaning()
+        fe = FeatureEnricher()
+        features = fe.fit_transform(dc.fit_transform(raw))
+        X, y = features.iloc[:, 1:], features.iloc[:, 0]
+        records = synthesize_titanic(200, "test", seed=2)
+
+        for model in ["RandomForest", "ExtraTrees", "HistGradientBoosting"]:
+            kwargs = {"max_iter": 10} if model == "HistGradientBoosting" else {"n_estimators": 10}
+            trainer = Trainer(model, random_state=1, **kwargs)
+            trainer.fit(X, y)
+            pipeline = InferencePipeline(dc, fe, trainer)
+            expected = pipeline.tranform_predict(records)
+            predicted = [pipeline.predict_record(record) for record in records.to_dict("records")]
+            assert (np.array(predicted) == expected).all(), f"{model} record predictions differ from the DataFrame ones"
+            assert (pipeline.forest_plan is not None) == ForestPlan.supports(trainer.model)
+
+        # Larger forests are walked with NumPy, and the plan predicts whole matrices too
+        trainer = Trainer(n_estimators=ForestPlan.LIST_WALK_TREES + 16, random_state=1)
+        trainer.fit(X, y)
+        pipeline = InferencePipeline(dc, fe, trainer)
+        expected = pipeline.tranform_predict(records)
+        predicted = [pipeline.predict_record(record) for record in records.to_dict("records")]
+        assert (np.array(predicted) == expected).all(), "Record predictions of a large forest differ"
+        features = pipeline.transform(records)
+        assert (pipeline.forest_plan.predict(features) == expected).all()
+        assert np.allclose(pipeline.forest_plan.predict_proba(features), trainer.model.predict_proba(features))
+
+        trainer = Trainer(n_estimators=10, random_state=1)
+        trainer.fit(X, y)
+        pipeline = InferencePipeline(dc, fe, trainer)
+        raw_records = records.to_dict("records")
+        per_record = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for record in raw_records:
+                pipeline.predict_record(record)
+            per_record.append((time.perf_counter() - start) / len(raw_records))
+        assert min(per_record) < 1e-4, f"Predicting a record took {min(per_record) * 1e6:.0f}us"
@@ -1,4 +1,4 @@
-from pipe import DataCleaning, FeatureEnricher
+from pipe import DataCleaning, FeatureEnricher, MissingStatisticsException, synthesize_titanic
 import pandas as pd
 import numpy as np
 
@@ -45,6 +45,25 @@ class TestDataCleaning: # pragma: no cover
         except:
             pass
 
+    def test_partial_fit(self):
+        """
+        Updating with new batches gives the same fare mean as fitting on all of them, also
+        after exporting the cleaner.
+        """
+        raw = synthesize_titanic(1000, seed=1)
+        dc = DataCleaning()
+        dc.fit(raw.iloc[:400])
+        exported = DataCleaning.from_dict(dc.to_dict())
+        for cleaner in [dc, exported]:
+            cleaner.partial_fit(raw.iloc[400:])
+            assert np.isclose(cleaner.fare_mean, raw["Fare"].mean())
+
+        try:
+            DataCleaning.from_dict({"fare_mean": 10.0}).partial_fit(raw)
+            assert 1 == 0, "Cleaners exported without statistics can not be updated"
+        except MissingStatisticsException:
+            pass
+
 class TestDataEnricher: # pragma: no cover
     def test_fit_transform_order(self):
         """
@@ -74,3 +93,223 @@ class TestDataEnricher: # pragma: no cover
         except:
             pass
 
+    def test_age_imputation(self):
+        """
+        Missing ages are filled with the training mean of their (Name_Title, Pclass) group,
+        or with the global training mean when the group is unknown.
+        """
+        dc = DataCleaning()
+        fe = FeatureEnricher()
+        fe.fit(dc.fit_transform(VARIED_TRAIN))
+
+        test = COMPLIANT_TEST.copy()
+        test["Age"] = np.NaN
+        test["Pclass"] = [3, 1, 2]
+        test.index = [10, 20, 30]
+        test = fe.transform(dc.transform(test))
+
+        known_ages = VARIED_TRAIN["Age"]
+        assert test.loc[10, "Age"] == known_ages[[0, 9]].mean(), "Mr. in 3rd class should get its group mean"
+        assert test.loc[20, "Age"] == known_ages[[1, 8]].mean(), "Mrs. in 1st class should get its group mean"
+        assert test.loc[30, "Age"] == known_ages.mean(), "Unknown groups should get the global mean"
+        assert (test["Age_Null_Flag"] == 1).all(), "Imputed ages should be flagged"
+
+    def test_cabin_bins(self):
+        """
+        Cabin numbers are binned with the training terciles computed at fit time, using each row's own cabin.
+        """
+        train = DataCleaning().fit_transform(VARIED_TRAIN)
+        fe = FeatureEnricher()
+        fe.fit(train)
+
+        cabin_nums = fe._cabin_numbers(train["Cabin"])
+        expected = pd.get_dummies(pd.qcut(cabin_nums, 3), prefix="Cabin_num")
+        binned = fe.cabins(train.copy())
+        pd.testing.assert_frame_equal(binned[expected.columns], expected)
+
+        test = train.iloc[[1, 4, 0]].copy()
+        test.index = [0, 1, 2]
+        binned = fe.cabins(test)
+        pd.testing.assert_frame_equal(binned[expected.columns], expected.iloc[[1, 4, 0]].reset_index(drop=True))
+
+
+    def test_compact_dtypes(self):
+        """
+        Categorical features are carried as categories and the feature matrix only holds
+        uint8 flags and one-hots, uint16 lengths and float32 ages and fares.
+        """
+        dc = DataCleaning()
+        fe = FeatureEnricher()
+        train = dc.fit_transform(VARIED_TRAIN)
+        assert train["Sex"].dtype == "category" and train["Embarked"].dtype == "category"
+        assert train["Fare"].dtype == np.float32
+
+        fe.fit(train)
+        staged = fe.run_stages(train.copy(), ["names", "fam_size", "tickets", "cabins"])
+        for column in ["Name_Title", "Fam_Size", "Ticket_Lett", "Cabin_Letter"]:
+            assert staged[column].dtype == "category", f"{column} should be categorical"
+
+        features = fe.transform(train).drop(columns="Survived")
+        numeric = {"Age": np.float32, "Fare": np.float32, "Name_Len": np.uint16, "Ticket_Len": np.uint16}
+        for column, dtype in features.dtypes.items():
+            assert dtype == numeric.get(column, np.uint8), f"{column} has dtype {dtype}"
+
+    def test_dummies_match_encoder(self):
+        """
+        The uint8 dummies hold the same values as the fitted one-hot encoder, unknown
+        categories included.
+        """
+        dc = DataCleaning()
+        fe = FeatureEnricher()
+        fe.fit(dc.fit_transform(VARIED_TRAIN))
+        test = COMPLIANT_TEST.copy()
+        test["Name"] = ["Kelly, Sir. James", "Wilkes, Mrs. James (Ellen Needs)", "Myles, Mr. Thomas Francis"]
+        staged = fe.run_stages(dc.transform(test), ["names", "fam_size", "tickets", "cabins", "age_input"])
+
+        expected = fe.dummies_encoder.transform(staged[fe.columns].astype(object))
+        dummies = fe.dummies(staged.copy())[fe.dummies_encoder.get_feature_names_out(fe.columns)]
+        assert (dummies.dtypes == np.uint8).all()
+        assert np.array_equal(dummies.to_numpy(), expected)
+        assert dummies.filter(like="Name_Title").iloc[0].sum() == 0, "Unknown titles should have no dummy set"
+
+
+    def test_sparse_dummies(self):
+        """
+        Sparse dummies hold the same values as the dense ones and survive the export.
+        """
+        dc = DataCleaning()
+        train = dc.fit_transform(VARIED_TRAIN)
+        test = dc.transform(COMPLIANT_TEST)
+        fe = FeatureEnricher()
+        fe_sparse = FeatureEnricher(sparse=True)
+        dense = fe.fit_transform(train)
+        sparse = fe_sparse.fit_transform(train)
+        names = fe.dummies_encoder.get_feature_names_out(fe.columns)
+        assert list(sparse.columns) == list(dense.columns)
+        assert (sparse[names].dtypes == pd.SparseDtype(np.uint8, 0)).all()
+        assert sparse[names].sparse.density < 0.5
+        densified = sparse.assign(**{name: sparse[name].sparse.to_dense() for name in names})
+        pd.testing.assert_frame_equal(densified, dense)
+        assert FeatureEnricher.from_dict(fe_sparse.to_dict()).transform(test).equals(fe_sparse.transform(test))
+
+    def test_partial_fit(self):
+        """
+        Updating with a new batch gives the same statistics as fitting on all the data at once,
+        also after exporting the enricher, and new categories get their own dummy columns.
+        """
+        raw = synthesize_titanic(2000, seed=1)
+        train = DataCleaning().fit_transform(raw)
+        old, new = train.iloc[:1500], train.iloc[1500:].copy()
+        new.loc[new.index[0], "Name"] = "Doe, Sir. John"
+
+        fe = FeatureEnricher()
+        fe.fit(old)
+        assert "Name_Title_Sir." not in fe.transform(new).columns
+        exported = FeatureEnricher.from_dict(fe.to_dict())
+        everything = pd.concat([old, new])
+        expected_ages = everything.assign(Name_Title=fe._name_titles(everything["Name"])).groupby(["Name_Title", "Pclass"])["Age"].mean().dropna()
+        _, expected_bins = pd.qcut(fe._cabin_numbers(everything["Cabin"]), 3, retbins=True)
+        full = FeatureEnricher()
+        full.fit(everything)
+        for updated in [fe, exported]:
+            updated.partial_fit(new)
+            pd.testing.assert_series_equal(updated.age_means, expected_ages, check_index_type=False)
+            assert np.isclose(updated.age_global_mean, everything["Age"].mean())
+            assert np.array_equal(updated.cabin_bins, expected_bins)
+            assert "Name_Title_Sir." in updated.transform(new).columns, "New categories should get a dummy column"
+            pd.testing.assert_frame_equal(updated.transform(everything), full.transform(everything))
+
+        legacy = fe.to_dict()
+        for key in ["age_stats", "age_sum", "age_count", "cabin_sketch"]:
+            del legacy[key]
+        try:
+            FeatureEnricher.from_dict(legacy).partial_fit(new)
+            assert 1 == 0, "Enrichers exported without statistics can not be updated"
+        except MissingStatisticsException:
+            pass
+
+    def test_fit_chunks(self):
+        """
+        Fitting on chunks accumulates the same statistics as fitting on the whole data.
+        """
+        raw = synthesize_titanic(3000, seed=1)
+        dc, dc_chunks = DataCleaning(), DataCleaning()
+        train = dc.fit_transform(raw)
+        dc_chunks.fit_chunks(np.array_split(raw, 7))
+        assert np.isclose(dc_chunks.fare_mean, dc.fare_mean)
+
+        for vectorized in [False, True]:
+            fe = FeatureEnricher(vectorized=vectorized)
+            fe.fit(train)
+            fe_chunks = FeatureEnricher(vectorized=vectorized)
+            fe_chunks.fit_chunks(chunk.copy() for chunk in np.array_split(train, 7))
+            pd.testing.assert_series_equal(fe_chunks.age_means, fe.age_means)
+            assert np.isclose(fe_chunks.age_global_mean, fe.age_global_mean)
+            assert np.allclose(fe_chunks.cabin_bins, fe.cabin_bins)
+            assert fe_chunks.cabin_num_columns == fe.cabin_num_columns
+            for chunk_categories, categories in zip(fe_chunks.dummies_encoder.categories_, fe.dummies_encoder.categories_):
+                assert np.array_equal(chunk_categories, categories)
+            pd.testing.assert_frame_equal(fe_chunks.transform(train), fe.transform(train))
+
+
+VARIED_TRAIN = pd.DataFrame.from_records([
+    [1,0,3,"Braund, Mr. Owen Harris",'male',22.0,1,0,'A/5 21171',7.25,np.NaN,'S'],
+    [2,1,1,"Cumings, Mrs. John Bradley (Florence Briggs Thayer)",'female',38,1,0,'PC 17599',71.2833,'C85','C'],
+    [3,1,3,"Heikkinen, Miss. Laina",'female',np.NaN,0,0,'STON/O2. 3101282',7.925,'F G73','S'],
+    [4,1,1,"Rothes, the Countess. of (Lucy Noel Martha Dyer-Edwards)",'female',33,0,0,'110152',86.5,'B77','S'],
+    [5,0,1,"Fortune, Mr. Charles Alexander",'male',19,3,2,'19950',263,'C23 C25 C27','S'],
+    [6,0,1,"Blackwell, Mr. Stephen Weart",'male',45,0,0,'113784',35.5,'T','S'],
+    [7,1,2,"Laroche, Miss. Simonne Marie Anne Andree",'female',3,1,2,'SC/Paris 2123',41.5792,np.NaN,'C'],
+    [8,0,3,"Sage, Master. Thomas Henry",'male',np.NaN,8,2,'CA. 2343',69.55,np.NaN,np.NaN],
+    [9,1,1,"Bishop, Mrs. Dickinson H (Helen Walton)",'female',19,1,0,'11967',91.0792,'B49','C'],
+    [10,0,3,"Lindell, Mr. Edvard Bengtsson",'male',36,1,0,'349910',15.55,'D','S']],
+    columns=TRAIN_COLS) # pragma: no cover
+
+
+class TestVectorizedEnricher: # pragma: no cover
+    def test_feature_parity(self):
+        """
+        The vectorized path must produce exactly the same features as the per row one.
+        """
+        dc = DataCleaning()
+        train = dc.fit_transform(VARIED_TRAIN)
+        test = dc.transform(COMPLIANT_TEST)
+
+        fe = FeatureEnricher()
+        fe_vec = FeatureEnricher(vectorized=True)
+
+        train_rows = fe.fit_transform(train)
+        train_vec = fe_vec.fit_transform(train)
+        assert train_rows.equals(train_vec), "Vectorized fit_transform differs from the per row implementation"
+        assert fe.transform(test).equals(fe_vec.transform(test)), "Vectorized transform differs from the per row implementation"
+
+    def test_missing_cabins(self):
+        """
+        Missing cabins give the same features whether they are NaN or None, in both paths.
+        """
+        train = DataCleaning().fit_transform(VARIED_TRAIN)
+        with_none = train.assign(Cabin=train["Cabin"].astype(object).where(train["Cabin"].notna(), None))
+        assert with_none["Cabin"].map(lambda cabin: cabin is None).any()
+        for vectorized in [False, True]:
+            fe = FeatureEnricher(vectorized=vectorized)
+            pd.testing.assert_series_equal(fe._cabin_numbers(with_none["Cabin"]), fe._cabin_numbers(train["Cabin"]))
+            pd.testing.assert_series_equal(fe._cabin_letters(with_none["Cabin"]), fe._cabin_letters(train["Cabin"]))
+            pd.testing.assert_frame_equal(fe.fit_transform(with_none), FeatureEnricher(vectorized=vectorized).fit_transform(train))
+
+    def test_stage_parity(self):
+        """
+        Each vectorized stage must match its per row counterpart, dtypes included.
+        """
+        train = DataCleaning().fit_transform(VARIED_TRAIN)
+        fe = FeatureEnricher()
+        fe_vec = FeatureEnricher(vectorized=True)
+
+        pd.testing.assert_series_equal(fe._name_titles(train["Name"]), fe_vec._name_titles(train["Name"]))
+        pd.testing.assert_series_equal(fe._cabin_numbers(train["Cabin"]), fe_vec._cabin_numbers(train["Cabin"]))
+        for stage in ["names", "tickets"]:
+            pd.testing.assert_frame_equal(getattr(fe, stage)(train.copy()), getattr(fe_vec, stage)(train.copy()))
+
+        fe.fit(train)
+        fe_vec.fit(train)
+        assert np.array_equal(fe.cabin_bins, fe_vec.cabin_bins), "Cabin bins differ between paths"
+        pd.testing.assert_frame_equal(fe.cabins(train.copy()), fe_vec.cabins(train.copy()))
@@ -0,0 +1,106 @@
+from pipe import DataCleaning, FeatureEnricher, Trainer, InferencePipeline
+from pipe.serve import PredictionServer, records_to_frame
+import pandas as pd
+import numpy as np
+import asyncio
+import json
+
+
+TRAIN_COLS = ['PassengerId','Survived','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+TEST_COLS = ['PassengerId','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+
+VARIED_TRAIN = pd.DataFrame.from_records([
+    [1,0,3,"Braund, Mr. Owen Harris",'male',22.0,1,0,'A/5 21171',7.25,np.NaN,'S'],
+    [2,1,1,"Cumings, Mrs. John Bradley (Florence Briggs Thayer)",'female',38,1,0,'PC 17599',71.2833,'C85','C'],
+    [3,1,3,"Heikkinen, Miss. Laina",'female',26,0,0,'STON/O2. 3101282',7.925,'F G73','S'],
+    [4,1,1,"Rothes, the Countess. of (Lucy Noel Martha Dyer-Edwards)",'female',33,0,0,'110152',86.5,'B77','S'],
+    [5,0,1,"Fortune, Mr. Charles Alexander",'male',19,3,2,'19950',263,'C23 C25 C27','S'],
+    [6,0,1,"Blackwell, Mr. Stephen Weart",'male',45,0,0,'113784',35.5,'T','S'],
+    [7,1,2,"Laroche, Miss. Simonne Marie Anne Andree",'female',3,1,2,'SC/Paris 2123',41.5792,np.NaN,'C'],
+    [8,0,3,"Sage, Mr. Frederick",'male',np.NaN,8,2,'CA. 2343',69.55,np.NaN,np.NaN],
+    [9,1,1,"Bishop, Mrs. Dickinson H (Helen Walton)",'female',19,1,0,'11967',91.0792,'B49','C'],
+    [10,0,3,"Lindell, Mr. Edvard Bengtsson",'male',36,1,0,'349910',15.55,'D','S']],
+    columns=TRAIN_COLS) # pragma: no cover
+
+RECORDS = [
+    {"PassengerId": 892, "Pclass": 3, "Name": "Kelly, Mr. James", "Sex": "male", "Age": None, "SibSp": 0, "Parch": 0, "Ticket": "W.E.P. 330911", "Fare": 7.8292, "Cabin": "E46", "Embarked": "Q"},
+    {"PassengerId": 893, "Pclass": 3, "Name": "Wilkes, Mrs. James (Ellen Needs)", "Sex": "female", "Age": 47, "SibSp": 1, "Parch": 0, "Ticket": "363272", "Fare": None, "Cabin": None, "Embarked": "S"},
+    {"PassengerId": 894, "Pclass": 1, "Name": "Myles, Miss. Thomas Francis", "Sex": "female", "Age": 62, "SibSp": 0, "Parch": 0, "Ticket": "PC 240276", "Fare": 90.6875, "Cabin": "C92", "Embarked": None},
+] # pragma: no cover
+
+
+def fit_inference_pipeline(): # pragma: no cover
+    dc = DataCleaning()
+    fe = FeatureEnricher()
+    features = fe.fit_transform(dc.fit_transform(VARIED_TRAIN))
+    trainer = Trainer(n_estimators=10, random_state=1)
+    trainer.fit(features.iloc[:, 1:], features.iloc[:, 0])
+    return InferencePipeline(dc, fe, trainer)
+
+
+async def request(port, method, path, body=None): # pragma: no cover
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+        + payload
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+class TestPredictionServer: # pragma: no cover
+    def test_records_to_frame(self):
+        """
+        JSON records must produce the same predictions as the raw csv data.
+        """
+        pipeline = fit_inference_pipeline()
+        frame = records_to_frame(RECORDS)
+        expected = pipeline.tranform_predict(pd.DataFrame.from_records(RECORDS, columns=TEST_COLS).fillna(np.NaN).astype({"Age": float, "Fare": float}))
+        assert frame["Cabin"].isna().tolist() == [False, True, False]
+        assert (pipeline.tranform_predict(frame) == expected).all()
+
+    def test_micro_batching(self):
+        """
+        Concurrent requests are coalesced in batches and answered in order, with the metrics exposed.
+        """
+        pipeline = fit_inference_pipeline()
+        expected = pipeline.tranform_predict(records_to_frame(RECORDS)).tolist()
+
+        async def scenario():
+            server = PredictionServer(pipeline, port=0, max_batch_size=64, max_wait=0.05)
+            await server.start()
+            try:
+                responses = await asyncio.gather(
+                    *[request(server.port, "POST", "/predict", RECORDS[i % 3]) for i in range(30)]
+                )
+                many = await request(server.port, "POST", "/predict", {"records": RECORDS})
+                bad = await request(server.port, "POST", "/predict", [{"Name": "Kelly, Mr. James"}])
+                invalid = await request(server.port, "POST", "/predict", b"{not json")
+                not_records = [
+                    await request(server.port, "POST", "/predict", body)
+                    for body in [5, b"null", {"records": 3}, {"records": {"Name": "x"}}, "abc", [1, 2], []]
+                ]
+                missing = await request(server.port, "GET", "/other")
+                metrics = await request(server.port, "GET", "/metrics")
+            finally:
+                await server.stop()
+            return responses, many, bad, invalid, not_records, missing, metrics
+
+        responses, many, bad, invalid, not_records, missing, metrics = asyncio.run(scenario())
+        for i, (status, body) in enumerate(responses):
+            assert status == 200
+            assert body["predictions"] == [expected[i % 3]], "Each request should get its own prediction"
+        assert many == (200, {"predictions": expected})
+        assert bad[0] == 400 and invalid[0] == 400 and missing[0] == 404
+        for status, body in not_records:
+            assert status == 400 and "error" in body, "Bodies without records should be rejected"
+
+        status, metrics = metrics
+        assert metrics["requests"] == 31 and metrics["records"] == 33 and metrics["errors"] == 9
+        assert metrics["batches"] < 31, "Concurrent requests should have been batched"
+        assert metrics["latency_p50_ms"] <= metrics["latency_p99_ms"]
+        assert metrics["records_per_second"] > 0
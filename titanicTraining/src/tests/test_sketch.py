@@ -0,0 +1,44 @@
+from pipe import QuantileSketch
+import pandas as pd
+import numpy as np
+
+
+TERCILES = np.linspace(0, 1, 4) # pragma: no cover
+
+
+class TestQuantileSketch: # pragma: no cover
+    def test_exact_quantiles(self):
+        """
+        While the distinct values fit in the sketch its quantiles are the ones of pandas,
+        however the values are split into chunks or sketches.
+        """
+        values = np.random.default_rng(0).integers(1, 150, 5000).astype(float)
+        values[::7] = np.NaN
+        expected = pd.Series(values).quantile(TERCILES).to_numpy()
+
+        sketch = QuantileSketch()
+        for chunk in np.array_split(values, 7):
+            sketch.update(chunk)
+        assert np.array_equal(sketch.quantiles(TERCILES), expected)
+        assert sketch.count == np.count_nonzero(~np.isnan(values))
+
+        merged, other = QuantileSketch(), QuantileSketch()
+        merged.update(values[:1000])
+        other.update(values[1000:])
+        merged.merge(other)
+        assert np.array_equal(merged.quantiles(TERCILES), expected), "Merged sketches should summarize all their values"
+        assert np.isnan(QuantileSketch().quantiles(TERCILES)).all()
+        assert np.array_equal(QuantileSketch.from_dict(merged.to_dict()).quantiles(TERCILES), expected)
+
+    def test_bounded_size(self):
+        """
+        Past `max_centroids` distinct values the sketch stays bounded and approximates the quantiles.
+        """
+        values = np.random.default_rng(0).normal(size=100_000)
+        sketch = QuantileSketch(max_centroids=200)
+        for chunk in np.array_split(values, 10):
+            sketch.update(chunk)
+        assert len(sketch.values) <= 200 and sketch.count == len(values)
+        assert (np.diff(sketch.values) > 0).all(), "Centroids should stay sorted"
+        quantiles = [0.1, 0.5, 0.9]
+        assert np.allclose(sketch.quantiles(quantiles), np.quantile(values, quantiles), atol=0.05)
@@ -0,0 +1,150 @@
+from pipe import Trainer, TrainerModels, InvalidModelException, InvalidChunkException, TrainModelPipeline, DataCleaning, FeatureEnricher, model_input, load_inference_pipeline, synthesize_titanic
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, HistGradientBoostingClassifier
+import pandas as pd
+import numpy as np
+import scipy.sparse
+import os
+
+
+TRAIN_COLS = ['PassengerId','Survived','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+
+VARIED_TRAIN = pd.DataFrame.from_records([
+    [1,0,3,"Braund, Mr. Owen Harris",'male',22.0,1,0,'A/5 21171',7.25,np.NaN,'S'],
+    [2,1,1,"Cumings, Mrs. John Bradley (Florence Briggs Thayer)",'female',38,1,0,'PC 17599',71.2833,'C85','C'],
+    [3,1,3,"Heikkinen, Miss. Laina",'female',26,0,0,'STON/O2. 3101282',7.925,'F G73','S'],
+    [4,1,1,"Rothes, the Countess. of (Lucy Noel Martha Dyer-Edwards)",'female',33,0,0,'110152',86.5,'B77','S'],
+    [5,0,1,"Fortune, Mr. Charles Alexander",'male',19,3,2,'19950',263,'C23 C25 C27','S'],
+    [6,0,1,"Blackwell, Mr. Stephen Weart",'male',45,0,0,'113784',35.5,'T','S'],
+    [7,1,2,"Laroche, Miss. Simonne Marie Anne Andree",'female',3,1,2,'SC/Paris 2123',41.5792,np.NaN,'C'],
+    [8,0,3,"Sage, Mr. Frederick",'male',np.NaN,8,2,'CA. 2343',69.55,np.NaN,np.NaN],
+    [9,1,1,"Bishop, Mrs. Dickinson H (Helen Walton)",'female',19,1,0,'11967',91.0792,'B49','C'],
+    [10,0,3,"Lindell, Mr. Edvard Bengtsson",'male',36,1,0,'349910',15.55,'D','S']],
+    columns=TRAIN_COLS) # pragma: no cover
+
+
+class TestTrainer: # pragma: no cover
+    def test_model_registry(self):
+        """
+        Models can be chosen by their registered name.
+        """
+        assert TrainerModels.names() == {
+            "RandomForest": RandomForestClassifier,
+            "ExtraTrees": ExtraTreesClassifier,
+            "HistGradientBoosting": HistGradientBoostingClassifier,
+        }
+        assert isinstance(Trainer("HistGradientBoosting", max_iter=10).model, HistGradientBoostingClassifier)
+        assert isinstance(Trainer(TrainerModels.ExtraTrees).model, ExtraTreesClassifier), "Model classes should still be accepted"
+        assert isinstance(Trainer().model, RandomForestClassifier)
+        try:
+            Trainer("LinearRegression")
+            assert 1 == 0, "Unregistered models should be rejected"
+        except InvalidModelException:
+            pass
+
+    def test_pipeline_model_name(self, tmp_path):
+        """
+        The pipeline trains and exports the model chosen by name.
+        """
+        train_path, test_path = str(tmp_path / "train.csv"), str(tmp_path / "test.csv")
+        VARIED_TRAIN.to_csv(train_path, index=False)
+        VARIED_TRAIN.drop(columns="Survived").to_csv(test_path, index=False)
+        pipeline = TrainModelPipeline(
+            train_path=train_path,
+            test_path=test_path,
+            base_runs_folder=str(tmp_path / "runs"),
+            model_name="HistGradientBoosting",
+            max_iter=10,
+        )
+        pipeline.run()
+        assert isinstance(pipeline.trainer.model, HistGradientBoostingClassifier)
+        assert len(pipeline.tranform_predict(pd.read_csv(test_path))) == len(VARIED_TRAIN)
+
+    def test_sparse_features(self, tmp_path):
+        """
+        Features with sparse dummies are trained on as a CSR matrix by the forests and
+        densified for the other models, with the same predictions as the dense features.
+        """
+        dense = DataCleaning().fit_transform(VARIED_TRAIN)
+        X_dense = FeatureEnricher().fit_transform(dense).drop(columns="Survived")
+        X_sparse = FeatureEnricher(sparse=True).fit_transform(dense).drop(columns="Survived")
+        y = VARIED_TRAIN["Survived"]
+        assert scipy.sparse.isspmatrix_csr(model_input(X_sparse, TrainerModels.RandomForest))
+        assert (model_input(X_sparse, HistGradientBoostingClassifier()).dtypes == X_dense.dtypes).all()
+        assert model_input(X_dense, TrainerModels.RandomForest) is X_dense
+
+        for model in TrainerModels.names():
+            trainer = Trainer(model, random_state=1)
+            trainer.fit(X_sparse, y)
+            assert trainer.feature_names == list(X_dense.columns)
+            expected = Trainer(model, random_state=1).fit(X_dense, y).predict(X_dense)
+            assert (trainer.predict(X_sparse) == expected).all(), f"{model} predictions differ on sparse features"
+            assert (trainer.predict(X_dense) == expected).all()
+
+        pipeline = TrainModelPipeline(
+            train_path=self.write_csvs(tmp_path)[0],
+            test_path=self.write_csvs(tmp_path)[1],
+            base_runs_folder=str(tmp_path / "runs"),
+            sparse_features=True,
+            n_estimators=10,
+            random_state=1,
+        )
+        pipeline.run()
+        raw = VARIED_TRAIN.drop(columns="Survived")
+        artifact = load_inference_pipeline(
+            os.path.join(pipeline.current_run_folder, "evaluate", "train_pipeline.artifact")
+        )
+        expected = pipeline.tranform_predict(raw)
+        assert (artifact.tranform_predict(raw) == expected).all()
+        assert [artifact.predict_record(record) for record in raw.to_dict("records")] == expected.tolist()
+
+    def test_fit_chunks(self):
+        """
+        Forests grow their trees chunk by chunk, split by the rows of each chunk with at least one
+        tree per chunk, and models with partial_fit are updated with every chunk.
+        """
+        from sklearn.linear_model import SGDClassifier
+
+        raw = synthesize_titanic(2000, seed=1)
+        features = FeatureEnricher().fit_transform(DataCleaning().fit_transform(raw))
+        X, y = features.drop(columns="Survived"), features["Survived"]
+        chunks = [(X.iloc[start:start + 500], y.iloc[start:start + 500]) for start in range(0, 2000, 500)]
+
+        forest = Trainer("RandomForest", n_estimators=10, oob_score=True, random_state=1)
+        forest.fit_chunks(chunks, rows=len(X))
+        assert len(forest.model.estimators_) == 10 and forest.model.n_estimators == 10
+        assert not forest.model.warm_start and not forest.model.oob_score
+        assert all(tree.tree_.n_node_samples[0] <= 500 for tree in forest.model.estimators_), "Each tree should see a single chunk"
+        assert forest.feature_names == list(X.columns)
+        assert (forest.predict(X) == y).mean() > 0.7
+
+        small_chunks = [(X.iloc[start:start + 100], y.iloc[start:start + 100]) for start in range(0, 2000, 100)]
+        many_chunks = Trainer("RandomForest", n_estimators=4, random_state=1)
+        many_chunks.fit_chunks(small_chunks, rows=len(X))
+        # With bootstrap the weighted samples of a root add up to the rows the tree was fitted on
+        assert [tree.tree_.weighted_n_node_samples[0] for tree in many_chunks.model.estimators_] == [100] * len(small_chunks), "Every chunk should add a tree fitted on it"
+
+        unknown_rows = Trainer("ExtraTrees", n_estimators=3, random_state=1)
+        unknown_rows.fit_chunks(chunks)
+        assert len(unknown_rows.model.estimators_) == 3 * len(chunks), "Without rows each chunk adds n_estimators trees"
+
+        incremental = Trainer(SGDClassifier, random_state=1)
+        incremental.fit_chunks(chunks, classes=[0, 1])
+        report, _ = incremental.evaluate_chunks(chunks)
+        assert report["accuracy"] == incremental.evaluate(X, y)[0]["accuracy"]
+
+        try:
+            Trainer("HistGradientBoosting").fit_chunks(chunks)
+            assert 1 == 0, "Models that can not be fitted on chunks should be rejected"
+        except InvalidModelException:
+            pass
+        try:
+            Trainer("RandomForest", n_estimators=4).fit_chunks(chunks + [(X[y == 1], y[y == 1])])
+            assert 1 == 0, "Chunks without every class should be rejected"
+        except InvalidChunkException:
+            pass
+
+    def write_csvs(self, tmp_path):
+        train_path, test_path = str(tmp_path / "train.csv"), str(tmp_path / "test.csv")
+        VARIED_TRAIN.to_csv(train_path, index=False)
+        VARIED_TRAIN.drop(columns="Survived").to_csv(test_path, index=False)
+        return train_path, test_path
@@ -0,0 +1,91 @@
+from pipe import HyperparameterSearch, InvalidSearchSpaceException, TrainModelPipeline
+import pandas as pd
+import numpy as np
+import os
+import yaml
+
+
+TRAIN_COLS = ['PassengerId','Survived','Pclass','Name','Sex','Age','SibSp','Parch','Ticket','Fare','Cabin','Embarked'] # pragma: no cover
+
+VARIED_TRAIN = pd.DataFrame.from_records([
+    [1,0,3,"Braund, Mr. Owen Harris",'male',22.0,1,0,'A/5 21171',7.25,np.NaN,'S'],
+    [2,1,1,"Cumings, Mrs. John Bradley (Florence Briggs Thayer)",'female',38,1,0,'PC 17599',71.2833,'C85','C'],
+    [3,1,3,"Heikkinen, Miss. Laina",'female',26,0,0,'STON/O2. 3101282',7.925,'F G73','S'],
+    [4,1,1,"Rothes, the Countess. of (Lucy Noel Martha Dyer-Edwards)",'female',33,0,0,'110152',86.5,'B77','S'],
+    [5,0,1,"Fortune, Mr. Charles Alexander",'male',19,3,2,'19950',263,'C23 C25 C27','S'],
+    [6,0,1,"Blackwell, Mr. Stephen Weart",'male',45,0,0,'113784',35.5,'T','S'],
+    [7,1,2,"Laroche, Miss. Simonne Marie Anne Andree",'female',3,1,2,'SC/Paris 2123',41.5792,np.NaN,'C'],
+    [8,0,3,"Sage, Mr. Frederick",'male',np.NaN,8,2,'CA. 2343',69.55,np.NaN,np.NaN],
+    [9,1,1,"Bishop, Mrs. Dickinson H (Helen Walton)",'female',19,1,0,'11967',91.0792,'B49','C'],
+    [10,0,3,"Lindell, Mr. Edvard Bengtsson",'male',36,1,0,'349910',15.55,'D','S']],
+    columns=TRAIN_COLS) # pragma: no cover
+
+SEARCH_SPACE = {"n_estimators": [5, 10], "max_depth": [None, 2], "min_samples_leaf": [1, 2]} # pragma: no cover
+
+
+def synthetic_data(rows=300): # pragma: no cover
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(rows, 4)), columns=["a", "b", "c", "d"])
+    y = pd.Series((X["a"] + X["b"] > 0).astype(int))
+    return X, y
+
+
+class TestHyperparameterSearch: # pragma: no cover
+    def test_grid_search(self):
+        """
+        Without halving every configuration is evaluated once on all the rows.
+        """
+        X, y = synthetic_data()
+        search = HyperparameterSearch(SEARCH_SPACE, base_kwargs={"random_state": 1, "n_jobs": -1, "max_depth": 4}, cv=3, workers=2, halving=False)
+        trials = search.run(X, y)
+        assert len(trials) == 8, "There should be one trial per configuration"
+        assert trials["rank_test_score"].iloc[0] == 1, "Best trials should come first"
+        assert set(search.best_params) == set(SEARCH_SPACE)
+        assert search.best_config()["random_state"] == 1 and search.best_config()["n_jobs"] == -1
+        assert search.best_config()["max_depth"] == search.best_params["max_depth"], "Searched values override the base ones"
+
+    def test_successive_halving(self):
+        """
+        With halving only the best candidates of each round move on to the next one.
+        """
+        X, y = synthetic_data()
+        search = HyperparameterSearch(SEARCH_SPACE, base_kwargs={"random_state": 1}, cv=3, workers=2, factor=2)
+        trials = search.run(X, y)
+        rounds = trials.groupby("iter")
+        assert rounds.size().is_monotonic_decreasing and rounds.size().iloc[-1] < 8, "Each round should have fewer candidates"
+        assert rounds["n_resources"].first().is_monotonic_increasing, "Each round should use more rows"
+        assert 0 <= search.best_score <= 1
+
+    def test_invalid_search_space(self):
+        for space in [{}, {"n_estimators": []}, {"n_estimators": 10}]:
+            try:
+                HyperparameterSearch(space)
+                assert 1 == 0, f"The search space {space} should be rejected"
+            except InvalidSearchSpaceException:
+                pass
+
+    def test_pipeline_tune(self, tmp_path):
+        """
+        The pipeline tunes on its preprocessed data, writes the results in the run folder and
+        resuming from the tune checkpoint trains with the best config.
+        """
+        train = pd.concat([VARIED_TRAIN] * 6, ignore_index=True)
+        train["PassengerId"] = np.arange(1, len(train) + 1)
+        train_path, test_path = str(tmp_path / "train.csv"), str(tmp_path / "test.csv")
+        train.to_csv(train_path, index=False)
+        train.drop(columns="Survived").to_csv(test_path, index=False)
+
+        pipe = TrainModelPipeline(train_path=train_path, test_path=test_path, base_runs_folder=str(tmp_path / "runs"), random_state=1)
+        search = HyperparameterSearch(SEARCH_SPACE, base_kwargs=pipe.trainer_kwargs, cv=3, workers=2, factor=2)
+        trials = pipe.tune(search)
+
+        tune_dir = os.path.join(pipe.current_run_folder, "tune")
+        assert pd.read_csv(os.path.join(tune_dir, "trials.csv")).shape == trials.shape
+        with open(os.path.join(tune_dir, "best_config.yaml")) as f:
+            best_config = yaml.safe_load(f)
+        assert best_config["trainer_args"] == search.best_config() == pipe.trainer_kwargs
+
+        resumed = TrainModelPipeline.load(os.path.join(tune_dir, "train_pipeline.ckpt"))
+        assert resumed.next_step.__name__ == "train"
+        resumed.resume()
+        assert resumed.trainer.model_kwargs == search.best_config(), "Training should use the best config"